@@ -0,0 +1,143 @@
+# Condition Probe Benchmark
+# Compares the old five-way UNION against the single-scan probe strategies in fw_condition_probe.py on a
+# synthetic SQLite TrafficSummary table. SQLite is only a stand-in for the Access driver here, but the shape
+# of the work (how many passes over the table each approach needs) is the same. "aggregate+stats" is the pass
+# used with collect_traffic_statistics, the conditions plus the traffic statistics in one scan. "sampled" only reads
+# the first --sample-rows rows, its line shows the conditions it proved present plus (+n) the ones left inconclusive.
+#
+# Usage: python bench_condition_probe.py --rows 3000000
+
+import argparse
+import random
+import sqlite3
+import tempfile
+import time
+from pathlib import Path
+
+from fw_condition_probe import probe_conditions, probe_traffic, sample_conditions
+
+traffic_summary_table = "TrafficSummary"
+
+traffic_conditions = {
+    "Inbound Traffic": "Direction = 'I'",
+    "Outbound Traffic": "Direction = 'O'",
+    "Traffic Size": "Bytes >= 10",
+    "Allowed Traffic": "Allowed = 'A'",
+    "Denied Traffic": "Allowed = 'D'"
+}
+
+traffic_statistics = {
+    "rows": "COUNT(*)",
+    "inbound_bytes": "SUM(IIF(Direction = 'I', Bytes, 0))",
+    "outbound_bytes": "SUM(IIF(Direction = 'O', Bytes, 0))",
+    "allowed_rows": "SUM(IIF(Allowed = 'A', 1, 0))",
+    "denied_rows": "SUM(IIF(Allowed = 'D', 1, 0))"
+}
+
+# Legacy query from before the probe engine, kept here as the baseline
+union_query = f"""
+    SELECT 'Inbound Traffic' FROM {traffic_summary_table} WHERE Direction = 'I'
+    UNION SELECT 'Outbound Traffic' FROM {traffic_summary_table} WHERE Direction = 'O'
+    UNION SELECT 'Traffic Size' FROM {traffic_summary_table} WHERE Bytes >= 10
+    UNION SELECT 'Allowed Traffic' FROM {traffic_summary_table} WHERE Allowed = 'A'
+    UNION SELECT 'Denied Traffic' FROM {traffic_summary_table} WHERE Allowed = 'D'
+"""
+
+# ========================== SYNTHETIC DATA ==========================
+def generate_rows(rows, scenario, seed=1):
+    # healthy      - every condition shows up early and often
+    # denied-absent - no denied traffic anywhere, so one condition has to be proven absent
+    # late         - denied traffic only appears in the last rows of the table
+    # late-absent  - denied traffic only from 90% of the table on and no outbound traffic at all, one condition
+    #                proven late and one absent (a restart after the late proof would read the table almost twice)
+    # empty-ish    - only tiny inbound allowed traffic, four conditions absent
+    rng = random.Random(seed)
+    for row_number in range(rows):
+        direction = "I" if rng.random() < 0.6 else "O"
+        allowed = "A" if rng.random() < 0.8 else "D"
+        size = rng.randint(1, 5000)
+
+        if scenario == "denied-absent":
+            allowed = "A"
+        elif scenario == "late":
+            allowed = "D" if row_number >= rows - 10 else "A"
+        elif scenario == "late-absent":
+            direction = "I"
+            allowed = allowed if row_number >= rows * 9 // 10 else "A"
+        elif scenario == "empty-ish":
+            direction, allowed, size = "I", "A", rng.randint(1, 9)
+
+        yield (direction, size, allowed)
+
+def build_database(db_path, rows, scenario):
+    conn = sqlite3.connect(db_path)
+    conn.execute(f"CREATE TABLE {traffic_summary_table} (Direction TEXT, Bytes INTEGER, Allowed TEXT)")
+    conn.executemany(f"INSERT INTO {traffic_summary_table} VALUES (?, ?, ?)", generate_rows(rows, scenario))
+    conn.commit()
+    conn.close()
+
+# ========================== BENCHMARK ==========================
+def run_union(cursor):
+    cursor.execute(union_query)
+    return sorted(row[0] for row in cursor.fetchall())
+
+def time_call(func, repeat):
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+def run_sampled(cursor, sample_rows):
+    found, inconclusive = sample_conditions(cursor, traffic_conditions, f"SELECT * FROM {traffic_summary_table} LIMIT {sample_rows}", sample_rows)
+    return sorted(found), sorted(inconclusive)
+
+def benchmark(rows, scenarios, repeat, work_dir, sample_rows):
+    print(f"{'scenario':<15}{'method':<17}{'seconds':>10}{'speedup':>10}  conditions found")
+    for scenario in scenarios:
+        db_path = Path(work_dir) / f"bench_{scenario}.sqlite"
+        build_database(db_path, rows, scenario)
+        conn = sqlite3.connect(db_path)
+        cursor = conn.cursor()
+
+        methods = {
+            "union": lambda: run_union(cursor),
+            "aggregate": lambda: sorted(probe_conditions(cursor, traffic_summary_table, traffic_conditions, "aggregate")),
+            "short-circuit": lambda: sorted(probe_conditions(cursor, traffic_summary_table, traffic_conditions)),
+            "aggregate+stats": lambda: sorted(probe_traffic(cursor, traffic_summary_table, traffic_conditions, traffic_statistics)[0]),
+        }
+
+        baseline_time, baseline_result = time_call(methods["union"], repeat)
+        for method, func in methods.items():
+            elapsed, result = time_call(func, repeat)
+            if result != baseline_result:
+                raise AssertionError(f"{method} disagrees with union on {scenario}: {result} != {baseline_result}")
+            print(f"{scenario:<15}{method:<17}{elapsed:>10.3f}{baseline_time / elapsed:>9.1f}x  {len(result)}")
+
+        # Sampled may leave conditions open but must never contradict the full answer
+        elapsed, (found, inconclusive) = time_call(lambda: run_sampled(cursor, sample_rows), repeat)
+        if not set(found) <= set(baseline_result) <= set(found) | set(inconclusive):
+            raise AssertionError(f"sampled disagrees with union on {scenario}: {found} + {inconclusive} vs {baseline_result}")
+        print(f"{scenario:<15}{'sampled':<17}{elapsed:>10.3f}{baseline_time / elapsed:>9.1f}x  {len(found)} (+{len(inconclusive)})")
+
+        conn.close()
+        db_path.unlink()
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the TrafficSummary condition probe against the old UNION query.")
+    parser.add_argument("--rows", type=int, default=3_000_000, help="rows per synthetic table")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per method, the best time is reported")
+    parser.add_argument("--sample-rows", type=int, default=50_000, help="rows read by the sampled probe")
+    parser.add_argument("--scenario", action="append", choices=["healthy", "denied-absent", "late", "late-absent", "empty-ish"],
+                        help="scenario to run (repeatable, default: all)")
+    args = parser.parse_args()
+
+    scenarios = args.scenario or ["healthy", "denied-absent", "late", "late-absent", "empty-ish"]
+    with tempfile.TemporaryDirectory() as work_dir:
+        benchmark(args.rows, scenarios, args.repeat, work_dir, args.sample_rows)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,271 @@
+# End-to-End Benchmark
+# Runs the checker and the failover script against a synthetic client tree (see generate_synthetic_clients.py)
+# and reports wall time, per-phase time and peak RSS. Each run is appended as one JSON line to the results
+# file together with the git commit, so runs can be compared across commits with --compare.
+#
+# Peak RSS can't be reset inside a process, so a phase records the running peak of the whole run when it ends
+# (running_peak_rss_mb) and how far it pushed that peak up (peak_rss_growth_mb). A phase that stayed below an
+# earlier peak shows 0 growth, not its own footprint.
+#
+# Phases:
+# failover_discovery - grab_firewall_failovers.discover_failover_pairs over the tree, every nDiscovery.ini read
+# discovery          - client listing + Input folder index (client_tree_index.py)
+# db_probe           - condition probe + Firewalls lookup on every summary database, sequential
+# debug_scan         - full debug scan of every indexed syslog, sequential
+# evaluate           - classifying every firewall record in bulk (fw_evaluation.py) plus the fleet summary
+# report_write       - feeding every client's records to the text report, console, log, JSONL and CSV writers
+# end_to_end_cold    - check_ALL_fw_logging_levels with the pool, result cache refreshed
+# end_to_end_warm    - same again, answered from the result cache
+#
+# Usage: python bench_end_to_end.py <root> [--clients 200 --rows 50000 ...] [--workers 8] [--label name]
+#        python bench_end_to_end.py --compare bench_results.jsonl
+
+import argparse
+import contextlib
+import io
+import json
+import logging
+import subprocess
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+import grab_all_clients_fw_logging_settings as checker
+import grab_firewall_failovers
+from client_tree_index import list_client_folders, index_input_folders
+from fw_evaluation import FleetEvaluator
+from fw_report_records import TextReportWriter, ConsoleWriter, LogWriter, StructuredRecordWriter, dispatch_records
+from generate_synthetic_clients import generate_client_tree
+from syslog_debug_scanner import scan_for_debug
+
+# ========================== MEASURING ==========================
+def windows_peak_working_set_mb():
+    # Peak working set of this process in MB through psapi, Windows' equivalent of ru_maxrss
+    import ctypes
+    from ctypes import wintypes
+
+    class ProcessMemoryCounters(ctypes.Structure):
+        _fields_ = [("cb", wintypes.DWORD), ("PageFaultCount", wintypes.DWORD)] + [
+            (name, ctypes.c_size_t) for name in ("PeakWorkingSetSize", "WorkingSetSize", "QuotaPeakPagedPoolUsage",
+                                                 "QuotaPagedPoolUsage", "QuotaPeakNonPagedPoolUsage",
+                                                 "QuotaNonPagedPoolUsage", "PagefileUsage", "PeakPagefileUsage")
+        ]
+
+    counters = ProcessMemoryCounters(cb=ctypes.sizeof(ProcessMemoryCounters))
+    get_current_process = ctypes.windll.kernel32.GetCurrentProcess
+    get_current_process.restype = wintypes.HANDLE
+    if not ctypes.windll.psapi.GetProcessMemoryInfo(get_current_process(), ctypes.byref(counters), counters.cb):
+        return None
+    return round(counters.PeakWorkingSetSize / (1024 * 1024), 1)
+
+def peak_rss_mb():
+    # Running peak of (this process, finished child processes) in MB. Windows has no resource module, the peak
+    # working set stands in for this process there and the children are unknown (None).
+    try:
+        import resource
+    except ImportError:
+        return (windows_peak_working_set_mb() if sys.platform == "win32" else None), None
+    scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / scale
+    return round(own, 1), round(children, 1)
+
+class PhaseTimer:
+    def __init__(self):
+        self.phases = {}
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        peak_before, _ = peak_rss_mb()
+        start = time.perf_counter()
+        yield
+        own, children = peak_rss_mb()
+        growth = round(own - peak_before, 1) if own is not None and peak_before is not None else None
+        self.phases[name] = {"seconds": round(time.perf_counter() - start, 4), "running_peak_rss_mb": own,
+                             "running_peak_rss_children_mb": children, "peak_rss_growth_mb": growth}
+        print(f"{name:<20}{self.phases[name]['seconds']:>10.3f}s" + (f"  peak RSS +{growth} MB" if growth else ""))
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=Path(__file__).parent).stdout.strip() or None
+    except OSError:
+        return None
+
+# ========================== SETUP ==========================
+def configure_checker(manifest, work_dir):
+    # Points the checker's path config at the synthetic tree and keeps its outputs in work_dir
+    checker.clients_folder = Path(manifest["clients_folder"])
+    checker.csv_path = Path(manifest["csv_path"])
+    checker.client_name_exceptions_file = Path(manifest["client_name_exceptions_file"])
+    checker.client_date_exceptions_file = Path(manifest["client_date_exceptions_file"])
+    checker.default_folder_date = manifest["folder_date"]
+    checker.failover_state_file = work_dir / "fw_failover_state.json"
+    checker.fw_type_index_file = work_dir / "fw_type_index.sqlite"
+    checker.history_file = work_dir / "fw_results_history.sqlite"
+    checker.traffic_baseline_file = work_dir / "fw_traffic_baseline.sqlite"
+    checker.local_output_dir = work_dir / "outputs"
+    checker.log_file_path = work_dir / "outputs" / "FW_logging_bench.log"
+    checker.result_cache_file = work_dir / "fw_result_cache.json"
+    checker.metrics_textfile = work_dir / "outputs" / "fw_logging_metrics.prom"
+    checker.client_fw_exceptions_file = work_dir / "client_fw_exceptions.json"
+    checker.min_file_age_seconds = 0  # A freshly generated tree would otherwise be deferred and wait out the retry backoff
+    checker.local_output_dir.mkdir(parents=True, exist_ok=True)
+
+def reset_logger():
+    # check_ALL_fw_logging_levels adds a file handler per call, drop them between runs
+    logger = logging.getLogger("fw_logger")
+    for handler in list(logger.handlers):
+        handler.close()
+        logger.removeHandler(handler)
+
+# ========================== BENCHMARK ==========================
+def run_benchmark(manifest, work_dir, workers, unit, backend, index_workers):
+    configure_checker(manifest, work_dir)
+    timer = PhaseTimer()
+    wall_start = time.perf_counter()
+
+    excluded = checker.load_excluded_clients(checker.client_name_exceptions_file)
+    date_exceptions = checker.load_date_exclustions(checker.client_date_exceptions_file)
+
+    with timer.phase("failover_discovery"):
+        failover_pairs = grab_firewall_failovers.collect_failover_pairs(checker.clients_folder, set(excluded),
+                                                                        workers=index_workers)
+
+    with timer.phase("discovery"):
+        folders = []
+        for client, client_folder in list_client_folders(checker.clients_folder):
+            if client in excluded:
+                continue
+            folder_date = checker.current_date if client in date_exceptions else checker.default_folder_date
+            folders.append((client, checker.get_folder_loc(client_folder, folder_date)))
+        folder_indexes = index_input_folders(folders, checker.input_file_pattern, index_workers)
+
+    summary_dbs = [summary_db for index in folder_indexes for summary_db in index["summary_dbs"]]
+    syslogs = [syslog for index in folder_indexes for syslog in index["syslogs"].values()]
+
+    with timer.phase("db_probe"):
+        for summary_db in summary_dbs:
+            try:
+                checker.query_mdb_file(checker.ClientOutput(), summary_db["path"], summary_db["is_custom_fw"],
+                                      checker.default_check_settings(backend))
+            except Exception:
+                pass  # Broken databases are part of the workload, their errors are not
+
+    with timer.phase("debug_scan"):
+        for syslog in syslogs:
+            scan_for_debug(syslog)
+
+    client_records = [
+        checker.check_client(index, {"client": index["client"], "folder_date": None, "fw_types": {},
+                                     "failover_pairs": failover_pairs.get(index["client"], []),
+                                     "syslogs": index["syslogs"],
+                                     "cached_folder": None}, checker.default_check_settings(backend))
+        for index in folder_indexes
+    ]
+    with timer.phase("evaluate"):
+        evaluator = FleetEvaluator(checker.expected_conditions, checker.probed_conditions, failover_pairs=failover_pairs)
+        client_records = list(evaluator.evaluate_batches(client_records)) + [[evaluator.summary_record()]]
+    with timer.phase("report_write"):
+        logger = checker.setup_logger(work_dir / "outputs" / "report_write.log")
+        structured_writers = [
+            StructuredRecordWriter(work_dir / "outputs" / f"report_write.{output_format}", output_format, checker.expected_conditions)
+            for output_format in ("jsonl", "csv")
+        ]
+        with (work_dir / "outputs" / "report_write.txt").open("w", encoding="utf-8", buffering=checker.report_buffer_size) as file, \
+                contextlib.redirect_stdout(io.StringIO()):
+            consumers = [TextReportWriter(file), ConsoleWriter(), LogWriter(logger)] + structured_writers
+            for records in client_records:
+                dispatch_records(records, consumers)
+        for writer in structured_writers:
+            writer.close()
+        reset_logger()
+
+    for name, refresh in (("end_to_end_cold", True), ("end_to_end_warm", False)):
+        with timer.phase(name), contextlib.redirect_stdout(io.StringIO()):
+            checker.check_ALL_fw_logging_levels("all", None, workers=workers, unit=unit, use_cache=True,
+                                                refresh_cache=refresh, backend=backend)
+        reset_logger()
+
+    own, children = peak_rss_mb()
+    return {
+        "summary_dbs": len(summary_dbs),
+        "syslogs": len(syslogs),
+        "phases": timer.phases,
+        "wall_seconds": round(time.perf_counter() - wall_start, 4),
+        "peak_rss_mb": own,
+        "peak_rss_children_mb": children
+    }
+
+# ========================== COMPARE ==========================
+def compare(results_file):
+    runs = [json.loads(line) for line in Path(results_file).read_text(encoding="utf-8").splitlines() if line.strip()]
+    if not runs:
+        print("No runs recorded yet.")
+        return
+
+    phase_names = list(dict.fromkeys(name for run in runs for name in run["phases"]))
+    headers = [f"{run.get('commit') or '?'}:{run.get('label') or ''}"[:18] for run in runs]
+    print(f"{'phase (seconds)':<22}" + "".join(f"{header:>20}" for header in headers))
+    for name in phase_names + ["wall_seconds", "peak_rss_mb"]:
+        values = []
+        for run in runs:
+            value = run["phases"].get(name, {}).get("seconds") if name in phase_names else run.get(name)
+            values.append("-" if value is None else f"{value:.3f}" if name != "peak_rss_mb" else f"{value:.1f}")
+        print(f"{name:<22}" + "".join(f"{value:>20}" for value in values))
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end benchmark of the firewall checks on a synthetic client tree.")
+    parser.add_argument("root", type=Path, nargs="?", help="tree root, generated first if it has no manifest.json")
+    parser.add_argument("--compare", type=Path, help="print a side-by-side table of the runs in a results file and exit")
+    parser.add_argument("--results", type=Path, default=Path("bench_results.jsonl"), help="JSONL file runs are appended to")
+    parser.add_argument("--label", default="", help="free-text label stored with the run")
+    parser.add_argument("--workers", type=int, default=checker.parallel_workers)
+    parser.add_argument("--unit", choices=["client", "mdb"], default=checker.parallel_unit)
+    parser.add_argument("--backend", default="sqlite")
+    parser.add_argument("--index-workers", type=int, default=checker.index_workers)
+    parser.add_argument("--clients", type=int, default=50)
+    parser.add_argument("--ip-firewalls", type=int, default=3)
+    parser.add_argument("--custom-firewalls", type=int, default=1)
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--syslog-bytes", type=int, default=1_000_000)
+    parser.add_argument("--failover-pairs", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(args.compare)
+        return
+    if not args.root:
+        parser.error("root is required unless --compare is given")
+
+    manifest_file = args.root / "manifest.json"
+    if manifest_file.exists():
+        manifest = json.loads(manifest_file.read_text(encoding="utf-8"))
+    else:
+        print(f"Generating synthetic client tree in {args.root}...")
+        manifest = generate_client_tree(args.root, args.clients, args.ip_firewalls, args.custom_firewalls, args.rows,
+                                        args.syslog_bytes, failover_pairs=args.failover_pairs, seed=args.seed)
+
+    work_dir = args.root / "bench_work"
+    work_dir.mkdir(parents=True, exist_ok=True)
+    result = run_benchmark(manifest, work_dir, args.workers, args.unit, args.backend, args.index_workers)
+
+    record = {
+        "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "commit": git_commit(),
+        "label": args.label,
+        "tree": manifest["parameters"],
+        "workers": args.workers,
+        "unit": args.unit,
+        "backend": args.backend,
+        **result
+    }
+    with args.results.open("a", encoding="utf-8") as file:
+        file.write(json.dumps(record) + "\n")
+    print(f"wall {record['wall_seconds']:.3f}s, peak RSS {record['peak_rss_mb']} MB "
+          f"(workers {record['peak_rss_children_mb']} MB), appended to {args.results}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+# Client Name Index
+# "one" mode used to list the whole client share before it could even show the prompt, then scan every name on
+# each search. This keeps the client names in a small local JSON file and answers searches from a trigram index
+# built in memory, so the prompt comes up without touching the share.
+#
+# The saved list is refreshed on a background thread while the user types: one stat of the clients root, and a
+# full listing only when its mtime changed (a client folder was added, removed or renamed) or the list is older
+# than max_age_hours. Only the very first run (no saved list yet) waits for the listing.
+#
+# Layout (JSON):
+# {"clients_root": "D:/Clients", "root_mtime_ns": ..., "listed_at": <epoch seconds>, "clients": ["<client>", ...]}
+#
+# Search ranking: exact name, then prefix, then a match at the start of a word, then anywhere in the name
+# (shorter names first within each). A search without hits can ask for the closest names instead (trigram
+# overlap, then difflib similarity) to offer as "Did you mean" suggestions.
+
+import difflib
+import json
+import os
+import re
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from client_tree_index import list_client_folders
+from fw_metrics import write_atomically
+
+word_break_pattern = re.compile(r"[\s_\-\.&()]")
+
+# ========================== SEARCH ==========================
+def name_trigrams(name):
+    # Padded so short names and the first letters of a name still get trigrams
+    padded = f"  {name.lower()} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+def match_rank(lowered_name, query):
+    if lowered_name == query:
+        return 0
+    if lowered_name.startswith(query):
+        return 1
+    position = lowered_name.find(query)
+    while position != -1:
+        if word_break_pattern.match(lowered_name, position - 1):
+            return 2
+        position = lowered_name.find(query, position + 1)
+    return 3
+
+class ClientNameIndex:
+    """
+    Ranked substring search and fuzzy suggestions over client names. The names can be swapped by the background
+    refresh at any time, searches read one consistent snapshot (self.state is replaced, never changed in place).
+    """
+    def __init__(self, clients):
+        self.refresh_thread = None
+        self.refresh_error = None
+        self.set_clients(clients)
+
+    def set_clients(self, clients):
+        names = sorted(set(clients), key=lambda name: (name.lower(), name))
+        postings = {}
+        for position, name in enumerate(names):
+            for trigram in name_trigrams(name):
+                postings.setdefault(trigram, set()).add(position)
+        self.state = (names, [name.lower() for name in names], postings)
+
+    @property
+    def clients(self):
+        return self.state[0]
+
+    def search(self, query):
+        # Every client whose name contains query (case-insensitive), best match first
+        query = query.strip().lower()
+        if not query:
+            return []
+
+        names, lowered, postings = self.state
+        if len(query) >= 3:
+            # Every trigram of the query has to appear in the name, only those names are compared
+            query_postings = sorted((postings.get(query[i:i + 3], set()) for i in range(len(query) - 2)), key=len)
+            candidates = set.intersection(*query_postings) if query_postings[0] else set()
+        else:
+            candidates = range(len(names))
+
+        hits = [position for position in candidates if query in lowered[position]]
+        hits.sort(key=lambda position: (match_rank(lowered[position], query), len(lowered[position]), lowered[position]))
+        return [names[position] for position in hits]
+
+    def suggest(self, query, limit=5):
+        # Closest names for a search without hits: most shared trigrams first, then re-ranked by difflib
+        query = query.strip().lower()
+        if not query:
+            return []
+
+        names, lowered, postings = self.state
+        overlap = Counter()
+        for trigram in name_trigrams(query):
+            overlap.update(postings.get(trigram, ()))
+        candidates = [position for position, _ in overlap.most_common(limit * 10)]
+        candidates.sort(key=lambda position: (-difflib.SequenceMatcher(None, query, lowered[position]).ratio(), lowered[position]))
+        return [names[position] for position in candidates[:limit]]
+
+    # ========================== REFRESH ==========================
+    def refreshing(self):
+        return self.refresh_thread is not None and self.refresh_thread.is_alive()
+
+    def wait_for_refresh(self, timeout=None):
+        if self.refresh_thread is not None:
+            self.refresh_thread.join(timeout)
+
+def refresh_client_names(index, index_file: Path, clients_root: Path, saved=None, max_age_hours=24):
+    """
+    Re-lists clients_root into index (and index_file) unless saved is still current: same root mtime and listed
+    less than max_age_hours ago. Returns True when the names were re-listed.
+    """
+    # Stat before listing, a folder added while listing then shows up as a changed mtime next time
+    root_mtime_ns = os.stat(clients_root).st_mtime_ns
+    if (saved and saved.get("root_mtime_ns") == root_mtime_ns
+            and time.time() - saved.get("listed_at", 0) < max_age_hours * 3600):
+        return False
+
+    clients = [client for client, _ in list_client_folders(clients_root)]
+    index.set_clients(clients)
+    save_client_names(index_file, {"clients_root": str(clients_root), "root_mtime_ns": root_mtime_ns,
+                                   "listed_at": time.time(), "clients": clients})
+    return True
+
+def background_refresh(index, index_file, clients_root, saved, max_age_hours):
+    # A share that is down keeps the saved names, the caller can look at refresh_error
+    try:
+        refresh_client_names(index, index_file, clients_root, saved, max_age_hours)
+    except OSError as e:
+        index.refresh_error = e
+
+def open_client_name_index(index_file: Path, clients_root: Path, max_age_hours=24):
+    """
+    Returns a ClientNameIndex answered from index_file straight away, refreshing it from clients_root on a
+    background thread. Without a usable saved list the share is listed first, like before.
+    """
+    saved = load_client_names(index_file, clients_root)
+    if saved is None:
+        index = ClientNameIndex([])
+        refresh_client_names(index, index_file, clients_root, None, max_age_hours)
+        return index
+
+    index = ClientNameIndex(saved["clients"])
+    index.refresh_thread = threading.Thread(target=background_refresh, daemon=True,
+                                            args=(index, index_file, clients_root, saved, max_age_hours))
+    index.refresh_thread.start()
+    return index
+
+# ========================== FILE ==========================
+def load_client_names(index_file: Path, clients_root: Path):
+    # The saved state, or None when there is none for clients_root (missing, unreadable or another root)
+    if not index_file.exists():
+        return None
+    try:
+        with index_file.open("r", encoding="utf-8") as file:
+            saved = json.load(file)
+    except (OSError, ValueError) as e:
+        print(f"Warning: Ignoring unreadable client name index {index_file}: {e}")
+        return None
+    if not isinstance(saved, dict) or saved.get("clients_root") != str(clients_root) or not isinstance(saved.get("clients"), list):
+        return None
+    return saved
+
+def save_client_names(index_file: Path, saved: dict):
+    try:
+        write_atomically(index_file, json.dumps(saved))
+    except OSError as e:
+        print(f"Warning: Could not save client name index {index_file}: {e}")
@@ -0,0 +1,99 @@
+# Client Tree Index
+# One os.scandir pass over the client share that classifies every Input file with a single compiled pattern.
+# Later stages (summary DB checks, debug scanning, the result cache) read from this index instead of calling
+# exists()/iterdir()/glob() and re-running regexes themselves, which matters on the network share where
+# every metadata call is a round-trip. On Windows DirEntry.stat() comes back with the directory listing,
+# so the size and mtime stored here for the result cache cost nothing extra. Access lock files (.ldb/.laccdb)
+# are picked up by the same pass and mark their summary database as locked (ingestion still has it open).
+#
+# Index entry for one client ("exists" is False with error set when the folder is there but can't be listed):
+# {
+#     "client": "<client>", "folder_loc": Path(".../Source/<date>/Input"), "exists": True, "error": None,
+#     "summary_dbs": [{"path": Path, "name": str, "date": "2024-04-16", "identifier": "10.0.0.1",
+#                      "is_custom_fw": False, "size": int, "mtime_ns": int, "locked": False}, ...],
+#     "syslogs": {"10.0.0.1": Path(".../2024-04-16-00-010.000.000.001-Syslog.txt"), ...}
+# }
+
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+ip_pattern = r"\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3}"
+
+# ========================== PATTERN ==========================
+def build_input_file_pattern(custom_fw_names):
+    # One pattern for every file kind we care about. Which named group matched tells us the kind.
+    fw_names = "|".join(map(re.escape, custom_fw_names))
+    return re.compile(
+        r"^(?:"
+        fr"(?P<mdb_date>\d{{4}}-\d{{2}}-\d{{2}})-(?:(?P<mdb_ip>{ip_pattern})|(?P<mdb_name>{fw_names}))-Summary-firewall\.mdb"
+        r"|"
+        fr"(?P<syslog_date>\d{{4}}-\d{{2}}-\d{{2}})?.*-(?P<syslog_ip>{ip_pattern})-Syslog\.txt"
+        r"|"
+        r"(?P<lock_stem>.+-Summary-firewall)\.(?:ldb|laccdb)"
+        r")$",
+        re.IGNORECASE
+    )
+
+def normalize_ip(ip):
+    # 010.000.000.001 -> 10.0.0.1
+    return ".".join(str(int(octet)) for octet in ip.split("."))
+
+# ========================== INDEXING ==========================
+def list_client_folders(clients_folder: Path):
+    # Returns [(client_name, client_path)] in directory order, same order iterdir() gives
+    with os.scandir(clients_folder) as entries:
+        return [(entry.name, Path(entry.path)) for entry in entries if entry.is_dir()]
+
+def index_input_folder(client, folder_loc: Path, input_file_pattern):
+    index = {"client": client, "folder_loc": folder_loc, "exists": True, "error": None, "summary_dbs": [], "syslogs": {}}
+    try:
+        list_input_folder(index, folder_loc, input_file_pattern)
+    except FileNotFoundError:
+        index.update({"exists": False, "summary_dbs": [], "syslogs": {}})
+    except OSError as e:
+        # Permissions, a file where the folder should be, the share dropping mid-listing: one client's problem
+        index.update({"exists": False, "error": str(e), "summary_dbs": [], "syslogs": {}})
+    return index
+
+def list_input_folder(index, folder_loc: Path, input_file_pattern):
+    lock_stems = set()
+    with os.scandir(folder_loc) as entries:
+        for entry in entries:
+            file_match = input_file_pattern.match(entry.name)
+            if not file_match:
+                continue
+
+            if file_match.group("mdb_date"):
+                stat = entry.stat()
+                is_custom_fw = file_match.group("mdb_ip") is None
+                index["summary_dbs"].append({
+                    "path": Path(entry.path),
+                    "name": entry.name,
+                    "date": file_match.group("mdb_date"),
+                    "identifier": file_match.group("mdb_name").upper() if is_custom_fw else normalize_ip(file_match.group("mdb_ip")),
+                    "is_custom_fw": is_custom_fw,
+                    "size": stat.st_size,
+                    "mtime_ns": stat.st_mtime_ns,
+                    "locked": False
+                })
+            elif file_match.group("lock_stem"):
+                lock_stems.add(file_match.group("lock_stem").lower())
+            else:
+                # First syslog wins for an IP, same as the old next(glob(...))
+                index["syslogs"].setdefault(normalize_ip(file_match.group("syslog_ip")), Path(entry.path))
+
+    for summary_db in index["summary_dbs"]:
+        summary_db["locked"] = summary_db["path"].stem.lower() in lock_stems
+
+def index_input_folders(folders, input_file_pattern, workers=16):
+    """
+    Indexes [(client, folder_loc)] and returns the index entries in the same order.
+    Listings run on a thread pool because each one is mostly waiting on the share.
+    """
+    if workers <= 1 or len(folders) <= 1:
+        return [index_input_folder(client, folder_loc, input_file_pattern) for client, folder_loc in folders]
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(lambda folder: index_input_folder(folder[0], folder[1], input_file_pattern), folders))
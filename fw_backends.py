@@ -0,0 +1,174 @@
+# Summary Database Backends
+# Everything the checker needs from a *-Summary-firewall.mdb goes through one of these:
+# 1. the TrafficSummary condition probe, optionally with traffic statistics or on a bounded sample (see fw_condition_probe.py)
+# 2. the Firewalls IP lookup for custom-named firewalls
+#
+# Backends:
+# "odbc"     - Microsoft Access ODBC driver through pyodbc, what runs on the jump host
+# "sqlite"   - the summary file is a SQLite database with the same tables, used for synthetic client trees
+# "mdbtools" - real .mdb files on Linux, tables are exported with mdb-export into an in-memory SQLite copy
+#
+# get_backend() builds each backend once per process (driver lookup, pooling, tool discovery) and hands back
+# the same instance for every database that process checks, pool workers included.
+#
+# Every backend takes a connect timeout and a query timeout. They are enforced by the driver where it can
+# (ODBC login/query timeouts, SQLite busy timeout + progress handler), the checker adds a hard deadline on top.
+
+import csv
+import io
+import shutil
+import sqlite3
+import subprocess
+import time
+from pathlib import Path
+
+from fw_condition_probe import probe_conditions, probe_traffic, sample_conditions
+
+# Columns the checker reads, also the schema used by the SQLite stand-in
+summary_schema = {
+    "TrafficSummary": {"Direction": "TEXT", "Bytes": "INTEGER", "Allowed": "TEXT"},
+    "Firewalls": {"Firewall": "TEXT"}
+}
+
+# Error text that means "locked or slow, try again later" rather than "broken", across drivers
+transient_error_markers = [
+    "timeout", "timed out", "hyt00", "hyt01", "locked", "already in use", "could not lock", "interrupted",
+    "-1032", "-1102"
+]
+
+def is_transient_error(exception):
+    if isinstance(exception, TimeoutError):
+        return True
+    message = str(exception).lower()
+    return any(marker in message for marker in transient_error_markers)
+
+# ========================== BASE ==========================
+class SummaryBackend:
+    name = None
+
+    def connect(self, db_path, timeout=None):
+        # Returns an open DB-API connection for one summary database, timeout is in seconds
+        raise NotImplementedError
+
+    def apply_query_timeout(self, connection, seconds):
+        # Makes queries on the connection fail once they run longer than seconds, where the driver supports it
+        pass
+
+    def probe_conditions(self, connection, table, conditions, strategy="short-circuit"):
+        cursor = connection.cursor()
+        try:
+            return probe_conditions(cursor, table, conditions, strategy)
+        finally:
+            cursor.close()
+
+    def probe_traffic(self, connection, table, conditions, statistics):
+        cursor = connection.cursor()
+        try:
+            return probe_traffic(cursor, table, conditions, statistics)
+        finally:
+            cursor.close()
+
+    def first_rows_query(self, table, rows):
+        # The first rows of a table in this backend's SQL dialect, the sampled probe's bounded read
+        return f"SELECT * FROM {table} LIMIT {int(rows)}"
+
+    def sample_conditions(self, connection, table, conditions, rows):
+        cursor = connection.cursor()
+        try:
+            return sample_conditions(cursor, conditions, self.first_rows_query(table, rows), rows)
+        finally:
+            cursor.close()
+
+    def firewall_ips(self, connection):
+        # Normalized, de-duplicated IPs from the Firewalls table
+        cursor = connection.cursor()
+        try:
+            cursor.execute("SELECT Firewall FROM Firewalls")
+            return list({
+                ".".join(str(int(octet)) for octet in row[0].split(".")) for row in cursor.fetchall()
+            })
+        finally:
+            cursor.close()
+
+# ========================== ODBC (ACCESS) ==========================
+class OdbcAccessBackend(SummaryBackend):
+    name = "odbc"
+    preferred_drivers = ["Microsoft Access Driver (*.mdb, *.accdb)", "Microsoft Access Driver (*.mdb)"]
+
+    def __init__(self):
+        import pyodbc  # Only needed on hosts that actually use the Access driver
+        self.pyodbc = pyodbc
+
+        # Let the driver manager keep connections around between databases, must be set before the first connect
+        pyodbc.pooling = True
+
+        # Resolve the driver once instead of rebuilding the connection string from scratch for every file
+        installed = set(pyodbc.drivers())
+        driver = next((name for name in self.preferred_drivers if name in installed), self.preferred_drivers[0])
+        self.connection_prefix = f"DRIVER={{{driver}}};"
+
+    def connect(self, db_path, timeout=None):
+        return self.pyodbc.connect(f"{self.connection_prefix}DBQ={db_path};", timeout=int(timeout or 0))
+
+    def apply_query_timeout(self, connection, seconds):
+        connection.timeout = int(seconds)
+
+    def first_rows_query(self, table, rows):
+        # Jet has no LIMIT, TOP without ORDER BY stops reading after that many rows
+        return f"SELECT TOP {int(rows)} * FROM {table}"
+
+# ========================== SQLITE ==========================
+class SqliteBackend(SummaryBackend):
+    name = "sqlite"
+
+    def connect(self, db_path, timeout=None):
+        # Read-only so a check can never modify a summary database. timeout is how long to wait on a write lock.
+        return sqlite3.connect(f"{Path(db_path).resolve().as_uri()}?mode=ro", uri=True, timeout=timeout or 5.0)
+
+    def apply_query_timeout(self, connection, seconds):
+        # SQLite has no query timeout, abort from the progress handler instead ("interrupted")
+        deadline = time.monotonic() + seconds
+        connection.set_progress_handler(lambda: time.monotonic() > deadline, 10000)
+
+# ========================== MDBTOOLS ==========================
+class MdbToolsBackend(SqliteBackend):
+    name = "mdbtools"
+
+    def __init__(self):
+        self.mdb_export = shutil.which("mdb-export")
+        if not self.mdb_export:
+            raise RuntimeError("mdb-export not found, install mdbtools to use the mdbtools backend")
+
+    def connect(self, db_path, timeout=None):
+        connection = sqlite3.connect(":memory:")
+        for table, columns in summary_schema.items():
+            connection.execute(f"CREATE TABLE {table} ({', '.join(f'{column} {kind}' for column, kind in columns.items())})")
+            try:
+                exported = subprocess.run([self.mdb_export, str(db_path), table], capture_output=True, text=True, timeout=timeout)
+            except subprocess.TimeoutExpired:
+                connection.close()
+                raise TimeoutError(f"mdb-export timed out after {timeout}s on {table}")
+            if exported.returncode != 0:
+                # Table missing from this file, drop it so the query fails like it would through the driver
+                connection.execute(f"DROP TABLE {table}")
+                continue
+
+            reader = csv.DictReader(io.StringIO(exported.stdout))
+            placeholders = ", ".join("?" for _ in columns)
+            connection.executemany(
+                f"INSERT INTO {table} VALUES ({placeholders})",
+                ([row.get(column) for column in columns] for row in reader)
+            )
+        return connection
+
+# ========================== REGISTRY ==========================
+backend_classes = {backend.name: backend for backend in (OdbcAccessBackend, SqliteBackend, MdbToolsBackend)}
+_backends = {}
+
+def get_backend(name):
+    # One instance per backend per process
+    if name not in _backends:
+        if name not in backend_classes:
+            raise ValueError(f"Unknown summary backend '{name}', expected one of: {', '.join(backend_classes)}")
+        _backends[name] = backend_classes[name]()
+    return _backends[name]
@@ -0,0 +1,102 @@
+# Condition Probe Engine
+# Answers "which logging conditions does this TrafficSummary table show?" without the old five-way UNION.
+# Conditions are declared as {name: SQL predicate} and every probe is built from that, so adding a condition
+# is one more column in the same scan instead of one more pass over the table.
+#
+# Two strategies:
+# 1. "short-circuit" - one scan that only returns rows matching a still-unproven condition. When the first batch
+#    proves something the query is reissued once for whatever is left, so a healthy table is answered from the
+#    first few rows and only the conditions that are really missing pay for reading the rest of the table. Later
+#    proofs don't restart the scan (that would read the prefix again), it runs on to the end for the rest, so the
+#    whole probe stays within about one pass.
+# 2. "aggregate" - one MAX(IIF(...)) row per table. Always exactly one full pass, useful when the rows that
+#    prove conditions are known to sit at the end of the table.
+#
+# 3. "sampled" (sample_conditions) - the short-circuit probe over the first sample_rows rows only, a bounded cost
+#    whatever the size of the table. Conditions found are proven present. If the table turned out smaller than the
+#    sample it was read whole and the rest are proven absent, otherwise they are inconclusive and need a full scan.
+#
+# probe_traffic() is the aggregate pass with traffic statistics ({name: SQL aggregate}, e.g. row count and bytes
+# per direction) as extra columns of the same row, so volumes come out of the one scan that proves the conditions.
+#
+# Only IIF and plain predicates are used so the same SQL runs on the Access driver and on SQLite.
+
+# ========================== QUERY BUILDERS ==========================
+def build_probe_query(table, conditions):
+    # One 0/1 column per condition, restricted to rows that prove at least one of them
+    columns = ", ".join(f"IIF({predicate}, 1, 0) AS c{index}" for index, predicate in enumerate(conditions.values()))
+    where = " OR ".join(f"({predicate})" for predicate in conditions.values())
+    return f"SELECT {columns} FROM {table} WHERE {where}"
+
+def build_aggregate_query(table, conditions, statistics=None):
+    # A single row with one 0/1 column per condition, followed by one column per statistic
+    columns = [f"MAX(IIF({predicate}, 1, 0)) AS c{index}" for index, predicate in enumerate(conditions.values())]
+    columns += [f"{expression} AS s{index}" for index, expression in enumerate((statistics or {}).values())]
+    return f"SELECT {', '.join(columns)} FROM {table}"
+
+# ========================== PROBE ==========================
+def probe_conditions(cursor, table, conditions, strategy="short-circuit", batch_size=256):
+    """
+    Runs the condition probe on an open DB-API cursor and returns the names of the conditions found,
+    in the order they were declared.
+    """
+    if not conditions:
+        return []
+
+    if strategy == "aggregate":
+        cursor.execute(build_aggregate_query(table, conditions))
+        row = cursor.fetchone()
+        return [name for name, hit in zip(conditions, row or ()) if hit]
+
+    pending = dict(conditions)
+    proven = set()
+    cursor.execute(build_probe_query(table, pending))
+    scan_names = list(pending)
+    reissued = False
+    while pending:
+        rows = cursor.fetchmany(batch_size)
+        # The scan ran to the end, whatever is left is absent
+        if not rows:
+            break
+
+        for row in rows:
+            proven.update(name for name, hit in zip(scan_names, row) if hit)
+        still_pending = {name: predicate for name, predicate in pending.items() if name not in proven}
+
+        # Reissuing drops the proven predicates (and their rows) from the scan but starts it over. Worth it once, the
+        # first proofs normally come from the first rows (the common conditions) and the rare ones get a scan of
+        # their own. Past that the open scan carries on, rows of conditions proven meanwhile are just skipped.
+        if still_pending and len(still_pending) < len(pending) and not reissued:
+            cursor.execute(build_probe_query(table, still_pending))
+            scan_names = list(still_pending)
+            reissued = True
+        pending = still_pending
+
+    return [name for name in conditions if name in proven]
+
+def probe_traffic(cursor, table, conditions, statistics):
+    """
+    Runs the aggregate probe with statistics ({name: SQL aggregate}) in the same pass and returns
+    (names of the conditions found, {name: value}). Sums over an empty table (NULL) come back as 0.
+    """
+    cursor.execute(build_aggregate_query(table, conditions, statistics))
+    row = cursor.fetchone() or (None,) * (len(conditions) + len(statistics))
+    found = [name for name, hit in zip(conditions, row) if hit]
+    return found, {name: value or 0 for name, value in zip(statistics, row[len(conditions):])}
+
+def sample_conditions(cursor, conditions, sample, sample_rows):
+    """
+    Runs the short-circuit probe on sample, the SQL for the first sample_rows rows of a table (see
+    SummaryBackend.first_rows_query), and returns (names of the conditions found, names of the conditions the
+    sample couldn't settle), in declared order.
+    """
+    found = probe_conditions(cursor, f"({sample}) AS first_rows", conditions)
+    missing = [name for name in conditions if name not in found]
+    if not missing:
+        return found, []
+
+    # Fewer rows than asked for means the sample was the whole table, what it didn't find isn't there
+    cursor.execute(f"SELECT COUNT(*) FROM ({sample}) AS first_rows")
+    if cursor.fetchone()[0] < sample_rows:
+        return found, []
+    return found, missing
@@ -0,0 +1,282 @@
+# Fleet Evaluation
+# Workers only report what they saw per summary database (which conditions were found, see check_mdb_file). Everything
+# judged against expectations happens here in the main process, for a whole client's firewalls at once: the observed
+# states go into a fleet-wide boolean matrix (firewalls x conditions) and are compared in bulk with an expected
+# matrix built from expected_conditions plus the overrides in client_fw_exceptions_file. The same step gives each
+# firewall its misconfigurations, status, severity and failover partner, and the fleet summary (counts per condition
+# and per vendor) is read off the matrix at the end without touching a database again.
+# With a traffic_baseline (fw_traffic_baseline.py) the same step compares each firewall's traffic statistics with its
+# own recent dates. Anomalies are listed in traffic_anomalies and raise an INFO severity to WARNING, the status stays.
+#
+# Status:
+# "optimal"       - every checked condition is as expected
+# "no_data"       - none of the TrafficSummary conditions were found (outage, or an idle failover partner)
+# "standby"       - no data, but its failover partner (failover_lookup) has data for the same date
+# "misconfigured" - anything else, misconfigurations lists the conditions that differ (empty for every other status)
+# Deferred and error records keep their status, they only get their failover partner. Conditions a sampled probe
+# left inconclusive aren't compared, and a firewall with any of them isn't called No Data (it wasn't proven empty).
+#
+# Overrides (client_fw_exceptions_file, JSON), true/false replaces the expected value, null stops checking it:
+# {
+#     "<client>": {
+#         "Denied Traffic": false,
+#         "firewalls": {"10.0.0.1": {"Debug Events": null}, "CORP": {"Inbound Traffic": false}}
+#     }
+# }
+
+import json
+from pathlib import Path
+import numpy as np
+from grab_firewall_failovers import build_failover_lookup
+
+statuses = ["optimal", "misconfigured", "no_data", "standby"]
+severity_for_status = ["INFO", "WARNING", "ERROR", "INFO"]
+
+# ========================== OVERRIDES ==========================
+def load_client_fw_exceptions(exceptions_file: Path, condition_names):
+    # Returns {client: {"conditions": {name: bool or None}, "firewalls": {firewall: {name: bool or None}}}}
+    if not exceptions_file.exists():
+        return {}
+    try:
+        with exceptions_file.open("r", encoding="utf-8") as file:
+            raw = json.load(file)
+    except (OSError, ValueError) as e:
+        print(f"Warning: Ignoring unreadable client firewall exceptions {exceptions_file}: {e}")
+        return {}
+
+    def conditions_from(entry, where):
+        conditions = {}
+        for name, value in entry.items():
+            if name not in condition_names or not (value is None or isinstance(value, bool)):
+                print(f"Warning: Ignoring exception {name}={value!r} for {where}, not a condition set to true/false/null")
+                continue
+            conditions[name] = value
+        return conditions
+
+    overrides = {}
+    for client, entry in raw.items():
+        entry = dict(entry)
+        firewalls = entry.pop("firewalls", {})
+        overrides[client] = {
+            "conditions": conditions_from(entry, client),
+            "firewalls": {firewall: conditions_from(conditions, f"{client} {firewall}") for firewall, conditions in firewalls.items()}
+        }
+    return overrides
+
+# ========================== EVALUATOR ==========================
+class FleetEvaluator:
+    """
+    Classifies firewall records in bulk and keeps every result in a fleet-wide matrix, one row per
+    (client, folder_date, firewall). A retried or rechecked firewall replaces its row.
+    Usage: for records in evaluator.evaluate_batches(work_pool.results()): dispatch_records(records, consumers)
+    """
+    def __init__(self, expected_conditions, probed_condition_names, overrides=None, failover_pairs=None, metrics=None,
+                 traffic_baseline=None, capacity=1024):
+        self.metrics = metrics
+        self.traffic_baseline = traffic_baseline
+        self.condition_names = list(expected_conditions)
+        self.default_expected = np.array([expected_conditions[name] for name in self.condition_names], dtype=bool)
+        self.probed_columns = np.array([name in probed_condition_names for name in self.condition_names], dtype=bool)
+        self.overrides = overrides or {}
+        self.expectations = {}  # (client, firewall) -> (expected row, checked row), only for clients with overrides
+        self.column_bits = 1 << np.arange(len(self.condition_names))
+        self.names_for_mask = {}  # mismatch bitmask -> condition names, a handful of distinct masks per fleet
+        self.set_failover_pairs(failover_pairs or {})
+
+        # Fleet matrix, grown by doubling
+        self.rows = 0
+        self.row_for = {}
+        self.row_keys = []
+        self.observed = np.zeros((capacity, len(self.condition_names)), dtype=bool)
+        self.mismatched = np.zeros_like(self.observed)
+        self.status_codes = np.zeros(capacity, dtype=np.int8)
+        self.vendor_codes = np.zeros(capacity, dtype=np.int32)
+        self.anomalous = np.zeros(capacity, dtype=bool)
+        self.unsettled = np.zeros(capacity, dtype=bool)
+        self.vendor_names = []
+        self.vendor_code_for = {}
+
+    def set_failover_pairs(self, failover_pairs):
+        # {client: [[primary, secondary], ...]}, replaced when watch mode moves to a new folder date
+        self.failover_lookups = {client: build_failover_lookup(pairs) for client, pairs in failover_pairs.items()}
+
+    def expectation_for(self, client, firewall):
+        key = (client, firewall)
+        if key not in self.expectations:
+            expected = self.default_expected.copy()
+            checked = np.ones(len(self.condition_names), dtype=bool)
+            # Client-wide first, the firewall's own entry wins
+            client_overrides = self.overrides[client]
+            for overrides in (client_overrides["conditions"], client_overrides["firewalls"].get(firewall, {})):
+                for name, value in overrides.items():
+                    column = self.condition_names.index(name)
+                    checked[column] = value is not None
+                    expected[column] = bool(value)
+            self.expectations[key] = (expected, checked)
+        return self.expectations[key]
+
+    def condition_names_for(self, mask):
+        if mask not in self.names_for_mask:
+            self.names_for_mask[mask] = [name for column, name in enumerate(self.condition_names) if mask >> column & 1]
+        return list(self.names_for_mask[mask])
+
+    def row_for_key(self, key):
+        row = self.row_for.get(key)
+        if row is None:
+            if self.rows == len(self.status_codes):
+                self.grow()
+            row = self.rows
+            self.row_for[key] = row
+            self.row_keys.append(key)
+            self.rows += 1
+        return row
+
+    def grow(self):
+        capacity = len(self.status_codes) * 2
+        self.observed = np.resize(self.observed, (capacity, len(self.condition_names)))
+        self.mismatched = np.resize(self.mismatched, (capacity, len(self.condition_names)))
+        self.status_codes = np.resize(self.status_codes, capacity)
+        self.vendor_codes = np.resize(self.vendor_codes, capacity)
+        self.anomalous = np.resize(self.anomalous, capacity)
+        self.unsettled = np.resize(self.unsettled, capacity)
+
+    def vendor_code(self, vendor):
+        vendor = vendor or "Custom"
+        if vendor not in self.vendor_code_for:
+            self.vendor_code_for[vendor] = len(self.vendor_names)
+            self.vendor_names.append(vendor)
+        return self.vendor_code_for[vendor]
+
+    def evaluate(self, records):
+        # Fills misconfigurations, status, severity, failover_partner and traffic_anomalies of the firewall records in place
+        firewall_records = [record for record in records if record["record_type"] == "firewall"]
+        for record in firewall_records:
+            record["failover_partner"] = self.failover_lookups.get(record["client"], {}).get(record["firewall_identifier"])
+        checked_records = [record for record in firewall_records if record["status"] == "checked"]
+        if not checked_records:
+            return records
+
+        keys = [(record["client"], record["folder_date"], record["firewall_identifier"]) for record in checked_records]
+        rows = np.array([self.row_for_key(key) for key in keys])
+        observed = np.array([[record["conditions"][name] for name in self.condition_names] for record in checked_records], dtype=bool)
+        self.observed[rows] = observed
+
+        # Everyone expects the defaults, only firewalls of clients with overrides get their own rows
+        expected = np.tile(self.default_expected, (len(keys), 1))
+        checked = np.ones_like(expected)
+        for position, (client, _, firewall) in enumerate(keys):
+            if client in self.overrides:
+                expected[position], checked[position] = self.expectation_for(client, firewall)
+
+        # Whatever the sampled probe couldn't settle is neither a mismatch nor a sign of no data
+        unsettled = np.zeros_like(observed)
+        for position, record in enumerate(checked_records):
+            for name in record["inconclusive"]:
+                unsettled[position, self.condition_names.index(name)] = True
+        checked &= ~unsettled
+
+        # The whole classification, one pass over the batch
+        mismatched = (observed != expected) & checked
+        has_data = observed[:, self.probed_columns].any(axis=1) | unsettled.any(axis=1)
+        status_codes = np.where(mismatched.any(axis=1), statuses.index("misconfigured"), statuses.index("optimal"))
+        status_codes = np.where(has_data, status_codes,
+                                np.where(self.partner_has_data(keys), statuses.index("standby"), statuses.index("no_data")))
+        # A firewall without data isn't misconfigured, its expected conditions are missing because the data is
+        mismatched &= has_data[:, None]
+
+        self.mismatched[rows] = mismatched
+        self.unsettled[rows] = unsettled.any(axis=1)
+        self.status_codes[rows] = status_codes
+        self.vendor_codes[rows] = [self.vendor_code(record["vendor"]) for record in checked_records]
+
+        for record, status_code, mask in zip(checked_records, status_codes.tolist(), (mismatched @ self.column_bits).tolist()):
+            record.update({
+                "misconfigurations": self.condition_names_for(mask),
+                "status": statuses[status_code],
+                "severity": severity_for_status[status_code]
+            })
+
+        if self.traffic_baseline is not None:
+            self.traffic_baseline.annotate(checked_records)
+            for record in checked_records:
+                if record["traffic_anomalies"] and record["severity"] == "INFO":
+                    record["severity"] = "WARNING"
+            self.anomalous[rows] = [bool(record["traffic_anomalies"]) for record in checked_records]
+        return records
+
+    def partner_has_data(self, keys):
+        # Whether each firewall's failover partner has a row with data for the same date (False when unknown)
+        partner_rows = np.array([self.row_for.get((client, folder_date, self.failover_lookups.get(client, {}).get(firewall)), -1)
+                                 for client, folder_date, firewall in keys], dtype=np.int64)
+        has_data = np.zeros(len(keys), dtype=bool)
+        known_partners = partner_rows >= 0
+        has_data[known_partners] = self.observed[partner_rows[known_partners]][:, self.probed_columns].any(axis=1)
+        return has_data
+
+    def evaluate_batches(self, results):
+        """
+        Regroups a stream of record lists into one batch per client (a new batch starts at every client or section
+        record) and evaluates each, so failover partners checked as separate databases meet in the same batch.
+        """
+        batch = []
+        for records in results:
+            for record in records:
+                if batch and record["record_type"] in ("client", "section"):
+                    yield self.timed_evaluate(batch)
+                    batch = []
+                batch.append(record)
+        if batch:
+            yield self.timed_evaluate(batch)
+
+    def timed_evaluate(self, records):
+        if self.metrics is None:
+            return self.evaluate(records)
+        with self.metrics.phase("evaluate"):
+            return self.evaluate(records)
+
+    # ========================== SUMMARY ==========================
+    def summary(self):
+        """
+        Fleet summary off the matrix: {"firewalls", "statuses": {status: n}, "traffic_anomalies", "inconclusive",
+        "conditions": {name: {"found", "misconfigured"}}, "vendors": {vendor: {"firewalls", status: n, ...,
+        "misconfigurations": {name: n}}}}
+        """
+        observed = self.observed[:self.rows]
+        vendor_codes = self.vendor_codes[:self.rows]
+        # A partner that only came in later (e.g. a retried primary) still makes its idle partner a standby here
+        status_codes = self.status_codes[:self.rows].copy()
+        no_data = status_codes == statuses.index("no_data")
+        status_codes[no_data & self.partner_has_data(self.row_keys)] = statuses.index("standby")
+        mismatched = self.mismatched[:self.rows]
+
+        status_counts = np.bincount(status_codes, minlength=len(statuses))
+        found_counts = observed.sum(axis=0)
+        misconfigured_counts = mismatched.sum(axis=0)
+
+        # Per vendor: one bincount for the statuses, one grouped sum for the misconfigured conditions
+        vendor_count = len(self.vendor_names)
+        vendor_statuses = np.bincount(vendor_codes * len(statuses) + status_codes,
+                                      minlength=vendor_count * len(statuses)).reshape(vendor_count, len(statuses))
+        vendor_misconfigured = np.zeros((vendor_count, len(self.condition_names)), dtype=np.int64)
+        np.add.at(vendor_misconfigured, vendor_codes, mismatched)
+
+        return {
+            "firewalls": int(self.rows),
+            "statuses": {status: int(status_counts[code]) for code, status in enumerate(statuses)},
+            "traffic_anomalies": int(self.anomalous[:self.rows].sum()),
+            "inconclusive": int(self.unsettled[:self.rows].sum()),
+            "conditions": {name: {"found": int(found_counts[column]), "misconfigured": int(misconfigured_counts[column])}
+                           for column, name in enumerate(self.condition_names)},
+            "vendors": {
+                vendor: {
+                    "firewalls": int(vendor_statuses[code].sum()),
+                    **{status: int(vendor_statuses[code, status_code]) for status_code, status in enumerate(statuses)},
+                    "misconfigurations": {name: int(vendor_misconfigured[code, column])
+                                          for column, name in enumerate(self.condition_names) if vendor_misconfigured[code, column]}
+                }
+                for code, vendor in sorted(enumerate(self.vendor_names), key=lambda item: item[1].lower())
+            }
+        }
+
+    def summary_record(self):
+        return {"record_type": "fleet", "summary": self.summary()}
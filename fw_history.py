@@ -0,0 +1,300 @@
+# Results History
+# Every run's per-firewall results go into one local SQLite file so trend questions ("since when has 10.1.2.3
+# been missing Denied Traffic?", "which clients flipped to No Data this week?") are a query instead of grepping a
+# folder of text reports. One row per firewall per folder date, a rerun for the same date replaces its rows.
+# To keep a year of nightly runs small, names live once in the firewalls table, folder dates are integers
+# (20240416) and condition states are bit masks (bit numbers in the conditions table). The primary key and the
+# date index make the per-firewall and per-date queries below index lookups.
+#
+# Layout (SQLite):
+# runs       (run_id, started_at, folder_date, mode, specific_client)
+# conditions (bit, name)
+# firewalls  (firewall_id, client, firewall, vendor), UNIQUE (client, firewall), index on firewall
+# results    (firewall_id, folder_date, run_id, status, state_mask, misconfig_mask)
+#            PRIMARY KEY (firewall_id, folder_date), index on (folder_date, status)
+#
+# Usage: python fw_history.py <history.sqlite> first-seen 10.1.2.3 "Denied Traffic" [--client name]
+#        python fw_history.py <history.sqlite> flips no_data --since 20240410
+#        python fw_history.py <history.sqlite> regressions [--date 20240416]
+
+import argparse
+import sqlite3
+from datetime import datetime
+from pathlib import Path
+
+schema = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id INTEGER PRIMARY KEY,
+    started_at TEXT NOT NULL,
+    folder_date TEXT NOT NULL,
+    mode TEXT,
+    specific_client TEXT
+);
+CREATE TABLE IF NOT EXISTS conditions (
+    bit INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS firewalls (
+    firewall_id INTEGER PRIMARY KEY,
+    client TEXT NOT NULL,
+    firewall TEXT NOT NULL,
+    vendor TEXT,
+    UNIQUE (client, firewall)
+);
+CREATE INDEX IF NOT EXISTS firewalls_by_name ON firewalls (firewall);
+CREATE TABLE IF NOT EXISTS results (
+    firewall_id INTEGER NOT NULL,
+    folder_date INTEGER NOT NULL,
+    run_id INTEGER NOT NULL,
+    status TEXT NOT NULL,
+    state_mask INTEGER NOT NULL,
+    misconfig_mask INTEGER NOT NULL,
+    PRIMARY KEY (firewall_id, folder_date)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS results_by_date ON results (folder_date, status);
+"""
+
+# ========================== STORE ==========================
+def open_history(history_file: Path):
+    history_file.parent.mkdir(parents=True, exist_ok=True)
+    connection = sqlite3.connect(history_file)
+    connection.executescript(schema)
+    return connection
+
+def condition_bits(connection, condition_names):
+    # {name: bit}, new condition names get the next free bit so older rows keep their meaning
+    bits = dict(connection.execute("SELECT name, bit FROM conditions").fetchall())
+    for name in condition_names:
+        if name not in bits:
+            bits[name] = max(bits.values(), default=-1) + 1
+            connection.execute("INSERT INTO conditions VALUES (?, ?)", (bits[name], name))
+    return bits
+
+def mask_for(names, bits):
+    mask = 0
+    for name in names:
+        mask |= 1 << bits[name]
+    return mask
+
+def names_for(mask, bits):
+    return [name for name, bit in sorted(bits.items(), key=lambda item: item[1]) if mask & (1 << bit)]
+
+class HistoryWriter:
+    """
+    Consumer for the checker's record stream (see fw_report_records.py), stores every checked firewall.
+    Deferred and inconclusive (sampled) results are left out, the retry or full scan (or an earlier run for the
+    same date) is the one worth keeping. Errors (locked or unreadable mdb) only fill a date nothing else has
+    recorded, a rerun that fails doesn't replace the result an earlier run for the date got.
+    """
+    def __init__(self, history_file: Path, folder_date, condition_names, mode=None, specific_client=None, batch_size=500):
+        self.connection = open_history(history_file)
+        self.bits = condition_bits(self.connection, condition_names)
+        self.run_id = self.connection.execute(
+            "INSERT INTO runs (started_at, folder_date, mode, specific_client) VALUES (?, ?, ?, ?)",
+            (datetime.now().strftime("%Y-%m-%d %H:%M:%S"), folder_date, mode, specific_client)
+        ).lastrowid
+        self.firewall_ids = {}
+        self.vendors = {}
+        for firewall_id, client, firewall, vendor in self.connection.execute("SELECT firewall_id, client, firewall, vendor FROM firewalls"):
+            self.firewall_ids[(client, firewall)] = firewall_id
+            self.vendors[firewall_id] = vendor
+        self.batch_size = batch_size
+        self.batch = []
+        self.error_batch = []
+
+    def handle(self, record):
+        if record["record_type"] != "firewall" or record["status"] == "deferred" or record["inconclusive"]:
+            return
+        state_mask = mask_for([name for name, state in record["conditions"].items() if state and name in self.bits], self.bits)
+        misconfig_mask = mask_for([name for name in record["misconfigurations"] if name in self.bits], self.bits)
+        batch = self.error_batch if record["status"] == "error" else self.batch
+        batch.append((self.firewall_id(record), int(record["folder_date"]), self.run_id, record["status"],
+                      state_mask, misconfig_mask))
+        if len(batch) >= self.batch_size:
+            self.flush()
+
+    def firewall_id(self, record):
+        key = (record["client"], record["firewall_identifier"])
+        firewall_id = self.firewall_ids.get(key)
+        if firewall_id is None:
+            firewall_id = self.connection.execute(
+                "INSERT INTO firewalls (client, firewall, vendor) VALUES (?, ?, ?)", (*key, record["vendor"])
+            ).lastrowid
+            self.firewall_ids[key] = firewall_id
+        elif record["vendor"] and record["vendor"] != self.vendors.get(firewall_id):
+            self.connection.execute("UPDATE firewalls SET vendor = ? WHERE firewall_id = ?", (record["vendor"], firewall_id))
+        self.vendors[firewall_id] = record["vendor"] or self.vendors.get(firewall_id)
+        return firewall_id
+
+    def flush(self):
+        if self.batch:
+            self.connection.executemany("INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?)", self.batch)
+            self.batch = []
+        if self.error_batch:
+            # After the batch above, a retry in this run that got through wins over its earlier error
+            self.connection.executemany("INSERT OR IGNORE INTO results VALUES (?, ?, ?, ?, ?, ?)", self.error_batch)
+            self.error_batch = []
+        self.connection.commit()
+
+    def close(self):
+        self.flush()
+        self.connection.close()
+
+# ========================== QUERIES ==========================
+def first_seen(connection, firewall, condition, client=None):
+    """
+    For every client with this firewall: when the condition's current misconfiguration streak started, how many
+    recorded dates it has lasted and when it was first misconfigured at all. Streak is 0 if it's fine now.
+    Returns [{"client", "firewall", "condition", "streak_start", "streak_length", "first_ever", "last_date"}].
+    """
+    bits = dict(connection.execute("SELECT name, bit FROM conditions").fetchall())
+    if condition not in bits:
+        raise ValueError(f"Unknown condition: {condition} (known: {', '.join(bits)})")
+    bit = 1 << bits[condition]
+
+    query = ("SELECT firewalls.client, results.folder_date, results.misconfig_mask FROM firewalls"
+             " JOIN results ON results.firewall_id = firewalls.firewall_id WHERE firewalls.firewall = ?")
+    parameters = [firewall]
+    if client:
+        query += " AND firewalls.client = ?"
+        parameters.append(client)
+    query += " ORDER BY firewalls.client, results.folder_date DESC"
+
+    answers = {}
+    for row_client, folder_date, misconfig_mask in connection.execute(query, parameters):
+        folder_date = str(folder_date)
+        answer = answers.setdefault(row_client, {"client": row_client, "firewall": firewall, "condition": condition,
+                                                 "streak_start": None, "streak_length": 0, "first_ever": None,
+                                                 "last_date": folder_date, "streak_open": True})
+        if misconfig_mask & bit:
+            answer["first_ever"] = folder_date
+            if answer["streak_open"]:
+                answer["streak_start"] = folder_date
+                answer["streak_length"] += 1
+        else:
+            answer["streak_open"] = False
+
+    for answer in answers.values():
+        del answer["streak_open"]
+    return list(answers.values())
+
+def status_flips(connection, status, since):
+    """
+    Firewalls that changed to status on or after since (YYYYMMDD), with the status they had before.
+    Returns [{"client", "firewall", "folder_date", "previous_status", "previous_date"}] ordered by date.
+    """
+    # Date index finds the candidates, the primary key finds each one's previous row
+    rows = connection.execute("""
+        SELECT firewalls.client, firewalls.firewall, current.folder_date, previous.status, previous.folder_date
+        FROM results AS current
+        JOIN results AS previous ON previous.firewall_id = current.firewall_id AND previous.folder_date = (
+            SELECT MAX(folder_date) FROM results WHERE firewall_id = current.firewall_id AND folder_date < current.folder_date
+        )
+        JOIN firewalls ON firewalls.firewall_id = current.firewall_id
+        WHERE current.folder_date >= ? AND current.status = ? AND previous.status != current.status
+        ORDER BY current.folder_date, firewalls.client, firewalls.firewall
+    """, (int(since), status)).fetchall()
+    return [{"client": client, "firewall": firewall, "folder_date": str(folder_date), "previous_status": previous_status,
+             "previous_date": str(previous_date)} for client, firewall, folder_date, previous_status, previous_date in rows]
+
+def regressions(connection, folder_date=None):
+    """
+    Fleet-wide regressions in the run for folder_date (default: the latest run's): each firewall's first result
+    written by a run for that date against its own previous result, so date exception clients (filed under the
+    next day's folder) are compared too. Firewalls with newly misconfigured conditions or a status that got worse.
+    Returns (folder_date, firewalls compared, [{"client", "firewall", "vendor", "folder_date", "status",
+    "previous_date", "previous_status", "new_misconfigurations"}]).
+    """
+    if not folder_date:
+        # A backfill run's folder_date is "first to last", the last date is the one it ended on
+        folder_date = connection.execute("SELECT MAX(SUBSTR(folder_date, -8)) FROM runs").fetchone()[0]
+        if folder_date is None:
+            return None, 0, []
+
+    bits = dict(connection.execute("SELECT name, bit FROM conditions").fetchall())
+    status_rank = {"optimal": 0, "standby": 0, "misconfigured": 1, "no_data": 2, "error": 3}
+    # Date index finds the candidates, rows count if their run covered the date (runs.folder_date is one date or
+    # "first to last"), the primary key finds each firewall's row before its first one
+    rows = connection.execute("""
+        WITH firsts AS (
+            SELECT results.firewall_id, MIN(results.folder_date) AS folder_date
+            FROM results JOIN runs ON runs.run_id = results.run_id
+            WHERE results.folder_date >= :date AND SUBSTR(runs.folder_date, 1, 8) <= :day AND SUBSTR(runs.folder_date, -8) >= :day
+            GROUP BY results.firewall_id
+        )
+        SELECT firewalls.client, firewalls.firewall, firewalls.vendor, current.folder_date, current.status,
+               previous.folder_date, previous.status, current.misconfig_mask & ~previous.misconfig_mask
+        FROM firsts
+        JOIN results AS current ON current.firewall_id = firsts.firewall_id AND current.folder_date = firsts.folder_date
+        JOIN results AS previous ON previous.firewall_id = current.firewall_id AND previous.folder_date = (
+            SELECT MAX(folder_date) FROM results WHERE firewall_id = current.firewall_id AND folder_date < current.folder_date
+        )
+        JOIN firewalls ON firewalls.firewall_id = current.firewall_id
+        ORDER BY firewalls.client, firewalls.firewall
+    """, {"date": int(folder_date), "day": str(folder_date)}).fetchall()
+
+    found = []
+    for client, firewall, vendor, current_date, status, previous_date, previous_status, new_mask in rows:
+        if new_mask or status_rank.get(status, 0) > status_rank.get(previous_status, 0):
+            found.append({"client": client, "firewall": firewall, "vendor": vendor, "folder_date": str(current_date),
+                          "status": status, "previous_date": str(previous_date), "previous_status": previous_status,
+                          "new_misconfigurations": names_for(new_mask, bits)})
+    return str(folder_date), len(rows), found
+
+# ========================== CLI ==========================
+def main():
+    parser = argparse.ArgumentParser(description="Query the firewall results history.")
+    parser.add_argument("history_file", type=Path)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    first_seen_parser = commands.add_parser("first-seen", help="when a firewall's condition started being misconfigured")
+    first_seen_parser.add_argument("firewall", help="IP or custom firewall name, as in the report")
+    first_seen_parser.add_argument("condition", help='e.g. "Denied Traffic"')
+    first_seen_parser.add_argument("--client")
+
+    flips_parser = commands.add_parser("flips", help="firewalls that changed to a status since a date")
+    flips_parser.add_argument("status", choices=["optimal", "misconfigured", "no_data", "standby", "error"])
+    flips_parser.add_argument("--since", required=True, help="YYYYMMDD folder date")
+
+    regressions_parser = commands.add_parser("regressions", help="what got worse since the previous run")
+    regressions_parser.add_argument("--date", help="YYYYMMDD folder date of the run, defaults to the latest run's")
+    args = parser.parse_args()
+
+    if not args.history_file.exists():
+        parser.error(f"{args.history_file} does not exist")
+    connection = sqlite3.connect(f"{args.history_file.resolve().as_uri()}?mode=ro", uri=True)
+
+    if args.command == "first-seen":
+        answers = first_seen(connection, args.firewall, args.condition, args.client)
+        if not answers:
+            print(f"No history for {args.firewall}.")
+        for answer in answers:
+            if answer["streak_length"]:
+                print(f"{answer['client']} {answer['firewall']}: {answer['condition']} misconfigured since "
+                      f"{answer['streak_start']} ({answer['streak_length']} runs), first seen {answer['first_ever']}")
+            else:
+                first_ever = f", first misconfigured {answer['first_ever']}" if answer["first_ever"] else ""
+                print(f"{answer['client']} {answer['firewall']}: {answer['condition']} OK as of {answer['last_date']}{first_ever}")
+
+    elif args.command == "flips":
+        flips = status_flips(connection, args.status, args.since)
+        print(f"{len(flips)} firewall(s) changed to {args.status} since {args.since}")
+        for flip in flips:
+            print(f"     {flip['folder_date']}  {flip['client']} {flip['firewall']} (was {flip['previous_status']} on {flip['previous_date']})")
+
+    else:
+        folder_date, compared, found = regressions(connection, args.date)
+        if not compared:
+            print("Need at least two recorded dates to compare.")
+            return
+        print(f"{len(found)} regression(s) in the run for {folder_date} ({compared} firewall(s) compared with their previous date)")
+        for regression in found:
+            details = ", ".join(regression["new_misconfigurations"]) or f"{regression['previous_status']} -> {regression['status']}"
+            vendor = f" ({regression['vendor']})" if regression["vendor"] else ""
+            print(f"     {regression['client']} {regression['firewall']}{vendor}: {details} "
+                  f"({regression['previous_date']} -> {regression['folder_date']})")
+
+    connection.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+# Run Metrics
+# Phase timers, counters and histograms for one run of the checker (or the failover script), so a slow night can
+# be pinned on listing, connecting, the conditions query, the Firewalls lookup, the syslog scan or report writing.
+# Pool workers can't share a collector with the parent, so they send their timings back as "metric" records
+# ({"record_type": "metric", "phase": "connect", "seconds": 0.12}) and RunMetrics consumes the record stream
+# like the other writers in fw_report_records.py. Firewall records add the per database / per client totals.
+#
+# Exports:
+# Prometheus textfile - for node_exporter's textfile collector, replaced atomically at the end of every run
+# JSON                - everything below, one file per run next to the report
+#
+# Usage: metrics = RunMetrics("fw_logging")
+#        with metrics.phase("index_folders"): ...
+#        dispatch_records(records, [..., metrics])
+#        metrics.write_prometheus(path); metrics.write_json(path)
+
+import contextlib
+import json
+import os
+import time
+from pathlib import Path
+
+# Upper bounds in seconds, from a cached lookup up to a summary DB that needs its full query timeout
+default_buckets = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+# ========================== COLLECTOR ==========================
+class RunMetrics:
+    def __init__(self, job, buckets=default_buckets):
+        self.job = job
+        self.buckets = tuple(buckets)
+        self.started_at = time.time()
+        self.counters = {}
+        self.histograms = {}
+        self.database_seconds = {}  # (client, db_file) -> seconds, a retry replaces the deferred attempt
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start)
+
+    def observe(self, phase, seconds):
+        histogram = self.histograms.setdefault(phase, {"buckets": [0] * len(self.buckets), "count": 0, "sum": 0.0, "max": 0.0})
+        for position, bound in enumerate(self.buckets):
+            if seconds <= bound:
+                histogram["buckets"][position] += 1
+                break
+        histogram["count"] += 1
+        histogram["sum"] += seconds
+        histogram["max"] = max(histogram["max"], seconds)
+
+    def count(self, name, amount=1):
+        self.counters[name] = self.counters.get(name, 0) + amount
+
+    def handle(self, record):
+        # Consumer for the checker's record stream
+        record_type = record["record_type"]
+        if record_type == "metric":
+            self.observe(record["phase"], record["seconds"])
+        elif record_type == "client":
+            self.count(f"clients_{record['event']}")
+        elif record_type == "error":
+            self.count("unit_errors")
+        elif record_type == "firewall":
+            self.count(f"databases_{record['status']}")
+            if record["from_cache"]:
+                self.count("databases_from_cache")
+            if record["elapsed_seconds"] is not None:
+                self.observe("database", record["elapsed_seconds"])
+                self.database_seconds[(record["client"], record["db_file"])] = record["elapsed_seconds"]
+
+    # ========================== SUMMARY ==========================
+    def slowest(self, top=10):
+        # ([(client, seconds)], [(client, db_file, seconds)]), client time is the sum of its databases
+        client_seconds = {}
+        for (client, _), seconds in self.database_seconds.items():
+            client_seconds[client] = client_seconds.get(client, 0.0) + seconds
+        clients = sorted(client_seconds.items(), key=lambda item: item[1], reverse=True)[:top]
+        databases = sorted(((client, db_file, seconds) for (client, db_file), seconds in self.database_seconds.items()),
+                           key=lambda item: item[2], reverse=True)[:top]
+        return clients, databases
+
+    def summary_lines(self, top=10):
+        lines = ["Phase timings (count / total / max seconds):"]
+        for name, histogram in self.histograms.items():
+            lines.append(f"     {name:<20}{histogram['count']:>8}{histogram['sum']:>12.3f}{histogram['max']:>10.3f}")
+
+        clients, databases = self.slowest(top)
+        if clients:
+            lines.append(f"Slowest clients (top {len(clients)}):")
+            lines += [f"     {seconds:>10.3f}s  {client}" for client, seconds in clients]
+        if databases:
+            lines.append(f"Slowest databases (top {len(databases)}):")
+            lines += [f"     {seconds:>10.3f}s  {client} / {db_file}" for client, db_file, seconds in databases]
+        return lines
+
+    # ========================== EXPORT ==========================
+    def to_dict(self, top=10):
+        clients, databases = self.slowest(top)
+        return {
+            "job": self.job,
+            "started_at": self.started_at,
+            "finished_at": time.time(),
+            "counters": self.counters,
+            "histograms": {name: {**histogram, "bounds": list(self.buckets)} for name, histogram in self.histograms.items()},
+            "slowest_clients": [{"client": client, "seconds": seconds} for client, seconds in clients],
+            "slowest_databases": [{"client": client, "db_file": db_file, "seconds": seconds} for client, db_file, seconds in databases]
+        }
+
+    def write_json(self, path: Path, top=10):
+        write_atomically(path, json.dumps(self.to_dict(top), indent=4))
+
+    def write_prometheus(self, path: Path, top=10):
+        write_atomically(path, "\n".join(self.prometheus_lines(top)) + "\n")
+
+    def prometheus_lines(self, top=10):
+        job = escape_label(self.job)
+        lines = ["# HELP fw_logging_phase_seconds Time spent per phase of the run.",
+                 "# TYPE fw_logging_phase_seconds histogram"]
+        for name, histogram in self.histograms.items():
+            labels = f'job="{job}",phase="{escape_label(name)}"'
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, histogram["buckets"]):
+                cumulative += bucket_count
+                lines.append(f'fw_logging_phase_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f'fw_logging_phase_seconds_bucket{{{labels},le="+Inf"}} {histogram["count"]}')
+            lines.append(f"fw_logging_phase_seconds_sum{{{labels}}} {histogram['sum']:.6f}")
+            lines.append(f"fw_logging_phase_seconds_count{{{labels}}} {histogram['count']}")
+
+        lines += ["# HELP fw_logging_events Events counted during the run (clients, database statuses, errors).",
+                  "# TYPE fw_logging_events gauge"]
+        lines += [f'fw_logging_events{{job="{job}",event="{escape_label(name)}"}} {value}' for name, value in self.counters.items()]
+
+        # Only the slowest few per run, one series per database would be too many
+        clients, databases = self.slowest(top)
+        lines += ["# HELP fw_logging_slowest_client_seconds Slowest clients of the run (sum of their databases).",
+                  "# TYPE fw_logging_slowest_client_seconds gauge"]
+        lines += [f'fw_logging_slowest_client_seconds{{job="{job}",client="{escape_label(client)}"}} {seconds:.6f}'
+                  for client, seconds in clients]
+        lines += ["# HELP fw_logging_slowest_database_seconds Slowest summary databases of the run.",
+                  "# TYPE fw_logging_slowest_database_seconds gauge"]
+        lines += [f'fw_logging_slowest_database_seconds{{job="{job}",client="{escape_label(client)}",db_file="{escape_label(db_file)}"}} {seconds:.6f}'
+                  for client, db_file, seconds in databases]
+
+        lines += ["# HELP fw_logging_last_run_timestamp_seconds When the run finished.",
+                  "# TYPE fw_logging_last_run_timestamp_seconds gauge",
+                  f'fw_logging_last_run_timestamp_seconds{{job="{job}"}} {time.time():.0f}',
+                  "# HELP fw_logging_run_seconds Wall time of the run.",
+                  "# TYPE fw_logging_run_seconds gauge",
+                  f'fw_logging_run_seconds{{job="{job}"}} {time.time() - self.started_at:.3f}']
+        return lines
+
+# ========================== HELPERS ==========================
+def escape_label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def write_atomically(path: Path, text):
+    # Temp file first, readers (the textfile collector, the next run) never see a half-written file
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temp_file = path.with_name(path.name + ".tmp")
+    temp_file.write_text(text, encoding="utf-8")
+    os.replace(temp_file, path)
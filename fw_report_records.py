@@ -0,0 +1,332 @@
+# Report Records
+# The checker produces a stream of plain dict records and everything that used to be written inline (report
+# file, console, log, result cache) is a consumer of that stream. Structured JSONL/CSV output is just two more
+# consumers, so downstream tooling no longer has to regex the text report.
+#
+# Record types (record["record_type"]):
+# "client"   - client level events: "skipped", "start" (folder, folder_error if it couldn't be listed, failover
+#              pairs), "no_summary_dbs", "retry" and
+#              "full_scan" (a sampled database escalated to a full scan)
+# "firewall" - one checked summary database: client, firewall_identifier, vendor, conditions, misconfigurations,
+#              status ("optimal", "no_data", "standby", "misconfigured", "deferred" or "error"), severity,
+#              failover_partner, custom_fw_ips, traffic (statistics from the probe or None), traffic_anomalies,
+#              inconclusive (conditions a sampled probe couldn't settle, neither found nor proven absent),
+#              from_cache, elapsed_seconds, attempt, error
+#              Workers send "checked" with the found conditions, fw_evaluation.py classifies it before the consumers
+# "error"    - a unit of work that failed outside a single database (e.g. a crashed worker)
+# "section"  - a heading in the report, e.g. the deferred database retries after the sweep
+# "fleet"    - the fleet summary at the end of the run (FleetEvaluator.summary())
+# "log"      - log-only messages (connect/close chatter), consumed by the logger
+# "cache"    - result cache updates, consumed by the cache
+
+import csv
+import json
+import logging
+import sys
+import time
+from datetime import datetime
+from fw_metrics import write_atomically
+
+alignment_space = " " * 5
+ips_warning = "(DO NOT INCLUDE IN CLIENT COMMUNICATIONS!)"
+
+# ========================== RENDERING ==========================
+def identifier_with_type(record):
+    if record["is_custom_fw"]:
+        return record["firewall_identifier"]
+    return f"{record['firewall_identifier']} ({record['vendor']})"
+
+def missing_folder_message(record):
+    if record.get("folder_error"):
+        return f"Warning: Folder path '{record['folder_loc']}' could not be read ({record['folder_error']}). Please investigate this!"
+    return f"Warning: Folder path '{record['folder_loc']}' does not exist. Please investigate this!"
+
+def misconfiguration_lines(record):
+    lines = []
+    for condition in record["misconfigurations"]:
+        actual_value = record["conditions"][condition]
+        lines.append(f"{condition}={'Yes' if actual_value else 'No'} (Expected: {'Yes' if not actual_value else 'No'})")
+    return lines
+
+def firewall_status_line(record):
+    if record["status"] == "optimal":
+        return f"{identifier_with_type(record)}: Optimal!"
+    if record["status"] == "no_data":
+        return f"{identifier_with_type(record)}: No Data! Outage or Failover?"
+    if record["status"] == "standby":
+        return f"{identifier_with_type(record)}: No Data, failover standby for {record['failover_partner']}"
+    if record["status"] == "deferred":
+        return f"{identifier_with_type(record)}: Deferred / timed out! ({record['error']})"
+    return f"{identifier_with_type(record)}:"
+
+def fleet_summary_lines(summary):
+    statuses = summary["statuses"]
+    lines = [
+        "", "=" * 50,
+        f"Fleet summary: {summary['firewalls']} firewalls - {statuses['optimal']} optimal, {statuses['misconfigured']} misconfigured, "
+        f"{statuses['no_data']} no data, {statuses['standby']} failover standby"
+        + (f", {summary['traffic_anomalies']} off their traffic baseline" if summary["traffic_anomalies"] else "")
+        + (f", {summary['inconclusive']} inconclusive within the sample" if summary["inconclusive"] else ""),
+        "=" * 50,
+        "Per condition (found / misconfigured):"
+    ]
+    lines += [f"{alignment_space}{name:<20}{counts['found']:>8}{counts['misconfigured']:>8}" for name, counts in summary["conditions"].items()]
+    lines.append("Per vendor (firewalls / optimal / misconfigured / no data / standby):")
+    for vendor, counts in summary["vendors"].items():
+        lines.append(f"{alignment_space}{vendor:<20}{counts['firewalls']:>8}{counts['optimal']:>8}{counts['misconfigured']:>8}"
+                     f"{counts['no_data']:>8}{counts['standby']:>8}")
+        if counts["misconfigurations"]:
+            lines.append(f"{alignment_space * 2}" + ", ".join(f"{name}: {count}" for name, count in counts["misconfigurations"].items()))
+    return lines
+
+def render_report_lines(record):
+    # Lines for the text report, same text the script has always written
+    record_type = record["record_type"]
+    if record_type == "client":
+        event = record["event"]
+        if event == "skipped":
+            return ["", f"Skipping excluded folder: {record['client']}"]
+        if event == "start":
+            lines = ["", f"Processing: {record['client']}"]
+            if not record["exists"]:
+                return lines + [missing_folder_message(record)]
+            lines += [f"Failover Pair: {primary} -> {secondary}" for primary, secondary in record["failover_pairs"]]
+            return lines + ["-" * 50]
+        if event == "no_summary_dbs":
+            return [f"No .mdb files found for {record['client']}!"]
+        if event == "retry":
+            return ["", f"Retrying: {record['client']} (attempt {record['attempt']})"]
+        if event == "full_scan":
+            return ["", f"Full scan: {record['client']}"]
+        return []
+
+    if record_type == "section":
+        return ["", "=" * 50, record["title"], "=" * 50]
+
+    if record_type == "fleet":
+        return fleet_summary_lines(record["summary"])
+
+    if record_type == "error" or (record_type == "firewall" and record["status"] == "error"):
+        return [f"Error processing {record.get('label') or record.get('db_file')}: {record['error']}"]
+
+    if record_type == "firewall":
+        lines = [firewall_status_line(record)]
+        if record["status"] == "misconfigured":
+            lines += [f"{alignment_space}{line}" for line in misconfiguration_lines(record)]
+        lines += [f"{alignment_space}Traffic: {anomaly}" for anomaly in record["traffic_anomalies"]]
+        if record["inconclusive"]:
+            lines.append(f"{alignment_space}Inconclusive within the sample: {', '.join(record['inconclusive'])}")
+        if record["custom_fw_ips"]:
+            lines.append(f"{alignment_space}IPs in network: {', '.join(record['custom_fw_ips'])} {ips_warning}")
+        return lines
+
+    return []
+
+def render_console_lines(record):
+    # Console shows the same lines as the report, minus skipped clients and errors (as it always has)
+    if record["record_type"] == "error" or record.get("status") == "error":
+        return []
+    if record["record_type"] == "client":
+        event = record["event"]
+        if event == "skipped":
+            return []
+        if event == "start":
+            lines = [f"\nProcessing: {record['client']}"]
+            if not record["exists"]:
+                return lines + [missing_folder_message(record)]
+            lines += [f"Failover Pair: {primary} -> {secondary}" for primary, secondary in record["failover_pairs"]]
+            if record["failover_pairs"]:
+                lines[-1] += "\n"
+            return lines
+        if event == "no_summary_dbs":
+            return [f"No .mdb files found for {record['client']}!\n"]
+        if event == "retry":
+            return [f"\nRetrying: {record['client']} (attempt {record['attempt']})"]
+        if event == "full_scan":
+            return [f"\nFull scan: {record['client']}"]
+        return []
+    return render_report_lines(record)
+
+def render_log_messages(record):
+    # [(level, message)] for the log file
+    record_type = record["record_type"]
+    if record_type == "log":
+        return [(record["level"], record["message"])]
+
+    if record_type == "client":
+        event = record["event"]
+        if event == "skipped":
+            return [(logging.INFO, f"Skipping excluded folder: {record['client']}\n")]
+        if event == "start":
+            messages = [(logging.INFO, f"Processing: {record['client']}"),
+                        (logging.INFO, f"Checking client folder: {record['folder_loc']}")]
+            if not record["exists"]:
+                return messages + [(logging.WARNING, missing_folder_message(record))]
+            messages += [(logging.INFO, f"Failover Pair: {primary} -> {secondary}\n") for primary, secondary in record["failover_pairs"]]
+            return messages
+        if event == "no_summary_dbs":
+            return [(logging.WARNING, f"No .mdb files found for {record['client']}")]
+        if event == "retry":
+            return [(logging.INFO, f"Retrying: {record['client']} (attempt {record['attempt']})")]
+        if event == "full_scan":
+            return [(logging.INFO, f"Full scan: {record['client']}")]
+        return []
+
+    if record_type == "section":
+        return [(logging.INFO, record["title"])]
+
+    if record_type == "fleet":
+        return [(logging.INFO, line) for line in fleet_summary_lines(record["summary"]) if line and not line.startswith("=")]
+
+    if record_type == "error" or record.get("status") == "error":
+        return [(logging.CRITICAL, render_report_lines(record)[0])]
+
+    if record_type == "firewall":
+        messages = [(getattr(logging, record["severity"]), firewall_status_line(record))]
+        messages += [(logging.WARNING, f"{identifier_with_type(record)} traffic: {anomaly}") for anomaly in record["traffic_anomalies"]]
+        if record["inconclusive"]:
+            messages.append((logging.INFO, f"{identifier_with_type(record)} inconclusive within the sample: {', '.join(record['inconclusive'])}"))
+        if record["custom_fw_ips"]:
+            messages.append((logging.INFO, f"{identifier_with_type(record)} IPs in network: {', '.join(record['custom_fw_ips'])} {ips_warning}"))
+        return messages
+
+    return []
+
+# ========================== CONSUMERS ==========================
+class TextReportWriter:
+    # Writes through a large buffer and flushes once per client instead of once per line
+    def __init__(self, file):
+        self.file = file
+
+    def handle(self, record):
+        if record["record_type"] == "client" and record["event"] in ("start", "skipped", "retry"):
+            self.file.flush()
+        lines = render_report_lines(record)
+        if lines:
+            self.file.write("\n".join(lines) + "\n")
+
+class ConsoleWriter:
+    def handle(self, record):
+        lines = render_console_lines(record)
+        if lines:
+            sys.stdout.write("\n".join(lines) + "\n")
+
+class LogWriter:
+    def __init__(self, logger):
+        self.logger = logger
+
+    def handle(self, record):
+        for level, message in render_log_messages(record):
+            self.logger.log(level, message)
+
+class StructuredRecordWriter:
+    """
+    Batched JSONL or CSV output of the result records. JSONL gets every client, firewall, error and fleet summary
+    record, CSV gets one flat row per firewall with a Yes/No column per condition.
+    """
+    csv_columns = ["client", "folder_date", "db_file", "firewall_identifier", "vendor", "is_custom_fw", "status",
+                   "severity", "misconfigurations", "traffic_anomalies", "inconclusive", "failover_partner", "custom_fw_ips", "from_cache",
+                   "elapsed_seconds", "attempt", "error"]
+
+    def __init__(self, path, output_format, condition_names, batch_size=200):
+        self.output_format = output_format
+        self.condition_names = list(condition_names)
+        self.batch_size = batch_size
+        self.batch = []
+        self.file = open(path, "w", encoding="utf-8", newline="")
+        if output_format == "csv":
+            self.csv_writer = csv.writer(self.file)
+            self.csv_writer.writerow(self.csv_columns + self.condition_names)
+
+    def handle(self, record):
+        if record["record_type"] not in ("client", "firewall", "error", "fleet"):
+            return
+        if self.output_format == "csv" and record["record_type"] != "firewall":
+            return
+        self.batch.append(record)
+        if len(self.batch) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if not self.batch:
+            return
+        if self.output_format == "csv":
+            self.csv_writer.writerows(self._csv_row(record) for record in self.batch)
+        else:
+            self.file.write("".join(json.dumps(record) + "\n" for record in self.batch))
+        self.batch = []
+        self.file.flush()
+
+    def close(self):
+        self.flush()
+        self.file.close()
+
+    def _csv_row(self, record):
+        row = []
+        for column in self.csv_columns:
+            value = record.get(column)
+            if isinstance(value, (list, tuple)):
+                value = ";".join(value)
+            row.append("" if value is None else value)
+        conditions = record.get("conditions") or {}
+        return row + ["" if name not in conditions else "?" if name in record["inconclusive"] else "Yes" if conditions[name] else "No"
+                      for name in self.condition_names]
+
+class DeferredCollector:
+    # Remembers which databases came back deferred (and when) so they can be retried after the sweep
+    def __init__(self):
+        self.deferred = []
+
+    def handle(self, record):
+        if record["record_type"] == "firewall" and record["status"] == "deferred":
+            self.deferred.append((time.monotonic(), record["client"], record["db_file"]))
+
+    def take(self):
+        deferred, self.deferred = self.deferred, []
+        return deferred
+
+class InconclusiveCollector:
+    # Remembers which databases a sampled probe left inconclusive so they can get a full scan after the sweep
+    def __init__(self):
+        self.inconclusive = []
+
+    def handle(self, record):
+        if record["record_type"] == "firewall" and record["status"] not in ("deferred", "error") and record["inconclusive"]:
+            self.inconclusive.append((record["client"], record["db_file"]))
+
+    def take(self):
+        inconclusive, self.inconclusive = self.inconclusive, []
+        return inconclusive
+
+class LiveStatusWriter:
+    """
+    Latest result per client and firewall for watch mode, rewritten by write() after every poll so anyone can
+    open the file (or point a dashboard at it) and see where the night is at.
+    {"updated_at": "...", "clients": {"<client>": {"<firewall>": {"status", "severity", "misconfigurations", ...}}}}
+    """
+    def __init__(self, path):
+        self.path = path
+        self.clients = {}
+
+    def handle(self, record):
+        if record["record_type"] != "firewall" or record["status"] == "deferred":
+            return
+        self.clients.setdefault(record["client"], {})[record["firewall_identifier"]] = {
+            "folder_date": record["folder_date"],
+            "db_file": record["db_file"],
+            "vendor": record["vendor"],
+            "status": record["status"],
+            "severity": record["severity"],
+            "misconfigurations": record["misconfigurations"],
+            "traffic_anomalies": record["traffic_anomalies"],
+            "error": record["error"],
+            "checked_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        }
+
+    def write(self):
+        write_atomically(self.path, json.dumps({"updated_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"), "clients": self.clients}, indent=4))
+
+def dispatch_records(records, consumers):
+    for record in records:
+        for consumer in consumers:
+            consumer.handle(record)
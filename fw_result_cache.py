@@ -0,0 +1,70 @@
+# Result Cache
+# Remembers what each summary database looked like the last time it was checked so reruns in the same
+# morning only open the databases that actually changed.
+#
+# Layout on disk (JSON):
+# {
+#     "D:/Clients/<client>/Source/<date>/Input": {
+#         "folder_date": "20240416",
+#         "files": {
+#             "<mdb file name>": {"size": ..., "mtime_ns": ..., "found_conditions": [...],
+#                                 "custom_fw_ips": [...], "traffic": {...} or null, "checked_at": "..."}
+#         },
+#         "syslogs": {
+#             "<syslog file name>": {"size": ..., "offset": ..., "head": "...", "found": false}
+#         }
+#     }
+# }
+# Grouping by Input folder lets the main script hand each worker only its own client's entries.
+
+import json
+from datetime import datetime, timedelta
+from pathlib import Path
+from fw_metrics import write_atomically
+
+# ========================== LOAD / SAVE ==========================
+def load_result_cache(cache_file: Path, max_age_days: int, today: datetime = None) -> dict:
+    # Loads the cache and evicts folders whose folder date is older than max_age_days
+    if not cache_file.exists():
+        return {}
+
+    try:
+        with cache_file.open("r", encoding="utf-8") as file:
+            cache = json.load(file)
+    except (OSError, ValueError) as e:
+        print(f"Warning: Ignoring unreadable result cache {cache_file}: {e}")
+        return {}
+
+    cutoff = ((today or datetime.now()) - timedelta(days=max_age_days)).strftime("%Y%m%d")
+    return {folder: entry for folder, entry in cache.items() if entry.get("folder_date", "") >= cutoff}
+
+def save_result_cache(cache_file: Path, cache: dict):
+    write_atomically(cache_file, json.dumps(cache))
+
+# ========================== ENTRIES ==========================
+def lookup_cached_result(cached_files: dict, file_name: str, fingerprint: dict):
+    # Returns the cached record if the file still has the same size and mtime, otherwise None
+    record = (cached_files or {}).get(file_name)
+    if record and record.get("size") == fingerprint["size"] and record.get("mtime_ns") == fingerprint["mtime_ns"]:
+        return record
+    return None
+
+def store_result(cache: dict, section: str, folder_key: str, folder_date: str, file_name: str, record: dict):
+    # section is "files" for summary database results or "syslogs" for debug scanner state
+    folder_entry = cache.setdefault(folder_key, {"folder_date": folder_date})
+    folder_entry["folder_date"] = folder_date
+    folder_entry.setdefault(section, {})[file_name] = record
+
+def cached_folder_for(cache: dict, folder_key: str) -> dict:
+    folder_entry = cache.get(folder_key, {})
+    return {"files": folder_entry.get("files", {}), "syslogs": folder_entry.get("syslogs", {})}
+
+class ResultCacheWriter:
+    # Consumer for the "cache" records in the checker's record stream (see fw_report_records.py)
+    def __init__(self, cache: dict):
+        self.cache = cache
+
+    def handle(self, record):
+        if record["record_type"] == "cache":
+            store_result(self.cache, record["section"], record["folder_key"], record["folder_date"],
+                         record["file_name"], record["record"])
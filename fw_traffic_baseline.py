@@ -0,0 +1,157 @@
+# Traffic Baseline
+# The condition probe only says whether a condition shows up at all, so a firewall logging 1% of its usual volume
+# still comes out "Optimal!". With traffic statistics on, the probe's single aggregate pass also returns row count,
+# bytes per direction and allowed / denied row counts (see fw_condition_probe.probe_traffic). This keeps the last
+# window_days folder dates of those per firewall and compares each new result against the median of the dates
+# before it, flagging volume drops and shifts in the denied / inbound share.
+#
+# Comparing only against earlier dates keeps reruns and backfills honest: rerunning a date replaces its own row
+# and never becomes part of its own baseline. A firewall needs min_days earlier dates before anything is flagged,
+# and one without any traffic today is left to the No Data / standby status.
+#
+# Layout (SQLite), one row per firewall so a client's baseline is one short primary key range to read:
+# baselines (client, firewall, dates) PRIMARY KEY (client, firewall)
+#           dates is the window as little-endian int64, one (folder_date, rows, inbound_bytes, outbound_bytes,
+#           allowed_rows, denied_rows) group per date, oldest first, at most window_days of them
+
+import sqlite3
+from pathlib import Path
+import numpy as np
+
+# Statistics the baseline keeps, the keys of traffic_statistics in the main script
+statistic_names = ["rows", "inbound_bytes", "outbound_bytes", "allowed_rows", "denied_rows"]
+
+schema = """
+CREATE TABLE IF NOT EXISTS baselines (
+    client TEXT NOT NULL,
+    firewall TEXT NOT NULL,
+    dates BLOB NOT NULL,
+    PRIMARY KEY (client, firewall)
+);
+"""
+
+# ========================== COMPARISON ==========================
+def share(part, whole):
+    # part / whole, NaN where whole is 0
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(whole > 0, part / np.where(whole > 0, whole, 1), np.nan)
+
+def nan_median(values):
+    # Median of each row ignoring NaN, NaN where the whole row is. np.nanmedian goes through masked arrays for
+    # small inputs, which made it most of the evaluate time for a client's worth of firewalls.
+    ordered = np.sort(values, axis=1)  # NaN sorts last
+    counts = (~np.isnan(ordered)).sum(axis=1)
+    rows = np.arange(len(ordered))
+    low = ordered[rows, np.maximum(counts - 1, 0) // 2]
+    high = ordered[rows, np.minimum(counts // 2, ordered.shape[1] - 1)]
+    return np.where(counts > 0, (low + high) / 2, np.nan)
+
+def traffic_measures(stats):
+    # (..., statistics) -> (rows, bytes, denied share of rows, inbound share of bytes), each (...)
+    rows, inbound_bytes, outbound_bytes, allowed_rows, denied_rows = np.moveaxis(stats, -1, 0)
+    total_bytes = inbound_bytes + outbound_bytes
+    return rows, total_bytes, share(denied_rows, allowed_rows + denied_rows), share(inbound_bytes, total_bytes)
+
+def find_anomalies(current, history, volume_drop_ratio, ratio_shift, min_ratio_rows=100):
+    """
+    current is (firewalls, statistics), history (firewalls, days, statistics) padded with NaN.
+    Returns one list of messages per firewall. Shares are only compared from min_ratio_rows rows on, a handful of
+    rows moves them around too easily.
+    """
+    current_rows, current_bytes, current_denied, current_inbound = traffic_measures(current)
+    # Shares are NaN on days without traffic, a firewall that never had any has a NaN median and is never flagged
+    usual_rows, usual_bytes, usual_denied, usual_inbound = nan_median(np.concatenate(traffic_measures(history))).reshape(4, -1)
+    days = (~np.isnan(history[:, :, 0])).sum(axis=1)
+    has_traffic = current_rows > 0
+
+    rows_dropped = has_traffic & (usual_rows > 0) & (current_rows < usual_rows * volume_drop_ratio)
+    bytes_dropped = has_traffic & (usual_bytes > 0) & (current_bytes < usual_bytes * volume_drop_ratio)
+    ratio_checked = current_rows >= min_ratio_rows
+    denied_shifted = ratio_checked & (np.abs(current_denied - usual_denied) > ratio_shift)
+    inbound_shifted = ratio_checked & (np.abs(current_inbound - usual_inbound) > ratio_shift)
+
+    anomalies = [[] for _ in range(len(current))]
+    for position in np.flatnonzero(rows_dropped | bytes_dropped | denied_shifted | inbound_shifted).tolist():
+        messages = anomalies[position]
+        over = f"median of the last {days[position]} dates"
+        if rows_dropped[position]:
+            messages.append(f"Volume down to {current_rows[position] / usual_rows[position]:.1%} of usual "
+                            f"({current_rows[position]:,.0f} rows vs {usual_rows[position]:,.0f}, {over})")
+        if bytes_dropped[position]:
+            messages.append(f"Bytes down to {current_bytes[position] / usual_bytes[position]:.1%} of usual "
+                            f"({current_bytes[position]:,.0f} vs {usual_bytes[position]:,.0f}, {over})")
+        if denied_shifted[position]:
+            messages.append(f"Denied share of rows moved from {usual_denied[position]:.0%} to {current_denied[position]:.0%} ({over})")
+        if inbound_shifted[position]:
+            messages.append(f"Inbound share of bytes moved from {usual_inbound[position]:.0%} to {current_inbound[position]:.0%} ({over})")
+    return anomalies
+
+# ========================== STORE ==========================
+def open_baseline(baseline_file: Path):
+    baseline_file.parent.mkdir(parents=True, exist_ok=True)
+    connection = sqlite3.connect(baseline_file)
+    connection.executescript(schema)
+    return connection
+
+class TrafficBaseline:
+    """
+    Rolling per-firewall baseline of the traffic statistics. annotate() fills traffic_anomalies of firewall records
+    and remembers their statistics, flush() writes them out and drops dates that fell out of the window.
+    A client's stored dates are read the first time one of its firewalls comes by.
+    """
+    def __init__(self, baseline_file: Path, window_days=14, min_days=3, volume_drop_ratio=0.2, ratio_shift=0.2):
+        self.connection = open_baseline(baseline_file)
+        self.window_days = window_days
+        self.min_days = min_days
+        self.volume_drop_ratio = volume_drop_ratio
+        self.ratio_shift = ratio_shift
+        self.windows = {}     # client -> {firewall: int64 array of (folder_date, statistics...) rows, oldest first}
+        self.changed = set()  # (client, firewall) whose window wasn't written yet
+        self.empty_window = np.zeros((0, len(statistic_names) + 1), dtype="<i8")
+
+    def window_for(self, client, firewall):
+        if client not in self.windows:
+            self.windows[client] = {
+                stored_firewall: np.frombuffer(dates, dtype="<i8").reshape(-1, len(statistic_names) + 1)
+                for stored_firewall, dates in self.connection.execute("SELECT firewall, dates FROM baselines WHERE client = ?", (client,))
+            }
+        return self.windows[client].get(firewall, self.empty_window)
+
+    def annotate(self, records):
+        # Records without statistics (cache entries from before, statistics turned off) are left alone
+        records = [record for record in records if record.get("traffic")]
+        if not records:
+            return
+
+        current = np.array([[record["traffic"].get(name, 0) for name in statistic_names] for record in records], dtype="<i8")
+        history = np.full((len(records), self.window_days, len(statistic_names)), np.nan)
+        compared = np.zeros(len(records), dtype=bool)
+        for position, record in enumerate(records):
+            client, firewall, folder_date = record["client"], record["firewall_identifier"], int(record["folder_date"])
+            window = self.window_for(client, firewall)
+            split = np.searchsorted(window[:, 0], folder_date)
+            earlier = window[max(0, split - self.window_days):split, 1:]
+            if len(earlier) >= self.min_days:
+                history[position, :len(earlier)] = earlier
+                compared[position] = True
+
+            # This date's statistics replace whatever a previous run stored for it, only the latest window_days are kept
+            later = window[split + 1:] if split < len(window) and window[split, 0] == folder_date else window[split:]
+            self.windows[client][firewall] = np.concatenate((window[:split], [[folder_date, *current[position]]], later))[-self.window_days:]
+            self.changed.add((client, firewall))
+
+        positions = np.flatnonzero(compared)
+        if len(positions):
+            for position, anomalies in zip(positions.tolist(), find_anomalies(current[positions].astype(float), history[positions],
+                                                                              self.volume_drop_ratio, self.ratio_shift)):
+                records[position]["traffic_anomalies"] = anomalies
+
+    def flush(self):
+        self.connection.executemany("INSERT OR REPLACE INTO baselines VALUES (?, ?, ?)",
+                                    [(client, firewall, self.windows[client][firewall].tobytes()) for client, firewall in self.changed])
+        self.connection.commit()
+        self.changed = set()
+
+    def close(self):
+        self.flush()
+        self.connection.close()
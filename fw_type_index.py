@@ -0,0 +1,155 @@
+# Firewall Type Index
+# ClientFirewallDetails.csv lives on the share and every run used to read and regex-parse all of it, even a "one"
+# run checking a single client. This compiles it once into a small local SQLite file with the IPs already
+# normalized and the vendor names already passed through fw_type_normalization, then answers lookups per client.
+#
+# The index is rebuilt when the CSV's size or mtime changed AND its content hash differs (a copy that only
+# touched the mtime just refreshes the stored mtime), or when the normalization table changed.
+#
+# Layout (SQLite):
+# meta      (key TEXT PRIMARY KEY, value TEXT) - csv_path, csv_size, csv_mtime_ns, csv_sha256, normalization_sha256, version
+# firewalls (client TEXT, ip TEXT, vendor TEXT, PRIMARY KEY (client, ip))
+
+import csv
+import hashlib
+import json
+import os
+import re
+import sqlite3
+from pathlib import Path
+
+index_version = "1"
+f_ip_pattern = re.compile(r"--f\s+(\d{1,3}(?:\.\d{1,3}){3})")
+type_pattern = re.compile(r"--(\w+)\b")
+
+# ========================== CSV ==========================
+def parse_firewall_types_csv(csv_path: Path):
+    # Yields (client, normalized ip, raw fw type) for every row with a --f IP and a --<type> flag (the last one wins)
+    with csv_path.open("r", encoding="utf-8") as file:
+        for row in csv.reader(file):
+            if len(row) < 2:
+                continue
+
+            f_ip_match = f_ip_pattern.search(row[1])
+            all_types = type_pattern.findall(row[1])
+            if f_ip_match and all_types:
+                normalized_ip = ".".join(str(int(octet)) for octet in f_ip_match.group(1).split("."))
+                yield row[0].strip(), normalized_ip, all_types[-1]
+
+def file_sha256(path: Path):
+    digest = hashlib.sha256()
+    with path.open("rb") as file:
+        for chunk in iter(lambda: file.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def normalization_sha256(fw_type_normalization: dict):
+    return hashlib.sha256(json.dumps(fw_type_normalization, sort_keys=True).encode()).hexdigest()
+
+# ========================== INDEX ==========================
+class FirewallTypeIndex:
+    """
+    Per client {normalized ip: vendor} lookups, read from the compiled index on first use of each client.
+    Falls back to an in-memory map when the index file can't be used (e.g. read-only output folder).
+    """
+    def __init__(self, connection=None, vendors=None):
+        self.connection = connection
+        self.vendors = vendors if vendors is not None else {}
+        self.loaded_all = vendors is not None
+
+    def vendors_for(self, client):
+        if client not in self.vendors and not self.loaded_all:
+            rows = self.connection.execute("SELECT ip, vendor FROM firewalls WHERE client = ?", (client,)).fetchall()
+            self.vendors[client] = dict(rows)
+        return self.vendors.get(client, {})
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+def build_fw_type_index(index_file: Path, csv_path: Path, fw_type_normalization: dict, csv_stat, csv_hash):
+    # Builds into a temp file and swaps it in, a crashed build never leaves a half-filled index behind
+    index_file.parent.mkdir(parents=True, exist_ok=True)
+    temp_file = index_file.with_name(index_file.name + ".tmp")
+    if temp_file.exists():
+        temp_file.unlink()
+
+    connection = sqlite3.connect(temp_file)
+    try:
+        connection.execute("CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT)")
+        connection.execute("CREATE TABLE firewalls (client TEXT, ip TEXT, vendor TEXT, PRIMARY KEY (client, ip))")
+        connection.executemany(
+            "INSERT OR REPLACE INTO firewalls VALUES (?, ?, ?)",
+            ((client, ip, fw_type_normalization.get(fw_type.strip(), fw_type)) for client, ip, fw_type in parse_firewall_types_csv(csv_path))
+        )
+        connection.executemany("INSERT INTO meta VALUES (?, ?)", [
+            ("version", index_version),
+            ("csv_path", str(csv_path)),
+            ("csv_size", str(csv_stat.st_size)),
+            ("csv_mtime_ns", str(csv_stat.st_mtime_ns)),
+            ("csv_sha256", csv_hash),
+            ("normalization_sha256", normalization_sha256(fw_type_normalization))
+        ])
+        connection.commit()
+    finally:
+        connection.close()
+    os.replace(temp_file, index_file)
+
+def open_fw_type_index(index_file: Path, csv_path: Path, fw_type_normalization: dict):
+    """
+    Returns a FirewallTypeIndex for csv_path, rebuilding index_file first if the CSV or the normalization changed.
+    A missing CSV gives an empty index, same as the old parser.
+    """
+    try:
+        csv_stat = csv_path.stat()
+    except FileNotFoundError:
+        print(f"Warning: CSV not found: {csv_path}")
+        return FirewallTypeIndex(vendors={})
+
+    try:
+        meta = read_index_meta(index_file)
+        unchanged = (meta.get("version") == index_version and meta.get("csv_path") == str(csv_path)
+                     and meta.get("normalization_sha256") == normalization_sha256(fw_type_normalization))
+        if unchanged and (meta.get("csv_size"), meta.get("csv_mtime_ns")) != (str(csv_stat.st_size), str(csv_stat.st_mtime_ns)):
+            # Only hash when the cheap check fails, the CSV is on the share
+            csv_hash = file_sha256(csv_path)
+            unchanged = meta.get("csv_sha256") == csv_hash
+            if unchanged:
+                update_index_meta(index_file, {"csv_size": str(csv_stat.st_size), "csv_mtime_ns": str(csv_stat.st_mtime_ns)})
+            else:
+                build_fw_type_index(index_file, csv_path, fw_type_normalization, csv_stat, csv_hash)
+        elif not unchanged:
+            build_fw_type_index(index_file, csv_path, fw_type_normalization, csv_stat, file_sha256(csv_path))
+
+        return FirewallTypeIndex(connection=sqlite3.connect(f"{index_file.resolve().as_uri()}?mode=ro", uri=True))
+    except (OSError, ValueError, sqlite3.Error) as e:
+        print(f"Warning: Firewall type index unavailable ({e}), parsing {csv_path} directly")
+
+    vendors = {}
+    try:
+        for client, ip, fw_type in parse_firewall_types_csv(csv_path):
+            vendors.setdefault(client, {})[ip] = fw_type_normalization.get(fw_type.strip(), fw_type)
+    except Exception as e:
+        print(f"Error reading firewall type CSV: {e}")
+    return FirewallTypeIndex(vendors=vendors)
+
+def read_index_meta(index_file: Path):
+    if not index_file.exists():
+        return {}
+    try:
+        connection = sqlite3.connect(f"{index_file.resolve().as_uri()}?mode=ro", uri=True)
+        try:
+            return dict(connection.execute("SELECT key, value FROM meta").fetchall())
+        finally:
+            connection.close()
+    except sqlite3.Error:
+        return {}  # Corrupt or foreign file, rebuilt by the caller
+
+def update_index_meta(index_file: Path, values: dict):
+    connection = sqlite3.connect(index_file)
+    try:
+        connection.executemany("INSERT OR REPLACE INTO meta VALUES (?, ?)", values.items())
+        connection.commit()
+    finally:
+        connection.close()
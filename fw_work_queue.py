@@ -0,0 +1,201 @@
+# Shared Work Queue
+# Lets several jump hosts split one sweep. The coordinator (a normal run with --queue) publishes every client unit
+# into a SQLite file on the share. It and any helpers (--work-queue) claim units a few at a time, check them with
+# the usual code and store each unit's records back as its partial result. The coordinator streams the results
+# out in position order into the one report (see QueueWorkPool in the main script), so the report, history,
+# result cache and metrics look exactly like a single-host run.
+#
+# Claims carry a heartbeat. A claim whose heartbeat is older than stale_seconds (host crashed, share dropped)
+# goes back to whoever claims next, and a unit that has been claimed max_attempts times without finishing is
+# closed with an error record so one poison unit can't stall the sweep. The first host to finish a unit wins.
+# Rerunning the coordinator with the same plan resumes the unfinished sweep instead of starting over.
+#
+# No WAL (it doesn't work over SMB), every write is one short BEGIN IMMEDIATE transaction.
+#
+# Layout (SQLite):
+# sweeps (sweep_id TEXT PRIMARY KEY, plan_key TEXT, created_at REAL, created_by TEXT, units INTEGER, finished_at REAL)
+# units  (sweep_id TEXT, position INTEGER, label TEXT, payload TEXT, state TEXT, host TEXT, claimed_at REAL,
+#         heartbeat_at REAL, attempts INTEGER, result TEXT, PRIMARY KEY (sweep_id, position))
+#        state: "pending", "claimed" or "done", payload / result are JSON (Paths tagged, see encode_json)
+
+import contextlib
+import hashlib
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from pathlib import Path
+
+schema = """
+CREATE TABLE IF NOT EXISTS sweeps (
+    sweep_id TEXT PRIMARY KEY,
+    plan_key TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    created_by TEXT NOT NULL,
+    units INTEGER NOT NULL,
+    finished_at REAL
+);
+CREATE TABLE IF NOT EXISTS units (
+    sweep_id TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    label TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    state TEXT NOT NULL DEFAULT 'pending',
+    host TEXT,
+    claimed_at REAL,
+    heartbeat_at REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    result TEXT,
+    PRIMARY KEY (sweep_id, position)
+);
+CREATE INDEX IF NOT EXISTS units_by_state ON units (state, sweep_id);
+"""
+
+# ========================== JSON ==========================
+def encode_json(value):
+    # Payloads hold Paths (folder index, summary DBs), tagged so the other host gets Paths back
+    def default(item):
+        if isinstance(item, Path):
+            return {"__path__": str(item)}
+        raise TypeError(f"Not JSON serializable: {type(item).__name__}")
+    return json.dumps(value, default=default)
+
+def decode_json(text):
+    return json.loads(text, object_hook=lambda item: Path(item["__path__"]) if len(item) == 1 and "__path__" in item else item)
+
+def host_name():
+    # Unique per process, two helpers on the same host are two claimants
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+def plan_key_for(labels, extra=None):
+    return hashlib.sha256(json.dumps([labels, extra], sort_keys=True, default=str).encode()).hexdigest()
+
+# ========================== QUEUE ==========================
+class WorkQueue:
+    def __init__(self, queue_file: Path, stale_seconds=600, max_attempts=3, busy_timeout_seconds=60):
+        self.queue_file = queue_file
+        self.stale_seconds = stale_seconds
+        self.max_attempts = max_attempts
+        queue_file.parent.mkdir(parents=True, exist_ok=True)
+        self.connection = sqlite3.connect(queue_file, timeout=busy_timeout_seconds, isolation_level=None)
+        self.connection.execute("PRAGMA journal_mode=DELETE")
+        self.connection.executescript(schema)
+
+    @contextlib.contextmanager
+    def transaction(self):
+        # Takes the write lock up front so two hosts never claim the same unit
+        self.connection.execute("BEGIN IMMEDIATE")
+        try:
+            yield self.connection
+            self.connection.execute("COMMIT")
+        except BaseException:
+            self.connection.execute("ROLLBACK")
+            raise
+
+    def publish(self, plan_key, units, keep_days=7):
+        """
+        Creates a sweep of [(label, payload)] and returns its sweep_id, or the sweep_id of an unfinished sweep with
+        the same plan_key so a restarted coordinator picks up where it left off.
+        """
+        with self.transaction() as connection:
+            row = connection.execute("SELECT sweep_id FROM sweeps WHERE plan_key = ? AND finished_at IS NULL "
+                                     "ORDER BY created_at DESC LIMIT 1", (plan_key,)).fetchone()
+            if row:
+                return row[0]
+
+            # Finished sweeps are only kept for a while, their results went into the report long ago
+            cutoff = time.time() - keep_days * 86400
+            connection.execute("DELETE FROM units WHERE sweep_id IN (SELECT sweep_id FROM sweeps WHERE finished_at < ?)", (cutoff,))
+            connection.execute("DELETE FROM sweeps WHERE finished_at < ?", (cutoff,))
+
+            sweep_id = uuid.uuid4().hex
+            connection.execute("INSERT INTO sweeps VALUES (?, ?, ?, ?, ?, NULL)", (sweep_id, plan_key, time.time(), host_name(), len(units)))
+            connection.executemany("INSERT INTO units (sweep_id, position, label, payload) VALUES (?, ?, ?, ?)",
+                                   ((sweep_id, position, label, encode_json(payload)) for position, (label, payload) in enumerate(units)))
+            return sweep_id
+
+    def claim(self, host, count, sweep_id=None):
+        """
+        Claims up to count units (of sweep_id, or of any unfinished sweep) that are pending or whose claim went
+        stale. Returns [(sweep_id, position, label, payload)] in position order.
+        """
+        now = time.time()
+        sweep_filter = "sweep_id = ?" if sweep_id else "sweep_id IN (SELECT sweep_id FROM sweeps WHERE finished_at IS NULL)"
+        claimable = f"{sweep_filter} AND (state = 'pending' OR (state = 'claimed' AND heartbeat_at < ?))"
+        parameters = ((sweep_id,) if sweep_id else ()) + (now - self.stale_seconds,)
+        with self.transaction() as connection:
+            # Took down (or outlived) max_attempts hosts already, close it instead of handing it out again. Done
+            # before picking so a poison unit doesn't take the place of one that can still be claimed.
+            poisoned = connection.execute(f"SELECT sweep_id, position, label, attempts FROM units WHERE {claimable} AND attempts >= ?",
+                                          parameters + (self.max_attempts,)).fetchall()
+            for row_sweep_id, position, label, attempts in poisoned:
+                error = f"abandoned after {attempts} claims that never finished"
+                connection.execute("UPDATE units SET state = 'done', result = ? WHERE sweep_id = ? AND position = ?",
+                                   (encode_json([{"record_type": "error", "label": label, "error": error}]), row_sweep_id, position))
+
+            rows = connection.execute(f"SELECT sweep_id, position, label, payload FROM units WHERE {claimable} "
+                                      "ORDER BY sweep_id, position LIMIT ?", parameters + (count,)).fetchall()
+            for row_sweep_id, position, _, _ in rows:
+                connection.execute("UPDATE units SET state = 'claimed', host = ?, claimed_at = ?, heartbeat_at = ?, "
+                                   "attempts = attempts + 1 WHERE sweep_id = ? AND position = ?",
+                                   (host, now, now, row_sweep_id, position))
+            return [(row_sweep_id, position, label, decode_json(payload)) for row_sweep_id, position, label, payload in rows]
+
+    def complete(self, sweep_id, position, records):
+        # First result wins, a stale host finishing late doesn't overwrite the one already merged
+        with self.transaction() as connection:
+            connection.execute("UPDATE units SET state = 'done', result = ? WHERE sweep_id = ? AND position = ? AND state != 'done'",
+                               (encode_json(records), sweep_id, position))
+
+    def heartbeat(self, host):
+        with self.transaction() as connection:
+            connection.execute("UPDATE units SET heartbeat_at = ? WHERE host = ? AND state = 'claimed'", (time.time(), host))
+
+    def results(self, sweep_id, first_position, count):
+        # {position: records} for the done units in [first_position, first_position + count)
+        rows = self.connection.execute(
+            "SELECT position, result FROM units WHERE sweep_id = ? AND position >= ? AND position < ? AND state = 'done'",
+            (sweep_id, first_position, first_position + count)
+        ).fetchall()
+        return {position: decode_json(result) for position, result in rows}
+
+    def progress(self, sweep_id):
+        # {state: count} of one sweep
+        return dict(self.connection.execute("SELECT state, COUNT(*) FROM units WHERE sweep_id = ? GROUP BY state", (sweep_id,)).fetchall())
+
+    def finish(self, sweep_id):
+        with self.transaction() as connection:
+            connection.execute("UPDATE sweeps SET finished_at = ? WHERE sweep_id = ?", (time.time(), sweep_id))
+
+    def close(self):
+        self.connection.close()
+
+@contextlib.contextmanager
+def heartbeat(queue_file: Path, host, interval_seconds=60):
+    """
+    Keeps host's claims fresh from a background thread (own connection) while the block runs. A failed beat
+    (share hiccup) is just skipped, the claims only go stale if it keeps failing for stale_seconds.
+    """
+    stop = threading.Event()
+
+    def beat():
+        queue = WorkQueue(queue_file)
+        try:
+            while not stop.wait(interval_seconds):
+                try:
+                    queue.heartbeat(host)
+                except sqlite3.Error:
+                    pass
+        finally:
+            queue.close()
+
+    thread = threading.Thread(target=beat, daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        stop.set()
+        thread.join()
@@ -0,0 +1,191 @@
+# Synthetic Client Tree Generator
+# Builds a fake client share that looks like D:/Clients so the checker and the failover script can be run and
+# benchmarked on any machine. Summary "MDBs" are SQLite files with the TrafficSummary/Firewalls schema, so run
+# the checker with summary_backend = "sqlite" against them.
+#
+# Layout:
+# <root>/Clients/<client>/Source/<folder date>/Input/<date>-<ip|custom name>-Summary-firewall.mdb
+# <root>/Clients/<client>/Source/<folder date>/Input/<date>-00-<padded ip>-Syslog.txt
+# <root>/Clients/<client>/nDiscovery.ini
+# <root>/ClientFirewallDetails.csv, ClientExclusions.txt, ClientFolderDateExceptions.txt, manifest.json
+#
+# Usage: python generate_synthetic_clients.py <root> --clients 200 --rows 50000
+
+import argparse
+import csv
+import json
+import random
+import sqlite3
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from fw_backends import summary_schema
+
+custom_fw_names = [
+    "BRANCH", "CORPORATE", "CITYHALL", "CORP", "FIREDEPARTMENT",
+    "GUEST", "PCI", "REMOTE", "SCADA", "SCHOOLS", "SEWERPLANT",
+    "STUDENT", "SYSMON"
+]
+
+# Raw vendor names as they appear in ClientFirewallDetails.csv
+fw_types = ["palo", "sonicwall", "fortigate", "meraki", "asa", "firepower", "watchguard113", "checkpoint"]
+
+# Share of firewalls per TrafficSummary profile
+traffic_profiles = {"healthy": 0.70, "no-denied": 0.15, "small-only": 0.05, "empty": 0.10}
+
+# ========================== HELPERS ==========================
+def firewall_ip(client_number, firewall_number):
+    return f"10.{client_number // 250}.{client_number % 250}.{firewall_number + 1}"
+
+def padded(ip):
+    return ".".join(octet.zfill(3) for octet in ip.split("."))
+
+def pick_profile(rng):
+    roll = rng.random()
+    for profile, share in traffic_profiles.items():
+        roll -= share
+        if roll < 0:
+            return profile
+    return "healthy"
+
+def traffic_rows(rng, rows, profile):
+    if profile == "empty":
+        return
+    for _ in range(rows):
+        direction = "I" if rng.random() < 0.6 else "O"
+        allowed = "A" if profile == "no-denied" or rng.random() < 0.8 else "D"
+        size = rng.randint(1, 9) if profile == "small-only" else rng.randint(1, 5000)
+        yield (direction, size, allowed)
+
+def write_summary_db(db_path, rng, rows, profile, firewall_ips=()):
+    conn = sqlite3.connect(db_path)
+    for table, columns in summary_schema.items():
+        conn.execute(f"CREATE TABLE {table} ({', '.join(f'{column} {kind}' for column, kind in columns.items())})")
+    conn.executemany("INSERT INTO TrafficSummary VALUES (?, ?, ?)", traffic_rows(rng, rows, profile))
+    conn.executemany("INSERT INTO Firewalls VALUES (?)", [(padded(ip),) for ip in firewall_ips])
+    conn.commit()
+    conn.close()
+
+def write_syslog(syslog_path, rng, ip, size_bytes, with_debug):
+    # Repeats a block of info lines up to size_bytes, with one debug line somewhere in the file if asked
+    line = f"2024-01-01 00:00:00 Local7.Info\t{ip}\tid=firewall sn=0 msg=\"Connection Opened\" proto=tcp/443\n"
+    block = (line * max(1, 65536 // len(line))).encode()
+    debug_at = rng.randint(0, max(0, size_bytes - 1)) if with_debug else -1
+    written = 0
+    with syslog_path.open("wb") as file:
+        while written < size_bytes:
+            chunk = block[:size_bytes - written]
+            if written <= debug_at < written + len(chunk):
+                file.write(f"2024-01-01 00:00:00 Local7.Debug\t{ip}\tmsg=\"debug trace\"\n".encode())
+            file.write(chunk)
+            written += len(chunk)
+
+# ========================== GENERATOR ==========================
+def generate_client_tree(root, clients=50, ip_firewalls=3, custom_firewalls=1, rows=20000, syslog_bytes=1_000_000,
+                         debug_fraction=0.1, failover_fraction=0.3, failover_pairs=1, excluded=2, date_exceptions=2,
+                         missing_input=1, folder_date=None, seed=1):
+    """
+    Builds the tree under root and returns the manifest (paths to point the scripts at, plus the parameters).
+    """
+    rng = random.Random(seed)
+    root = Path(root)
+    clients_folder = root / "Clients"
+    default_date = folder_date or (datetime.now() - timedelta(days=1)).strftime("%Y%m%d")
+    today = datetime.now().strftime("%Y%m%d")
+
+    client_names = [f"Client{number:05d}" for number in range(clients)]
+    excluded_clients = client_names[:excluded]
+    date_exception_clients = client_names[excluded:excluded + date_exceptions]
+    missing_input_clients = set(client_names[excluded + date_exceptions:excluded + date_exceptions + missing_input])
+
+    csv_rows = []
+    for client_number, client in enumerate(client_names):
+        client_folder = clients_folder / client
+        client_folder.mkdir(parents=True, exist_ok=True)
+        client_date = today if client in date_exception_clients else default_date
+        file_date = f"{client_date[:4]}-{client_date[4:6]}-{client_date[6:]}"
+
+        ips = [firewall_ip(client_number, number) for number in range(ip_firewalls)]
+        for ip in ips:
+            csv_rows.append([client, f"nfw.exe --f {padded(ip) if rng.random() < 0.5 else ip} --port 514 --{rng.choice(fw_types)}"])
+
+        # Failover lines in nDiscovery.ini, some clients have none or a 0.0.0.0 placeholder
+        ini_lines = ["[Discovery]", f"Client={client}", "ScanInterval=3600"]
+        if len(ips) >= 2 and rng.random() < failover_fraction:
+            for pair_number in range(failover_pairs):
+                primary, secondary = ips[(2 * pair_number) % len(ips)], ips[(2 * pair_number + 1) % len(ips)]
+                ini_lines.append(f"FailoverFirewalls=|{primary}({secondary})|")
+        else:
+            ini_lines.append("FailoverFirewalls=|0.0.0.0(0.0.0.0)|")
+        ini_lines += [f"Setting{number}=value{number}" for number in range(20)]
+        (client_folder / "nDiscovery.ini").write_text("\n".join(ini_lines) + "\n", encoding="utf-8")
+
+        if client in missing_input_clients:
+            continue
+
+        input_folder = client_folder / "Source" / client_date / "Input"
+        input_folder.mkdir(parents=True, exist_ok=True)
+
+        for ip in ips:
+            write_summary_db(input_folder / f"{file_date}-{ip}-Summary-firewall.mdb", rng, rows, pick_profile(rng))
+            write_syslog(input_folder / f"{file_date}-00-{padded(ip)}-Syslog.txt", rng, ip, syslog_bytes,
+                         rng.random() < debug_fraction)
+
+        for name in rng.sample(custom_fw_names, min(custom_firewalls, len(custom_fw_names))):
+            network_ips = [f"172.16.{client_number % 250}.{number + 1}" for number in range(rng.randint(1, 4))]
+            write_summary_db(input_folder / f"{file_date}-{name}-Summary-firewall.mdb", rng, rows, pick_profile(rng), network_ips)
+
+        # Files the checker has to skip over
+        (input_folder / f"{file_date}-Summary-traffic.mdb").write_bytes(b"")
+        (input_folder / "notes.txt").write_text("not a firewall file\n", encoding="utf-8")
+
+    manifest = {
+        "clients_folder": str(clients_folder),
+        "csv_path": str(root / "ClientFirewallDetails.csv"),
+        "client_name_exceptions_file": str(root / "ClientExclusions.txt"),
+        "client_date_exceptions_file": str(root / "ClientFolderDateExceptions.txt"),
+        "folder_date": default_date,
+        "parameters": {
+            "clients": clients, "ip_firewalls": ip_firewalls, "custom_firewalls": custom_firewalls, "rows": rows,
+            "syslog_bytes": syslog_bytes, "debug_fraction": debug_fraction, "failover_fraction": failover_fraction,
+            "failover_pairs": failover_pairs, "excluded": excluded, "date_exceptions": date_exceptions,
+            "missing_input": missing_input, "seed": seed
+        }
+    }
+
+    with open(manifest["csv_path"], "w", encoding="utf-8", newline="") as file:
+        csv.writer(file).writerows(csv_rows)
+    Path(manifest["client_name_exceptions_file"]).write_text("\n".join(excluded_clients) + "\n", encoding="utf-8")
+    Path(manifest["client_date_exceptions_file"]).write_text("\n".join(date_exception_clients) + "\n", encoding="utf-8")
+    with (root / "manifest.json").open("w", encoding="utf-8") as file:
+        json.dump(manifest, file, indent=4)
+
+    return manifest
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic client tree for testing and benchmarking.")
+    parser.add_argument("root", type=Path)
+    parser.add_argument("--clients", type=int, default=50)
+    parser.add_argument("--ip-firewalls", type=int, default=3, help="IP-named firewalls per client")
+    parser.add_argument("--custom-firewalls", type=int, default=1, help="custom-named firewalls per client")
+    parser.add_argument("--rows", type=int, default=20000, help="TrafficSummary rows per summary database")
+    parser.add_argument("--syslog-bytes", type=int, default=1_000_000, help="size of each Syslog.txt")
+    parser.add_argument("--debug-fraction", type=float, default=0.1, help="share of syslogs containing a debug event")
+    parser.add_argument("--failover-fraction", type=float, default=0.3, help="share of clients with a failover pair")
+    parser.add_argument("--failover-pairs", type=int, default=1, help="failover lines per client with failover")
+    parser.add_argument("--excluded", type=int, default=2, help="clients listed in ClientExclusions.txt")
+    parser.add_argument("--date-exceptions", type=int, default=2, help="clients checked against today's folder")
+    parser.add_argument("--missing-input", type=int, default=1, help="clients without an Input folder")
+    parser.add_argument("--folder-date", help="YYYYMMDD, defaults to yesterday")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    manifest = generate_client_tree(
+        args.root, args.clients, args.ip_firewalls, args.custom_firewalls, args.rows, args.syslog_bytes,
+        args.debug_fraction, args.failover_fraction, args.failover_pairs, args.excluded, args.date_exceptions,
+        args.missing_input, args.folder_date, args.seed
+    )
+    print(json.dumps(manifest, indent=4))
+
+if __name__ == "__main__":
+    main()
@@ -7,22 +7,47 @@
 # 3. Can be ran on one client or across all clients
 # 4. Shows vendor of FW for easier troubleshooting
 
-import pyodbc
 from pathlib import Path
 from datetime import datetime, timedelta
+import os
 import re
-import json
+import sys
+import fnmatch
+import argparse
 import logging
-import csv
+import time
+import threading
+import contextlib
+import sqlite3
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from fw_backends import get_backend, is_transient_error
+from fw_result_cache import load_result_cache, save_result_cache, lookup_cached_result, cached_folder_for, ResultCacheWriter
+from fw_report_records import TextReportWriter, ConsoleWriter, LogWriter, StructuredRecordWriter, DeferredCollector, InconclusiveCollector, LiveStatusWriter, dispatch_records
+from fw_metrics import RunMetrics
+from fw_type_index import open_fw_type_index
+from fw_history import HistoryWriter
+from syslog_debug_scanner import scan_for_debug
+from client_tree_index import build_input_file_pattern, list_client_folders, index_input_folders
+from client_name_index import open_client_name_index
+from grab_firewall_failovers import discover_failover_pairs, load_failover_state, save_failover_state
+from fw_evaluation import FleetEvaluator, load_client_fw_exceptions
+from fw_traffic_baseline import TrafficBaseline
+from fw_work_queue import WorkQueue, heartbeat, host_name, plan_key_for
 
 # ========================== PATH CONFIG ==========================
 clients_folder = Path('D:/Clients')
 client_name_exceptions_file = Path('D:/Temp/Analysts/Julian/Script_Source/ClientExclusions.txt')
 local_output_dir = Path("D:/Temp/Analysts/Cam/Threat Engineering/FW Script Outputs")
-failover_data_file = Path("D:/Temp/Analysts/Cam/Threat Engineering/FW Settings/chatfirewall_failovers.txt")
+failover_state_file = Path("D:/Temp/Analysts/Cam/Threat Engineering/FW Settings/fw_failover_state.json")
 csv_path = Path("D:/Documentation/Internal/ClientFirewallDetails.csv")
 client_date_exceptions_file = Path('D:/Temp/Analysts/Julian/Script_Source/ClientFolderDateExceptions.txt')
-client_fw_exceptions_file = Path('D:\Temp\Analysts\Cam\Threat Engineering\FW Settings\client_fw_exceptions.json')
+client_fw_exceptions_file = Path('D:/Temp/Analysts/Cam/Threat Engineering/FW Settings/client_fw_exceptions.json')  # Expected condition overrides, see fw_evaluation.py
+result_cache_file = Path("D:/Temp/Analysts/Cam/Threat Engineering/FW Settings/fw_result_cache.json")
+history_file = Path("D:/Temp/Analysts/Cam/Threat Engineering/FW Settings/fw_results_history.sqlite")  # See fw_history.py
+fw_type_index_file = Path("D:/Temp/Analysts/Cam/Threat Engineering/FW Settings/fw_type_index.sqlite")  # Compiled from csv_path, see fw_type_index.py
+client_name_index_file = Path("D:/Temp/Analysts/Cam/Threat Engineering/FW Settings/client_name_index.json")  # See client_name_index.py
+traffic_baseline_file = Path("D:/Temp/Analysts/Cam/Threat Engineering/FW Settings/fw_traffic_baseline.sqlite")  # See fw_traffic_baseline.py
 
 # ========================== VARIABLE CONFIG ==========================
 timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M")
@@ -31,12 +56,63 @@ default_folder_date = (datetime.now() - timedelta(days=1)).strftime("%Y%m%d")
 current_date = datetime.now().strftime("%Y%m%d")
 input_folder = "Input"
 traffic_summary_table = "TrafficSummary"
+summary_backend = "odbc"  # "odbc" (Access driver), "sqlite" (synthetic trees) or "mdbtools" (real .mdb on Linux), see fw_backends.py
 client = clients_folder.name
 log_file_path = local_output_dir / f"FW_logging_{timestamp}.log"
-folder_loc = None
-db_path = None
 output_file = None
 
+# ========================== PARALLEL CONFIG ==========================
+parallel_workers = 8        # Size of the process pool, 1 runs everything in this process like before
+parallel_unit = "client"    # "client" hands each client folder to a worker, "mdb" hands out each summary database
+index_workers = 16          # Threads listing Input folders (and reading changed nDiscovery.ini files) on the share
+
+# ========================== WORK QUEUE CONFIG ==========================
+work_queue_claim_per_worker = 2      # Client units a host claims at once, per pool worker
+work_queue_heartbeat_seconds = 60    # Claims are refreshed this often while a host works on them
+work_queue_stale_seconds = 600       # A claim not refreshed for this long (host gone) is handed to the next host
+work_queue_max_attempts = 3          # A unit claimed this often without finishing is closed with an error
+work_queue_poll_seconds = 10         # Wait between looks at the queue when there's nothing to claim
+work_queue_idle_exit_seconds = 600   # --work-queue helpers stop after this long without anything to claim
+
+# ========================== CLIENT SEARCH CONFIG ==========================
+client_name_index_max_age_hours = 24  # "one" mode re-lists clients_folder in the background after this, or when its mtime changes
+client_search_max_shown = 20          # Matches listed per search in "one" mode, best first
+
+# ========================== TIMEOUT CONFIG ==========================
+connect_timeout_seconds = 30    # Passed to the driver as the login timeout
+query_timeout_seconds = 300     # Passed to the driver as the query timeout
+deadline_grace_seconds = 30     # Hard deadline per database is connect + query + grace, even if the driver ignores timeouts
+min_file_age_seconds = 60       # Summary DBs modified more recently than this are still being written, defer them
+retry_attempts = 3              # Deferred / timed out databases are retried this many times after the sweep
+retry_backoff_seconds = 60      # Wait before the first retry (counted from when it was deferred), doubled each attempt
+
+# ========================== WATCH CONFIG ==========================
+watch_poll_seconds = 60         # Watch mode polls every Input folder this often
+watch_settle_seconds = 120      # A summary DB is checked once its size and mtime have not changed for this long
+watch_stop_at = "08:00"         # Watch mode exits at this time of day (HH:MM), None runs until Ctrl+C
+watch_status_file = local_output_dir / "fw_watch_status.json"  # Latest result per firewall, rewritten after every poll
+
+# ========================== TRAFFIC BASELINE CONFIG ==========================
+traffic_baseline_days = 14        # Folder dates kept per firewall, results are compared with the median of these
+traffic_baseline_min_days = 3     # Earlier dates a firewall needs before its traffic is compared at all
+traffic_volume_drop_ratio = 0.2   # Flag rows or bytes below this share of the firewall's usual volume
+traffic_ratio_shift = 0.2         # Flag a denied share of rows / inbound share of bytes this far from usual (0.2 = 20 points)
+
+# ========================== REPORT CONFIG ==========================
+structured_output_formats = ["jsonl"]  # Written next to the text report, any of "jsonl" and "csv" (see fw_report_records.py)
+report_buffer_size = 1024 * 1024       # Text report is flushed once per client instead of once per line
+
+# ========================== METRICS CONFIG ==========================
+metrics_export_formats = ["prometheus", "json"]  # "prometheus" replaces metrics_textfile, "json" is written next to the report
+metrics_textfile = local_output_dir / "fw_logging_metrics.prom"  # Point node_exporter's textfile collector here
+slowest_summary_count = 10  # Slowest clients / databases listed at the end of the run
+record_history = True       # Store every firewall's result in history_file for trend queries (python fw_history.py)
+
+# ========================== RESULT CACHE CONFIG ==========================
+use_result_cache = True         # Answer unchanged databases (same size + mtime) from result_cache_file
+refresh_result_cache = False    # Ignore cached results and recheck every database (results are still saved)
+result_cache_max_age_days = 7   # Cached folders older than this (by folder date) are dropped
+
 # ========================== PATTERNS AND LISTS ==========================
 custom_fw_names = [
     "BRANCH", "CORPORATE", "CITYHALL", "CORP", "FIREDEPARTMENT",
@@ -44,12 +120,8 @@ custom_fw_names = [
     "STUDENT", "SYSMON"
 ]
 
-regex_fw_pattern = "|".join(map(re.escape, custom_fw_names))
-
-mdb_filename_patterns = [
-    r"^\d{4}-\d{2}-\d{2}-\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3}-Summary-firewall\.mdb$",
-    fr"^\d{{4}}-\d{{2}}-\d{{2}}-({regex_fw_pattern})-Summary-firewall\.mdb$"
-]
+# Summary MDBs (<date>-<ip or custom name>-Summary-firewall.mdb) and syslogs (<date>-...-<padded ip>-Syslog.txt)
+input_file_pattern = build_input_file_pattern(custom_fw_names)
 
 expected_conditions = {
     "Traffic Size": True,
@@ -60,6 +132,38 @@ expected_conditions = {
     "Debug Events": False
 }
 
+# SQL predicates over TrafficSummary for the conditions above that come from the summary database
+traffic_conditions = {
+    "Inbound Traffic": "Direction = 'I'",
+    "Outbound Traffic": "Direction = 'O'",
+    "Traffic Size": "Bytes >= 10",
+    "Allowed Traffic": "Allowed = 'A'",
+    "Denied Traffic": "Allowed = 'D'"
+}
+
+probed_conditions = {name: traffic_conditions[name] for name in expected_conditions if name in traffic_conditions}
+condition_probe_strategy = "short-circuit"  # or "aggregate", see fw_condition_probe.py
+
+# Aggregates over TrafficSummary computed in the same pass as the conditions, compared against a rolling baseline
+# per firewall (fw_traffic_baseline.py). Off by default: collecting them reads every table in full (one aggregate
+# pass) instead of stopping at the first rows that prove each condition, so with statistics on a healthy database
+# costs a whole scan and condition_probe_strategy no longer applies. Turn on where the volume checks are worth that.
+collect_traffic_statistics = False
+traffic_statistics = {
+    "rows": "COUNT(*)",
+    "inbound_bytes": "SUM(IIF(Direction = 'I', Bytes, 0))",
+    "outbound_bytes": "SUM(IIF(Direction = 'O', Bytes, 0))",
+    "allowed_rows": "SUM(IIF(Allowed = 'A', 1, 0))",
+    "denied_rows": "SUM(IIF(Allowed = 'D', 1, 0))"
+}
+
+# Bounded first pass (see fw_condition_probe.py): only the first sample_probe_rows rows of each TrafficSummary are
+# read and every condition comes back proven present, proven absent or inconclusive. Statistics need the whole
+# table, so a sampled database only gets them once it is escalated to a full scan.
+sample_probe_rows = None      # e.g. 50000 (or --sample-rows), None reads every table in full
+escalate_inconclusive = True  # After the sweep, fully scan the databases whose sample left a condition inconclusive
+check_debug_events = True  # Scan each IP firewall's Syslog.txt for "Debug Events" (see syslog_debug_scanner.py)
+
 fw_type_normalization = {
     "palo": "Palo Alto",
     "sonicwall": "Sonicwall",
@@ -101,18 +205,29 @@ def load_date_exclustions(date_exclustions_file_path):
     return excluded
 
 def get_mode_selection():
-    available_clients = [folder.name for folder in clients_folder.iterdir() if folder.is_dir()]
-    available_clients.sort()
+    client_index = None
     while True:
-        mode = input("Check all clients or a specific one? (all/one): ").strip().lower()
-        if mode == "all":
+        mode = input("Check all clients, a specific one, or watch for new summary DBs? (all/one/watch): ").strip().lower()
+        if mode in ("all", "watch"):
             return mode, None
         elif mode == "one":
+            # Names come from the saved index, the share is only re-listed in the background (client_name_index.py)
+            if client_index is None:
+                client_index = open_client_name_index(client_name_index_file, clients_folder, client_name_index_max_age_hours)
             while True:
                 user_input = input("\nType part of the client name to search: ").strip()
-                matching_clients = [name for name in available_clients if user_input.lower() in name.lower()]
+                matching_clients = client_index.search(user_input)
+                if not matching_clients and client_index.refreshing():
+                    # Could be a client added since the saved list, wait for the listing before giving up
+                    print("Client list is still refreshing, searching again once it's done...")
+                    client_index.wait_for_refresh()
+                    matching_clients = client_index.search(user_input)
                 if not matching_clients:
-                    print("No matching clients found. Try again.")
+                    suggestions = client_index.suggest(user_input)
+                    if suggestions:
+                        print(f"No matching clients found. Did you mean: {', '.join(suggestions)}?")
+                    else:
+                        print("No matching clients found. Try again.")
                     continue
                 elif len(matching_clients) == 1:
                     confirm = input(f"Did you mean '{matching_clients[0]}'? (y/n): ").strip().lower()
@@ -121,10 +236,16 @@ def get_mode_selection():
                     else:
                         continue
                 else:
-                    print("Multiple matching clients found:")
-                    for match in matching_clients:
-                        print(f"  - {match}")
-                    exact_input = input("Type the full client name from above exactly as shown: ").strip()
+                    # Best matches first, a number picks from the list
+                    shown_clients = matching_clients[:client_search_max_shown]
+                    print(f"{len(matching_clients)} matching clients found:")
+                    for number, match in enumerate(shown_clients, 1):
+                        print(f"  {number:>2}. {match}")
+                    if len(matching_clients) > len(shown_clients):
+                        print(f"  ... and {len(matching_clients) - len(shown_clients)} more, narrow the search to see them")
+                    exact_input = input("Type the number or the full client name from above exactly as shown: ").strip()
+                    if exact_input.isdigit() and 1 <= int(exact_input) <= len(shown_clients):
+                        exact_input = shown_clients[int(exact_input) - 1]
                     if exact_input in matching_clients:
                         confirm = input(f"You selected '{exact_input}'. Confirm? (y/n): ").strip().lower()
                         if confirm == 'y':
@@ -135,19 +256,65 @@ def get_mode_selection():
                         print("That name wasn’t in the list. Try again.")
                         continue
         else:
-            print("Invalid mode. Please type 'all' or 'one'.")
+            print("Invalid mode. Please type 'all', 'one' or 'watch'.")
+
+def match_clients(patterns, available_clients):
+    """
+    Returns the clients matching any of patterns, in available_clients order. Patterns with *, ? or [ are globs
+    over the whole name, anything else is a substring like the "one" prompt, both case-insensitive.
+    Raises ValueError naming the patterns that matched nothing.
+    """
+    matched = set()
+    unmatched = []
+    for pattern in patterns:
+        if any(char in pattern for char in "*?["):
+            hits = {name for name in available_clients if fnmatch.fnmatchcase(name.lower(), pattern.lower())}
+        else:
+            hits = {name for name in available_clients if pattern.lower() in name.lower()}
+        if not hits:
+            unmatched.append(pattern)
+        matched |= hits
+
+    if unmatched:
+        raise ValueError(f"No clients match: {', '.join(unmatched)}")
+    return [name for name in available_clients if name in matched]
+
+def parse_folder_date(value):
+    # Accepts YYYYMMDD or YYYY-MM-DD, returns the YYYYMMDD folder name
+    for date_format in ("%Y%m%d", "%Y-%m-%d"):
+        try:
+            return datetime.strptime(value, date_format).strftime("%Y%m%d")
+        except ValueError:
+            continue
+    raise ValueError(f"Not a date (YYYYMMDD or YYYY-MM-DD): {value}")
+
+def folder_date_range(first_date, last_date):
+    # Every folder date from first_date to last_date, both included
+    first = datetime.strptime(first_date, "%Y%m%d")
+    last = datetime.strptime(last_date, "%Y%m%d")
+    if last < first:
+        raise ValueError(f"Date range ends before it starts: {first_date} to {last_date}")
+    return [(first + timedelta(days=offset)).strftime("%Y%m%d") for offset in range((last - first).days + 1)]
+
+def client_folder_date(client, folder_date, client_date_exceptions):
+    # Date exception clients file a day's data under the next day's folder (today's instead of yesterday's)
+    if client in client_date_exceptions:
+        return (datetime.strptime(folder_date, "%Y%m%d") + timedelta(days=1)).strftime("%Y%m%d")
+    return folder_date
 
 def get_folder_loc(client_folder, folder_date):
     return client_folder/"Source"/folder_date/input_folder
 
-def get_db_path(folder_loc, mdb_file):
-    return folder_loc/mdb_file
-
-def get_output_file(specific_client, timestamp, local_output_dir):
+def get_output_file(specific_client, timestamp, local_output_dir, folder_dates=None):
     if specific_client:
         filename = f"Logging Configurations Script_{specific_client}_{timestamp}.txt"
     else:
         filename = f"Logging Configurations Script_(ALL CLIENTS)_{timestamp}.txt"
+
+    # Backfills name the dates they checked, a normal run checks default_folder_date
+    if folder_dates and folder_dates != [default_folder_date]:
+        date_label = folder_dates[0] if len(folder_dates) == 1 else f"{folder_dates[0]}-{folder_dates[-1]}"
+        filename = filename.replace(f"_{timestamp}.txt", f"_{date_label}_{timestamp}.txt")
     return local_output_dir / filename
 
 def setup_logger(log_file_path):
@@ -162,310 +329,1097 @@ def setup_logger(log_file_path):
     logger.addHandler(file_handler)
     return logger
 
-def parse_client_firewall_types_from_csv(csv_path: Path) -> dict:
-    client_fw_type_map = {}
-    f_ip_pattern = re.compile(r"--f\s+(\d{1,3}(?:\.\d{1,3}){3})")
-    type_pattern = re.compile(r"--(\w+)\b")
+def check_debug_for_ip(syslog_files: dict, fw_identifier: str, syslog_states: dict = None):
+    """
+    Checks if the indexed .Syslog.txt file for the given IP contains '.Debug' entries.
+    Returns (found, syslog_file_name, scan_state). syslog_states holds the scan state from earlier runs keyed by
+    file name, so only the part of the syslog appended since then is read (see syslog_debug_scanner.py).
+    """
+    # Look for file like: 2024-04-16-00-010.100.000.001-Syslog.txt (indexed by normalized IP)
+    syslog_file = syslog_files.get(fw_identifier)
+    if not syslog_file:
+        return False, None, None
 
-    if not csv_path.exists():
-        print(f"Warning: CSV not found: {csv_path}")
-        return client_fw_type_map
+    try:
+        found, scan_state = scan_for_debug(syslog_file, (syslog_states or {}).get(syslog_file.name))
+        return found, syslog_file.name, scan_state
+
+    except Exception as e:
+        print(f"Error checking debug events for {fw_identifier}: {e}")
+        return False, None, None
+
+def default_check_settings(backend=None):
+    # Run-wide settings handed to every unit of work, pool workers don't see changes made to the globals at runtime
+    return {
+        "backend": backend or summary_backend,
+        "connect_timeout": connect_timeout_seconds,
+        "query_timeout": query_timeout_seconds,
+        "deadline_grace": deadline_grace_seconds,
+        "min_file_age": min_file_age_seconds,
+        "sample_rows": sample_probe_rows,
+        "collect_traffic_statistics": collect_traffic_statistics
+    }
+
+# ========================== WORKER FUNCTIONS ==========================
+# Everything in here may run inside a pool worker, so nothing writes to the report, console or log directly.
+# Work produces result records (see fw_report_records.py) that the parent process hands to the report,
+# console, log, structured output and result cache in the same order as a sequential run.
+class ClientOutput:
+    def __init__(self):
+        self.records = []
+
+    def record(self, record_type, **fields):
+        self.records.append({"record_type": record_type, **fields})
+
+    def log(self, level, message):
+        self.record("log", level=level, message=message)
+
+    def cache(self, section, folder_key, folder_date, file_name, record):
+        self.record("cache", section=section, folder_key=folder_key, folder_date=folder_date, file_name=file_name, record=record)
+
+    @contextlib.contextmanager
+    def timed(self, phase):
+        # Worker side phase timer, the parent's RunMetrics picks these up from the record stream
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record("metric", phase=phase, seconds=time.perf_counter() - start)
+
+def plan_client(output, folder_index, client_context):
+    """
+    Records the client header and returns the summary databases to check from the client's index entry.
+    Returns None when the Input folder is missing and there is nothing to check.
+    """
+    output.record("client", event="start", client=folder_index["client"], folder_date=client_context["folder_date"],
+                  folder_loc=str(folder_index["folder_loc"]), exists=folder_index["exists"], folder_error=folder_index["error"],
+                  failover_pairs=client_context["failover_pairs"])
+    if not folder_index["exists"]:
+        return None
+
+    # Only files that matched our expected .mdb patterns were indexed
+    return folder_index["summary_dbs"]
+
+class DatabaseDeferred(Exception):
+    # The database is locked, still being written or too slow right now, retry it later instead of failing it
+    pass
+
+def run_with_deadline(seconds, func, *args):
+    """
+    Runs func on a daemon thread and gives up waiting after seconds by raising DatabaseDeferred.
+    A driver call that ignores its own timeout is left behind on that thread so the rest of the sweep keeps moving.
+    """
+    result = {}
+
+    def target():
+        try:
+            result["value"] = func(*args)
+        except BaseException as exception:
+            result["error"] = exception
+
+    worker = threading.Thread(target=target, daemon=True)
+    worker.start()
+    worker.join(seconds)
+    if worker.is_alive():
+        raise DatabaseDeferred(f"timed out after {seconds}s")
+    if "error" in result:
+        raise result["error"]
+    return result["value"]
+
+def deferral_reason(summary_db, check_settings):
+    # Reasons not to open a database right now, None if it looks safe to check
+    if summary_db.get("locked"):
+        return "locked by another process"
+    age_seconds = time.time() - summary_db["mtime_ns"] / 1e9
+    if age_seconds < check_settings["min_file_age"]:
+        return f"still being written (modified {int(age_seconds)}s ago)"
+    return None
+
+def finish_client(output, client, summary_dbs):
+    if not summary_dbs:
+        output.record("client", event="no_summary_dbs", client=client)
+
+def identify_firewall(summary_db, fw_types):
+    # Returns (firewall_identifier, vendor, is_custom_fw) for an indexed summary database.
+    # The index already pulled the IP (normalized) or the custom firewall name out of the file name.
+    firewall_identifier = summary_db["identifier"]
+    is_custom_fw = summary_db["is_custom_fw"]
+
+    # Include firewall type for IP-named firewalls, fw_types already holds normalized vendor names
+    vendor = None
+    if not is_custom_fw:
+        vendor = fw_types.get(firewall_identifier, "Unknown")
+
+    return firewall_identifier, vendor, is_custom_fw
+
+def query_mdb_file(output, db_path, is_custom_fw, check_settings):
+    # Opens the summary database through the configured backend and returns (found_conditions, custom_fw_ips, traffic,
+    # inconclusive), the last one being the conditions a sampled probe couldn't settle
+    backend = get_backend(check_settings["backend"])
+    output.log(logging.INFO, f"Attempting to connect to {db_path.name}")
+    with output.timed("connect"):
+        conn = backend.connect(db_path, check_settings["connect_timeout"])
+    output.log(logging.INFO, f"Successfully connected to {db_path.name}! ")
 
     try:
-        with csv_path.open("r", encoding="utf-8") as file:
-            reader = csv.reader(file)
-            for row in reader:
-                if len(row) < 2:
-                    continue
+        backend.apply_query_timeout(conn, check_settings["query_timeout"])
+
+        # Get IPs if it's a custom-named firewall
+        custom_fw_ips = []
+        if is_custom_fw:
+            try:
+                with output.timed("firewalls_lookup"):
+                    custom_fw_ips = backend.firewall_ips(conn)
+
+            except Exception as exception:
+                custom_fw_ips = [f"Error retrieving IPs: {str(exception)}"]
+
+        # Run logging conditions probe (single scan, see fw_condition_probe.py), with the traffic statistics if wanted
+        output.log(logging.INFO, "Executing query!")
+        inconclusive = []
+        with output.timed("conditions_query"):
+            if check_settings["sample_rows"]:
+                found_conditions, inconclusive = backend.sample_conditions(conn, traffic_summary_table, probed_conditions, check_settings["sample_rows"])
+                traffic = None
+            elif check_settings["collect_traffic_statistics"]:
+                found_conditions, traffic = backend.probe_traffic(conn, traffic_summary_table, probed_conditions, traffic_statistics)
+            else:
+                found_conditions, traffic = backend.probe_conditions(conn, traffic_summary_table, probed_conditions, condition_probe_strategy), None
+    finally:
+        conn.close()
 
-                client_name = row[0].strip()
-                content = row[1]
+    output.log(logging.INFO, f"Closed connection to {db_path.name}")
+    return found_conditions, custom_fw_ips, traffic, inconclusive
 
-                # Find --f IP
-                f_ip_match = f_ip_pattern.search(content)
-                # Find last --type
-                all_types = type_pattern.findall(content)
-                fw_type = all_types[-1] if all_types else None
+def check_mdb_file(summary_db, client_context, check_settings=None):
+    """
+    Checks a single summary database from the client tree index and returns its records.
+    client_context carries what the worker needs to know about the client: name, folder_date, fw_types (its entry
+    from the firewall type CSV), failover_pairs, syslogs (the folder's syslog index), cached_folder (its entry
+    from the result cache, None skips the cache entirely) and attempt (1 on the first pass, higher on retries).
+    Never raises, a broken database is reported as an error record and a locked or slow one as deferred.
+    A checked database comes back with status "checked" until FleetEvaluator classifies it. With check_settings
+    sample_rows only the first rows are probed, and inconclusive lists the conditions that sample couldn't settle.
+    """
+    check_settings = check_settings or default_check_settings()
+    started = time.perf_counter()
+    output = ClientOutput()
+    db_path = summary_db["path"]
+    folder_loc = db_path.parent
+    folder_date = client_context["folder_date"]
+    cached_folder = client_context["cached_folder"]
+    firewall_record = {
+        "client": client_context["client"],
+        "folder_date": folder_date,
+        "db_file": db_path.name,
+        "firewall_identifier": summary_db["identifier"],
+        "vendor": None,
+        "is_custom_fw": summary_db["is_custom_fw"],
+        "conditions": {},
+        "misconfigurations": [],
+        "traffic": None,
+        "traffic_anomalies": [],
+        "inconclusive": [],
+        "status": "error",
+        "severity": "CRITICAL",
+        "failover_partner": None,
+        "custom_fw_ips": [],
+        "from_cache": False,
+        "elapsed_seconds": None,
+        "attempt": client_context.get("attempt", 1),
+        "error": None
+    }
 
-                if f_ip_match and fw_type:
-                    ip = f_ip_match.group(1)
-                    normalized_ip = ".".join(str(int(octet)) for octet in ip.split("."))
+    try:
+        firewall_identifier, vendor, is_custom_fw = identify_firewall(summary_db, client_context["fw_types"])
+        firewall_record["vendor"] = vendor
+
+        # Size and mtime came with the directory listing, no extra stat on the share
+        fingerprint = {"size": summary_db["size"], "mtime_ns": summary_db["mtime_ns"]} if cached_folder is not None else None
+        cached_record = lookup_cached_result(cached_folder["files"], db_path.name, fingerprint) if fingerprint else None
+        if (cached_record and check_settings["collect_traffic_statistics"] and not check_settings["sample_rows"]
+                and cached_record.get("traffic") is None):
+            # Cached without statistics (by a sampled run or with them off), worth one more full scan to get them.
+            # A sampled run wouldn't get them either, it keeps the entry.
+            cached_record = None
+        if cached_record:
+            output.log(logging.INFO, f"Unchanged since last run, using cached result for {db_path.name}")
+            # Entries written before Debug Events was kept out of the cache may still carry it
+            found_conditions = [name for name in cached_record["found_conditions"] if name in probed_conditions]
+            custom_fw_ips = cached_record["custom_fw_ips"]
+            traffic = cached_record.get("traffic")
+            inconclusive = []
+        else:
+            reason = deferral_reason(summary_db, check_settings)
+            if reason:
+                raise DatabaseDeferred(reason)
+
+            # Logs from the query are only kept if it finishes in time
+            query_output = ClientOutput()
+            deadline = check_settings["connect_timeout"] + check_settings["query_timeout"] + check_settings["deadline_grace"]
+            found_conditions, custom_fw_ips, traffic, inconclusive = run_with_deadline(deadline, query_mdb_file, query_output, db_path, is_custom_fw, check_settings)
+            output.records.extend(query_output.records)
+
+        # Syslog is checked on every run, the scanner only reads what was appended since the last one. Debug Events
+        # only ever comes from this run's scan, the cache keeps just what the summary database showed.
+        summary_conditions = found_conditions
+        if check_debug_events and not is_custom_fw:
+            syslog_states = cached_folder["syslogs"] if cached_folder is not None else None
+            with output.timed("debug_scan"):
+                debug_found, syslog_name, scan_state = check_debug_for_ip(client_context["syslogs"], firewall_identifier, syslog_states)
+            if debug_found:
+                found_conditions = found_conditions + ["Debug Events"]
+            if syslog_name and cached_folder is not None:
+                output.cache("syslogs", str(folder_loc), folder_date, syslog_name, scan_state)
+
+        # Remember the result unless the IP lookup failed or the sample left something open, those are worth another look
+        if (fingerprint and not cached_record and not inconclusive
+                and not any(ip.startswith("Error retrieving IPs") for ip in custom_fw_ips)):
+            output.cache("files", str(folder_loc), folder_date, db_path.name, {
+                **fingerprint,
+                "found_conditions": summary_conditions,
+                "custom_fw_ips": custom_fw_ips,
+                "traffic": traffic,
+                "checked_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            })
+
+        # Only what was found, the comparison with the expected conditions happens in bulk (see fw_evaluation.py)
+        firewall_record.update({
+            "vendor": vendor,
+            "conditions": {condition: condition in found_conditions for condition in expected_conditions},
+            "traffic": traffic,
+            "inconclusive": inconclusive,
+            "status": "checked",
+            "severity": None,
+            "custom_fw_ips": custom_fw_ips,
+            "from_cache": bool(cached_record)
+        })
+
+    except Exception as exception:
+        firewall_record["error"] = str(exception)
+        if isinstance(exception, DatabaseDeferred) or is_transient_error(exception):
+            firewall_record.update({"status": "deferred", "severity": "WARNING"})
+
+    firewall_record["elapsed_seconds"] = round(time.perf_counter() - started, 4)
+    output.record("firewall", **firewall_record)
+    return output.records
+
+def build_client_context(client, folder_date, folder_index, fw_type_index, failover_pairs, result_cache, refresh_cache):
+    # Everything a worker needs to know about one client (see check_mdb_file)
+    # Only this client's cache entries travel to the worker, an empty dict still records fresh results
+    cached_folder = None
+    if result_cache is not None:
+        cached_folder = {"files": {}, "syslogs": {}} if refresh_cache else cached_folder_for(result_cache, str(folder_index["folder_loc"]))
+
+    return {
+        "client": client,
+        "folder_date": folder_date,
+        "fw_types": fw_type_index.vendors_for(client),
+        "failover_pairs": failover_pairs.get(client, []),
+        "syslogs": folder_index["syslogs"],
+        "cached_folder": cached_folder
+    }
+
+def check_client(folder_index, client_context, check_settings=None):
+    # Whole-client unit of work: header, every summary database, then the footer
+    output = ClientOutput()
+    summary_dbs = plan_client(output, folder_index, client_context)
+    if summary_dbs is None:
+        return output.records
+
+    for summary_db in summary_dbs:
+        output.records.extend(check_mdb_file(summary_db, client_context, check_settings))
+    finish_client(output, folder_index["client"], summary_dbs)
+    return output.records
+
+# ========================== ORDERED WORK POOL ==========================
+class OrderedWorkPool:
+    """
+    Runs units of work on a process pool and hands their output back in the order they were added.
+    If a worker process dies (e.g. the Access driver crashes on a corrupt file) the unit being waited on
+    is rerun on its own single-worker pool, and everything still pending moves to a fresh pool, so one
+    bad database only costs its own result instead of the whole sweep.
+    """
+    def __init__(self, workers):
+        self.workers = workers
+        self.pool = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+        self.parts = []
 
-                    if client_name not in client_fw_type_map:
-                        client_fw_type_map[client_name] = {}
-                    client_fw_type_map[client_name][normalized_ip] = fw_type
-    except Exception as e:
-        print(f"Error reading firewall type CSV: {e}")
+    def add_records(self, records):
+        self.parts.append({"records": records})
 
-    return client_fw_type_map
+    def submit(self, label, func, *args):
+        if self.pool is None:
+            self.parts.append({"records": func(*args)})
+        else:
+            self.parts.append({"label": label, "func": func, "args": args, "future": self.pool.submit(func, *args)})
+
+    def results(self):
+        # Parts are handed over once, so the same pool can take the next batch (watch mode)
+        parts, self.parts = self.parts, []
+        for index, part in enumerate(parts):
+            if "future" not in part:
+                yield part["records"]
+                continue
 
-def check_debug_for_ip(folder_loc: Path, fw_identifier: str) -> bool:
+            try:
+                yield part["future"].result()
+            except BrokenProcessPool:
+                self._restart_pool(parts[index + 1:])
+                yield self._run_isolated(part)
+            except Exception as exception:
+                yield self._error_records(part["label"], exception)
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown()
+
+    def _restart_pool(self, pending_parts):
+        # Resubmit every pending unit that was sitting on the broken pool
+        broken_pool = self.pool
+        self.pool = ProcessPoolExecutor(max_workers=self.workers)
+        broken_pool.shutdown(wait=False)
+        for part in pending_parts:
+            future = part.get("future")
+            if future is not None and (not future.done() or isinstance(future.exception(), BrokenProcessPool)):
+                part["future"] = self.pool.submit(part["func"], *part["args"])
+
+    def _run_isolated(self, part):
+        with ProcessPoolExecutor(max_workers=1) as isolated_pool:
+            try:
+                return isolated_pool.submit(part["func"], *part["args"]).result()
+            except BrokenProcessPool:
+                return self._error_records(part["label"], "worker process crashed")
+            except Exception as exception:
+                return self._error_records(part["label"], exception)
+
+    @staticmethod
+    def _error_records(label, exception):
+        return [{"record_type": "error", "label": label, "error": str(exception)}]
+
+# ========================== WORK QUEUE ==========================
+def process_queue_units(queue, claimed, work_pool):
+    # Runs claimed queue units on work_pool and stores each unit's records as its result, returns how many ran
+    for _, _, label, args in claimed:
+        work_pool.submit(label, check_client, *args)
+    for (sweep_id, position, _, _), records in zip(claimed, work_pool.results()):
+        queue.complete(sweep_id, position, records)
+    return len(claimed)
+
+class QueueWorkPool:
     """
-    Checks if a .Syslog.txt file exists for the given IP (zero-padded format) and contains '.Debug' entries.
-    Returns True if debug events are found, False otherwise.
+    OrderedWorkPool over the shared work queue (fw_work_queue.py): results() publishes the submitted client units
+    for every host to claim, works on them here too, and hands the records back in the order they were added,
+    waiting for units other hosts are still on. Only whole-client units (check_client) can be queued.
     """
-    if not re.match(r"^\d+\.\d+\.\d+\.\d+$", fw_identifier):
-        return False  # Only check IP-based firewalls
+    def __init__(self, queue_file, workers):
+        self.queue_file = queue_file
+        self.queue = WorkQueue(queue_file, work_queue_stale_seconds, work_queue_max_attempts)
+        self.host = host_name()
+        self.workers = workers
+        self.local_pool = OrderedWorkPool(workers)
+        self.parts = []
+        self.units = []
+
+    def add_records(self, records):
+        self.parts.append({"records": records})
+
+    def submit(self, label, func, *args):
+        if func is not check_client:
+            raise ValueError("Only whole-client units (check_client) can go through the work queue")
+        self.parts.append({"position": len(self.units)})
+        self.units.append((label, list(args)))
+
+    def results(self):
+        parts, self.parts = self.parts, []
+        units, self.units = self.units, []
+        if not units:
+            yield from (part["records"] for part in parts)
+            return
+
+        # Same clients, folders and check settings (backend, sample_rows, statistics...) as an unfinished sweep:
+        # resume it, its finished units are not checked again. A rerun with other settings starts a new sweep.
+        plan_key = plan_key_for([(label, str(args[0]["folder_loc"])) for label, args in units],
+                                [args[2] if len(args) > 2 else None for _, args in units])
+        sweep_id = self.queue.publish(plan_key, units)
+        print(f"Work queue sweep {sweep_id}: {len(units)} client unit(s) on {self.queue_file}")
+
+        ready = {}
+        with heartbeat(self.queue_file, self.host, work_queue_heartbeat_seconds):
+            for part in parts:
+                if "records" in part:
+                    yield part["records"]
+                    continue
 
-    # Zero-pad the IP to match syslog filename pattern
-    padded_ip = ".".join(octet.zfill(3) for octet in fw_identifier.split("."))
+                position = part["position"]
+                while position not in ready:
+                    ready.update(self.queue.results(sweep_id, position, 200))
+                    if position in ready:
+                        break
+                    claimed = self.queue.claim(self.host, self.workers * work_queue_claim_per_worker, sweep_id)
+                    if not claimed:
+                        # The rest is claimed by other hosts
+                        progress = self.queue.progress(sweep_id)
+                        print(f"Waiting on other hosts: {progress.get('done', 0)} of {len(units)} unit(s) done, "
+                              f"{progress.get('claimed', 0)} claimed")
+                        time.sleep(work_queue_poll_seconds)
+                    else:
+                        process_queue_units(self.queue, claimed, self.local_pool)
+                yield ready.pop(position)
+        self.queue.finish(sweep_id)
+
+    def close(self):
+        self.local_pool.close()
+        self.queue.close()
 
-    # Look for file like: 2024-04-16-00-010.100.000.001-Syslog.txt
+def work_queue_helper(queue_file, workers=parallel_workers, idle_exit_seconds=work_queue_idle_exit_seconds):
+    """
+    Helper host for sweeps published by a coordinator run with --queue: claims client units of any unfinished
+    sweep and stores their results until nothing has been claimable for idle_exit_seconds. The coordinator
+    writes the report, history and cache. Clients must be reachable under the same paths as on the coordinator.
+    """
+    queue = WorkQueue(queue_file, work_queue_stale_seconds, work_queue_max_attempts)
+    host = host_name()
+    work_pool = OrderedWorkPool(workers)
+    print(f"Working on {queue_file} as {host}...")
+    checked_count = 0
+    idle_since = time.monotonic()
     try:
-        syslog_file = next(folder_loc.glob(f"*-{padded_ip}-Syslog.txt"), None)
-        if not syslog_file or not syslog_file.exists():
-            return False
+        with heartbeat(queue_file, host, work_queue_heartbeat_seconds):
+            while time.monotonic() - idle_since < idle_exit_seconds:
+                claimed = queue.claim(host, workers * work_queue_claim_per_worker)
+                if claimed:
+                    checked_count += process_queue_units(queue, claimed, work_pool)
+                    print(f"Checked {', '.join(label for _, _, label, _ in claimed)}")
+                    idle_since = time.monotonic()
+                else:
+                    time.sleep(work_queue_poll_seconds)
+    except KeyboardInterrupt:
+        print("\nStopped, unfinished claims go back to the queue once they are stale.")
+    finally:
+        work_pool.close()
+        queue.close()
+    print(f"Checked {checked_count} client unit(s).")
+
+# ========================== DEFERRED RETRIES ==========================
+def refresh_summary_db(summary_db):
+    # Re-read size, mtime and lock state before a retry, the index is from the start of the run
+    stat = summary_db["path"].stat()
+    locked = any(summary_db["path"].with_suffix(suffix).exists() for suffix in (".ldb", ".laccdb"))
+    return {**summary_db, "size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "locked": locked}
+
+def retry_deferred_databases(deferred_collector, database_units, workers, check_settings, consumers, evaluator):
+    """
+    Retries deferred databases on a fresh pool, with exponential backoff counted from when each one was deferred.
+    Results are classified by the sweep's evaluator and go to the same consumers under a "Deferred databases"
+    section of the report.
+    """
+    for attempt in range(1, retry_attempts + 1):
+        deferred = deferred_collector.take()
+        if not deferred:
+            return
+
+        backoff = retry_backoff_seconds * 2 ** (attempt - 1)
+        wait = max(deferred_at for deferred_at, _, _ in deferred) + backoff - time.monotonic()
+        if wait > 0:
+            time.sleep(wait)
+
+        dispatch_records([{"record_type": "section", "title": f"Deferred databases - retry {attempt} of {retry_attempts}"}], consumers)
+        retry_pool = OrderedWorkPool(workers)
+        previous_client = None
+        for _, client, db_file in deferred:
+            summary_db, client_context = database_units[(client, db_file)]
+            # One retry event per client, so its databases (failover partners included) are evaluated as one batch
+            if client != previous_client:
+                retry_pool.add_records([{"record_type": "client", "event": "retry", "client": client, "attempt": attempt + 1}])
+                previous_client = client
+            try:
+                summary_db = refresh_summary_db(summary_db)
+            except OSError:
+                pass  # Gone or unreachable, the check itself will report it
+            retry_pool.submit(db_file, check_mdb_file, summary_db, {**client_context, "attempt": attempt + 1}, check_settings)
+
+        try:
+            for records in evaluator.evaluate_batches(retry_pool.results()):
+                dispatch_records(records, consumers)
+        finally:
+            retry_pool.close()
+
+    still_deferred = deferred_collector.take()
+    if still_deferred:
+        dispatch_records([{"record_type": "section",
+                           "title": f"{len(still_deferred)} database(s) still deferred / timed out after {retry_attempts} retries"}], consumers)
+
+def escalate_inconclusive_databases(inconclusive_collector, database_units, workers, check_settings, consumers, evaluator):
+    """
+    Second, lower-priority phase of a sampled sweep: fully scans the databases whose sample left a condition
+    inconclusive, once everything else (retries included) is in. The full result replaces the sampled one in the
+    evaluator and goes to the consumers under a "Full scans" section of the report.
+    """
+    inconclusive = inconclusive_collector.take()
+    if not inconclusive:
+        return
+
+    dispatch_records([{"record_type": "section", "title": f"Full scans - {len(inconclusive)} database(s) inconclusive within the sample"}], consumers)
+    full_scan_settings = {**check_settings, "sample_rows": None}
+    full_scan_pool = OrderedWorkPool(workers)
+    previous_client = None
+    for client, db_file in inconclusive:
+        summary_db, client_context = database_units[(client, db_file)]
+        if client != previous_client:
+            full_scan_pool.add_records([{"record_type": "client", "event": "full_scan", "client": client}])
+            previous_client = client
+        full_scan_pool.submit(db_file, check_mdb_file, summary_db, client_context, full_scan_settings)
 
-        with syslog_file.open("r", encoding="utf-8", errors="ignore") as f:
-            return any(".Debug" in line for line in f)
+    try:
+        for records in evaluator.evaluate_batches(full_scan_pool.results()):
+            dispatch_records(records, consumers)
+    finally:
+        full_scan_pool.close()
+
+# ========================== METRICS ==========================
+def open_traffic_baseline(logger):
+    # None when statistics aren't collected or the baseline can't be opened, traffic just isn't compared then
+    if not collect_traffic_statistics:
+        return None
+    try:
+        return TrafficBaseline(traffic_baseline_file, traffic_baseline_days, traffic_baseline_min_days,
+                               traffic_volume_drop_ratio, traffic_ratio_shift)
+    except (OSError, sqlite3.Error) as e:
+        logger.error(f"Traffic baseline unavailable, traffic won't be compared this run: {e}")
+        return None
+
+def write_run_metrics(metrics, logger):
+    # Slowest clients / databases to the console and log, then the exports for graphing the trend
+    summary_lines = metrics.summary_lines(slowest_summary_count)
+    print("\n" + "\n".join(summary_lines))
+    for line in summary_lines:
+        logger.info(line)
 
-    except Exception as e:
-        print(f"Error checking debug events for {fw_identifier}: {e}")
-        return False
+    try:
+        if "prometheus" in metrics_export_formats:
+            metrics.write_prometheus(metrics_textfile, slowest_summary_count)
+            logger.info(f"Metrics written to {metrics_textfile}")
+        if "json" in metrics_export_formats:
+            metrics.write_json(output_file.with_suffix(".metrics.json"), slowest_summary_count)
+            logger.info(f"Metrics written to {output_file.with_suffix('.metrics.json')}")
+    except OSError as e:
+        logger.error(f"Could not write metrics: {e}")
+
+# ========================== WATCH MODE ==========================
+def watch_deadline(stop_at, now):
+    # Next time the clock reads stop_at (HH:MM), so starting at 22:00 with "08:00" runs through the night
+    if not stop_at:
+        return None
+    deadline = datetime.combine(now.date(), datetime.strptime(stop_at, "%H:%M").time())
+    return deadline if deadline > now else deadline + timedelta(days=1)
+
+def stat_folder_mtimes(folder_locs, workers):
+    # {folder_loc: directory mtime_ns, None if missing}, one stat per folder instead of a listing
+    def folder_mtime(folder_loc):
+        try:
+            return os.stat(folder_loc).st_mtime_ns
+        except OSError:
+            return None
+
+    if workers <= 1 or len(folder_locs) <= 1:
+        return {folder_loc: folder_mtime(folder_loc) for folder_loc in folder_locs}
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return dict(zip(folder_locs, pool.map(folder_mtime, folder_locs)))
+
+def ready_summary_dbs(folder_index, seen, checked, settle_seconds, now):
+    """
+    Splits a folder's summary DBs into (ready, pending). A DB is ready once it isn't locked and its size and
+    mtime have stayed the same for settle_seconds of polling, or its mtime was already that old when first seen.
+    DBs already checked at the same size and mtime are neither. seen maps path -> (fingerprint, first seen).
+    """
+    ready, pending = [], []
+    for summary_db in folder_index["summary_dbs"]:
+        path = str(summary_db["path"])
+        fingerprint = (summary_db["size"], summary_db["mtime_ns"])
+        if checked.get(path) == fingerprint:
+            continue
+
+        if path not in seen or seen[path][0] != fingerprint:
+            already_old = path not in seen and time.time() - summary_db["mtime_ns"] / 1e9 >= settle_seconds
+            seen[path] = (fingerprint, now)
+            settled = already_old
+        else:
+            settled = now - seen[path][1] >= settle_seconds
+
+        if settled and not summary_db["locked"]:
+            ready.append(summary_db)
+        else:
+            pending.append(summary_db)
+    return ready, pending
+
+def watch_poll(watch, work_pool, consumers, deferred_collector, fw_type_index, result_cache, check_settings, metrics):
+    """
+    One watch mode poll: stats every Input folder, re-lists the ones whose listing changed or that still have
+    unfinished summary DBs, and checks every DB that has settled. Returns how many databases were checked.
+    """
+    default_date, exception_date = (datetime.now() - timedelta(days=1)).strftime("%Y%m%d"), datetime.now().strftime("%Y%m%d")
+    with metrics.phase("list_clients"):
+        client_folders = [(client, client_folder) for client, client_folder in list_client_folders(clients_folder)
+                          if client not in watch["client_name_exceptions"]]
+    client_plan = []
+    for client, client_folder in client_folders:
+        folder_date = exception_date if client in watch["client_date_exceptions"] else default_date
+        client_plan.append((client, folder_date, get_folder_loc(client_folder, folder_date)))
+
+    # New folder date (or first poll): start over on the new folders and pick up failover changes
+    if watch["folder_date"] != default_date:
+        with metrics.phase("failover_discovery"):
+            watch["failover_pairs"], watch["failover_state"] = discover_failover_pairs(client_folders, watch["failover_state"], index_workers, metrics)
+        watch["evaluator"].set_failover_pairs(watch["failover_pairs"])
+        watch.update({"folder_date": default_date, "folder_mtimes": {}, "pending_folders": set(), "seen": {}, "checked": {}})
+
+    # Adding, renaming or deleting a file (including .ldb lock files) changes the folder's mtime, growing files
+    # don't, which is what pending_folders is for
+    with metrics.phase("watch_stat"):
+        folder_mtimes = stat_folder_mtimes([folder_loc for _, _, folder_loc in client_plan], index_workers)
+    changed = [(client, folder_date, folder_loc) for client, folder_date, folder_loc in client_plan
+               if folder_mtimes[folder_loc] is not None
+               and (folder_mtimes[folder_loc] != watch["folder_mtimes"].get(folder_loc) or folder_loc in watch["pending_folders"])]
+    watch["folder_mtimes"] = folder_mtimes
+    with metrics.phase("index_folders"):
+        folder_indexes = index_input_folders([(client, folder_loc) for client, _, folder_loc in changed], input_file_pattern, index_workers)
+
+    submitted = {}
+    now = time.monotonic()
+    for (client, folder_date, folder_loc), folder_index in zip(changed, folder_indexes):
+        ready, pending = ready_summary_dbs(folder_index, watch["seen"], watch["checked"], watch["settle_seconds"], now)
+        if pending:
+            watch["pending_folders"].add(folder_loc)
+        else:
+            watch["pending_folders"].discard(folder_loc)
+        if not ready:
+            continue
+
+        client_context = build_client_context(client, folder_date, folder_index, fw_type_index, watch["failover_pairs"],
+                                              result_cache, False)
+        output = ClientOutput()
+        plan_client(output, folder_index, client_context)
+        work_pool.add_records(output.records)
+        for summary_db in ready:
+            submitted[(client, summary_db["name"])] = summary_db
+            work_pool.submit(summary_db["name"], check_mdb_file, summary_db, client_context, check_settings)
+
+    for records in watch["evaluator"].evaluate_batches(work_pool.results()):
+        with metrics.phase("report_write"):
+            dispatch_records(records, consumers)
+
+    # Deferred databases stay unchecked and come around again on the next poll
+    deferred = {(client, db_file) for _, client, db_file in deferred_collector.take()}
+    for key, summary_db in submitted.items():
+        if key in deferred:
+            watch["pending_folders"].add(summary_db["path"].parent)
+        else:
+            watch["checked"][str(summary_db["path"])] = (summary_db["size"], summary_db["mtime_ns"])
+    return len(submitted)
+
+def watch_fw_logging_levels(poll_seconds=watch_poll_seconds, settle_seconds=watch_settle_seconds, stop_at=watch_stop_at,
+                            workers=parallel_workers, backend=summary_backend, output_formats=structured_output_formats):
+    """
+    Long-running alternative to the nightly sweep: polls every client's Input folder and checks each summary DB
+    as soon as it has settled, so results come in over the night instead of in one burst at the end. Results go
+    to the usual report / log / JSONL / history consumers plus watch_status_file, all updated after every poll.
+    Runs until stop_at or Ctrl+C.
+    """
+    logger = setup_logger(log_file_path)
+    run_started = time.perf_counter()
+    deadline = watch_deadline(stop_at, datetime.now())
+    print(f"Watch mode has started, polling every {poll_seconds}s" + (f" until {deadline:%Y-%m-%d %H:%M}" if deadline else "") + "...")
+    logger.info("Watch mode has started")
+
+    metrics = RunMetrics("fw_logging_watch")
+    watch = {
+        "client_name_exceptions": set(load_excluded_clients(client_name_exceptions_file)),
+        "client_date_exceptions": set(load_date_exclustions(client_date_exceptions_file)),
+        "settle_seconds": settle_seconds,
+        "failover_state": load_failover_state(failover_state_file),
+        "folder_date": None,
+        "evaluator": FleetEvaluator(expected_conditions, probed_conditions,
+                                    load_client_fw_exceptions(client_fw_exceptions_file, expected_conditions), metrics=metrics,
+                                    traffic_baseline=open_traffic_baseline(logger))
+    }
+    fw_type_index = open_fw_type_index(fw_type_index_file, csv_path, fw_type_normalization)
+    result_cache = load_result_cache(result_cache_file, result_cache_max_age_days) if use_result_cache else None
+    # The poll already waits for each DB to settle, min_file_age would only hold it back further. Databases come in
+    # one poll at a time, there's no sweep for a sampled first pass to get ahead of.
+    check_settings = {**default_check_settings(backend), "min_file_age": 0, "sample_rows": None}
+
+    global output_file
+    output_file = local_output_dir / f"Logging Configurations Script_(WATCH)_{timestamp}.txt"
+    local_output_dir.mkdir(parents=True, exist_ok=True)
+    structured_writers = [
+        StructuredRecordWriter(output_file.with_suffix(f".{output_format}"), output_format, expected_conditions)
+        for output_format in output_formats
+    ]
+    history_writer = None
+    if record_history:
+        try:
+            history_writer = HistoryWriter(history_file, (datetime.now() - timedelta(days=1)).strftime("%Y%m%d"), expected_conditions, "watch")
+        except (OSError, sqlite3.Error) as e:
+            logger.error(f"Results history unavailable, this run won't be recorded: {e}")
+    live_status = LiveStatusWriter(watch_status_file)
+    work_pool = OrderedWorkPool(workers)
+
+    try:
+        with output_file.open("w", encoding="utf-8", buffering=report_buffer_size) as file:
+            file.write(f"Firewall Settings Watch Results - {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
+            file.write("=" * 50 + "\n")
+
+            deferred_collector = DeferredCollector()
+            consumers = [TextReportWriter(file), ConsoleWriter(), LogWriter(logger), deferred_collector, metrics, live_status] + structured_writers
+            if result_cache is not None:
+                consumers.append(ResultCacheWriter(result_cache))
+            if history_writer is not None:
+                consumers.append(history_writer)
+
+            try:
+                while deadline is None or datetime.now() < deadline:
+                    poll_started = time.monotonic()
+                    with metrics.phase("watch_poll"):
+                        checked_count = watch_poll(watch, work_pool, consumers, deferred_collector, fw_type_index,
+                                                   result_cache, check_settings, metrics)
+
+                    # Make this poll's results visible before going back to sleep
+                    if checked_count:
+                        file.flush()
+                        for writer in structured_writers:
+                            writer.flush()
+                        if history_writer is not None:
+                            history_writer.flush()
+                        if watch["evaluator"].traffic_baseline is not None:
+                            watch["evaluator"].traffic_baseline.flush()
+                        live_status.write()
+                        if result_cache is not None:
+                            save_result_cache(result_cache_file, result_cache)
+                        logger.info(f"Watch poll checked {checked_count} summary database(s)")
+
+                    time.sleep(max(0.0, poll_seconds - (time.monotonic() - poll_started)))
+            except KeyboardInterrupt:
+                print("\nWatch mode stopped.")
+
+            # Everything checked over the night, off the evaluator's matrix
+            dispatch_records([watch["evaluator"].summary_record()], consumers)
+    except KeyboardInterrupt:
+        print("\nWatch mode stopped.")
+    finally:
+        work_pool.close()
+        fw_type_index.close()
+        for writer in structured_writers:
+            writer.close()
+        if history_writer is not None:
+            history_writer.close()
+        if watch["evaluator"].traffic_baseline is not None:
+            watch["evaluator"].traffic_baseline.close()
+
+    live_status.write()
+    if result_cache is not None:
+        save_result_cache(result_cache_file, result_cache)
+    try:
+        save_failover_state(failover_state_file, watch["failover_state"])
+    except OSError as e:
+        logger.error(f"Could not save failover state: {e}")
+
+    metrics.observe("run", time.perf_counter() - run_started)
+    write_run_metrics(metrics, logger)
+    logger.info("Watch mode has finished running!")
 
 # ========================== MAIN FUNCTION ==========================
-def check_ALL_fw_logging_levels(mode="all", specific_client=None):
+def check_ALL_fw_logging_levels(mode="all", specific_client=None, workers=parallel_workers, unit=parallel_unit,
+                                use_cache=use_result_cache, refresh_cache=refresh_result_cache, backend=summary_backend,
+                                output_formats=structured_output_formats, clients=None, folder_dates=None,
+                                work_queue_file=None, sample_rows=sample_probe_rows):
+    """
+    Checks specific_client (or every client in clients, or all of them) for every date in folder_dates
+    (default: [default_folder_date]). A backfill schedules every (client, date) on the one pool, sharing the client
+    listing, firewall types, failover pairs and the workers' backend setup across dates.
+    With work_queue_file the client units go through the shared work queue instead, so --work-queue helpers on
+    other hosts can take part (QueueWorkPool), and this run merges everything into the report as usual.
+    With sample_rows the sweep only probes that many rows per database, see escalate_inconclusive_databases.
+    """
     logger = setup_logger(log_file_path)
+    folder_dates = list(folder_dates) if folder_dates else [default_folder_date]
+    date_label = folder_dates[0] if len(folder_dates) == 1 else f"{folder_dates[0]} to {folder_dates[-1]}"
+    if specific_client:
+        clients = [specific_client]
+    report_label = clients[0] if clients and len(clients) == 1 else (f"({len(clients)} CLIENTS)" if clients else None)
     
     print("Script has started running...")
     logger.info("Script has started running...")
-    results = {}
-    printed_clients = set()
-    failover_pairs = {}
-    failover_lookup = {}
+    run_started = time.perf_counter()
+    metrics = RunMetrics("fw_logging")
 
-    # Load client exclusions
-    client_name_exceptions = load_excluded_clients(client_name_exceptions_file)
-    print("Client exemptions loaded!")
+    with metrics.phase("load_inputs"):
+        # Load client exclusions
+        client_name_exceptions = load_excluded_clients(client_name_exceptions_file)
+        print("Client exemptions loaded!")
 
-    client_date_exceptions = load_date_exclustions(client_date_exceptions_file)
-    print("Client date exemptions loaded!")
-    
-    # Load FW types
-    client_fw_type_map = parse_client_firewall_types_from_csv(csv_path)
-    print("Client firewall types mapped!")
+        client_date_exceptions = load_date_exclustions(client_date_exceptions_file)
+        print("Client date exemptions loaded!")
+
+        # Load FW types, clients are looked up in the compiled index as they are planned
+        fw_type_index = open_fw_type_index(fw_type_index_file, csv_path, fw_type_normalization)
+        print("Client firewall types mapped!")
 
-    # Load failover pairs
-    if failover_data_file.exists():
-        with failover_data_file.open("r", encoding="utf-8") as file:
-            failover_pairs = json.load(file)
-    print("Failover pairs loaded!")
+        failover_state = load_failover_state(failover_state_file)
 
-    # Bidirectional lookup for failover pairs
-    for client, (primary, secondary) in failover_pairs.items():
-        failover_lookup[primary] = secondary
-        failover_lookup[secondary] = primary
+        # Per client / per firewall expected condition overrides
+        client_fw_exceptions = load_client_fw_exceptions(client_fw_exceptions_file, expected_conditions)
+
+    # Load cached results from earlier runs
+    result_cache = None
+    if use_cache:
+        with metrics.phase("cache_load"):
+            result_cache = load_result_cache(result_cache_file, result_cache_max_age_days)
+        print("Result cache loaded!" if not refresh_cache else "Result cache will be refreshed!")
 
     # Prepare name for output file
     global output_file
-    output_file = get_output_file(specific_client, timestamp, local_output_dir)
+    output_file = get_output_file(report_label, timestamp, local_output_dir, folder_dates)
     local_output_dir.mkdir(parents=True, exist_ok=True)
 
-    # Everything after this point is with the output file open
-    with output_file.open("w", encoding="utf-8", buffering=1) as file:
-        file.write(f"Firewall Settings Search Results - {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
-        file.write(f"Checking FW logging status for {default_folder_date}\n")
-        file.write("=" * 50 + "\n")
-
-        for client_folder in clients_folder.iterdir():
-            if not client_folder.is_dir():
-                continue
-            
-            client = client_folder.name
-            if specific_client and client != specific_client:
+    # Decide which clients to check and which date folder to use for each, date by date (one listing for all dates)
+    client_plan = []
+    with metrics.phase("list_clients"):
+        client_folders = list_client_folders(clients_folder)
+    selected_clients = set(clients) if clients else None
+    for run_date in folder_dates:
+        for client, client_folder in client_folders:
+            if selected_clients is not None and client not in selected_clients:
                 continue
-            
-            # Client exceptions loaded from source file (.txt)
+
+            # Client exceptions loaded from source file (.txt), reported once per run
             if client in client_name_exceptions:
-                logger.info(f"Skipping excluded folder: {client}\n")
-                file.write(f"\nSkipping excluded folder: {client}\n")
+                if run_date == folder_dates[0]:
+                    client_plan.append((client, run_date, None, None))
                 continue
-            
-            if client in client_date_exceptions:
-                folder_date = current_date
-            else:
-                folder_date = default_folder_date
-            
-            global folder_loc
-            folder_loc = get_folder_loc(client_folder, folder_date)
-
-            # Start writing to output file
-            logger.info(f"Processing: {client}")
-            file.write(f"\nProcessing: {client}\n")
-            print(f"\nProcessing: {client}")
-
-            logger.info(f"Checking client folder: {folder_loc}")
-            if not folder_loc.exists():
-                print(f"Warning: Folder path '{folder_loc}' does not exist. Please investigate this!")
-                logger.warning(f"Warning: Folder path '{folder_loc}' does not exist. Please investigate this!")
-                file.write(f"Warning: Folder path '{folder_loc}' does not exist. Please investigate this!\n")
+
+            folder_date = client_folder_date(client, run_date, client_date_exceptions)
+            client_plan.append((client, run_date, folder_date, get_folder_loc(client_folder, folder_date)))
+
+    # One listing pass over every Input folder (of every date), everything after this reads from the index
+    with metrics.phase("index_folders"):
+        folder_indexes = iter(index_input_folders(
+            [(client, folder_loc) for client, _, folder_date, folder_loc in client_plan if folder_date],
+            input_file_pattern, index_workers
+        ))
+
+    # Failover pairs from the same client listing, only nDiscovery.ini files changed since the last run are read
+    with metrics.phase("failover_discovery"):
+        checked_clients = {client for client, _, folder_date, _ in client_plan if folder_date}
+        failover_pairs, failover_state = discover_failover_pairs(
+            [(client, client_folder) for client, client_folder in client_folders if client in checked_clients],
+            failover_state, index_workers, metrics
+        )
+    print("Failover pairs discovered!")
+    print("Client folders indexed!")
+    traffic_baseline = open_traffic_baseline(logger)
+    evaluator = FleetEvaluator(expected_conditions, probed_conditions, client_fw_exceptions, failover_pairs, metrics=metrics,
+                               traffic_baseline=traffic_baseline)
+
+    # Hand every client (or every database) to the pool up front, then write results back in client order
+    check_settings = {**default_check_settings(backend), "sample_rows": sample_rows}
+    database_units = {}
+    if work_queue_file:
+        work_pool, unit = QueueWorkPool(work_queue_file, workers), "client"
+    else:
+        work_pool = OrderedWorkPool(workers)
+    previous_run_date = None
+    for client, run_date, folder_date, folder_loc in client_plan:
+        # A heading per date when backfilling, the report then reads date by date in client order
+        if len(folder_dates) > 1 and run_date != previous_run_date:
+            work_pool.add_records([{"record_type": "section", "title": f"Folder date {run_date}"}])
+            previous_run_date = run_date
+
+        if folder_date is None:
+            work_pool.add_records([{"record_type": "client", "event": "skipped", "client": client}])
+            continue
+
+        folder_index = next(folder_indexes)
+        client_context = build_client_context(client, folder_date, folder_index, fw_type_index, failover_pairs,
+                                              result_cache, refresh_cache)
+        for summary_db in folder_index["summary_dbs"]:
+            database_units[(client, summary_db["name"])] = (summary_db, client_context)
+
+        if unit == "mdb":
+            output = ClientOutput()
+            summary_dbs = plan_client(output, folder_index, client_context)
+            work_pool.add_records(output.records)
+            if summary_dbs is None:
                 continue
 
-            # Write failover pairs for client with results from failover script
-            if client in failover_pairs and client not in printed_clients:
-                primary, secondary = failover_pairs[client]
-                file.write(f"Failover Pair: {primary} -> {secondary}\n")
-                logger.info(f"Failover Pair: {primary} -> {secondary}\n")
-                print(f"Failover Pair: {primary} -> {secondary}\n")
-                printed_clients.add(client)
-            file.write("-" * 50 + "\n")
-
-            # Working with the DBs after this point
-            found_mdb_file = False
-            for mdb_file in folder_loc.iterdir():
-                db_file_str = str(mdb_file)
-                
-                # Only proceed if filename matches our expected .mdb patterns
-                if not any(re.search(pattern, mdb_file.name, re.IGNORECASE) for pattern in mdb_filename_patterns):
-                    continue
+            for summary_db in summary_dbs:
+                work_pool.submit(summary_db["name"], check_mdb_file, summary_db, client_context, check_settings)
 
-                # Now we're sure it's a valid firewall .mdb file
-                found_mdb_file = True
-                global db_path
-                db_path = get_db_path(folder_loc, mdb_file)
-
-                # Match IP first -> FW name if no IP is found
-                raw_ip_match = re.search(r"(\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3})", db_file_str)
-                fw_name_match = re.search(fr"({regex_fw_pattern})", db_file_str)
-                normalized_ip = None
-
-                try:
-                    logger.info(f"Attempting to connect to {mdb_file.name}")
-                    conn = pyodbc.connect(rf"DRIVER={{Microsoft Access Driver (*.mdb, *.accdb)}};DBQ={db_path};")
-                    cursor = conn.cursor()
-                    logger.info(f"Successfully connected to {mdb_file.name}! ")
-
-                    # Identify firewall
-                    # 1. Determine the firewall_identifier
-                    if raw_ip_match:
-                        normalized_ip = ".".join(str(int(octet)) for octet in raw_ip_match.group(1).split("."))
-                        firewall_identifier = normalized_ip
-                        is_custom_fw = False
-                    elif fw_name_match:
-                        firewall_identifier = fw_name_match.group(1)
-                        is_custom_fw = True
-                    else:
-                        firewall_identifier = mdb_file.name
-                        is_custom_fw = False
-
-                    # 2. THEN safely check if we want to include firewall type
-                    if not is_custom_fw:
-                        raw_type = client_fw_type_map.get(client, {}).get(firewall_identifier, "Unknown")
-                        fw_type = fw_type_normalization.get(raw_type.strip(), raw_type)
-                        identifier_with_type = f"{firewall_identifier} ({fw_type})"
-                    else:
-                        identifier_with_type = firewall_identifier
-
-                    # Get IPs if it's a custom-named firewall
-                    custom_fw_ips = []
-                    if is_custom_fw:
-                        try:
-                            cursor.execute("SELECT Firewall FROM Firewalls")
-                            custom_fw_ips = list({
-                                ".".join(str(int(octet)) for octet in row[0].split(".")) for row in cursor.fetchall()
-                            })
-
-                        except Exception as exception:
-                            custom_fw_ips = [f"Error retrieving IPs: {str(exception)}"]
-
-                    # Run logging conditions query
-                    conditions_query = f"""
-                        SELECT 'Inbound Traffic' FROM {traffic_summary_table} WHERE Direction = 'I'
-                        UNION SELECT 'Outbound Traffic' FROM {traffic_summary_table} WHERE Direction = 'O'
-                        UNION SELECT 'Traffic Size' FROM {traffic_summary_table} WHERE Bytes >= 10
-                        UNION SELECT 'Allowed Traffic' FROM {traffic_summary_table} WHERE Allowed = 'A'
-                        UNION SELECT 'Denied Traffic' FROM {traffic_summary_table} WHERE Allowed = 'D'
-                    """
-
-                    logger.info("Executing query!")
-                    cursor.execute(conditions_query)
-                    conditions_found = cursor.fetchall()
-
-                    found_conditions = []
-                    if conditions_found:
-                        found_conditions = [condition[0] for condition in conditions_found]
-
-                    # if is_custom_fw == False:
-                    #     if check_debug_for_ip(folder_loc, firewall_identifier):
-                    #         found_conditions.append("Debug Events")
-
-                    # Step 2: Build state map and fill in expected keys
-                    condition_states = {cond: True for cond in found_conditions}
-                    for key in expected_conditions:
-                        if key not in condition_states:
-                            condition_states[key] = False
-
-                    # Step 3: Compare actual vs expected
-                    misconfigurations = []
-                    for condition, expected_value in expected_conditions.items():
-                        actual_value = condition_states[condition]
-                        if actual_value != expected_value:
-                            misconfigurations.append(
-                                f"{condition}={'Yes' if actual_value else 'No'} (Expected: {'Yes' if expected_value else 'No'})")
-                            
-                    # Write condition summary
-                    if len(misconfigurations) == 0:
-                        status_line = f"{identifier_with_type}: Optimal!"
-                        file.write(status_line + "\n")
-                        print(status_line)
-                    elif len(misconfigurations) == 5:
-                        status_line = f"{identifier_with_type}: No Data! Outage or Failover?"
-                        file.write(status_line + "\n")
-                        print(status_line)
-                    else:
-                        status_line = f"{identifier_with_type}:"
-                        file.write(status_line + "\n")
-                        print(status_line)
-
-                        # Calculate alignment length based on the status line
-                        alignment_space = " " * 5
-
-                        for mis in misconfigurations:
-                            aligned_line = f"{alignment_space}{mis}"
-                            file.write(aligned_line + "\n")
-                            print(aligned_line)
-
-                    # Assign severity based on logic
-                    if len(found_conditions) == 0:
-                        severity = "ERROR"
-                    elif len(misconfigurations) > 0:
-                        severity = "WARNING"
-                    else:
-                        severity = "INFO"
-
-                    # Log severity level
-                    if severity == "INFO":
-                        logger.info(status_line)
-                    elif severity == "WARNING":
-                        logger.warning(status_line)
-                    elif severity == "ERROR":
-                        logger.error(status_line)
-
-
-                    if custom_fw_ips:
-                        formatted_ips = ", ".join(custom_fw_ips)
-                        file.write(f"     IPs in network: {formatted_ips} (DO NOT INCLUDE IN CLIENT COMMUNICATIONS!)\n")
-                        
-                        print(f"     IPs in network: {formatted_ips} (DO NOT INCLUDE IN CLIENT COMMUNICATIONS!)")
-                        logger.info(f"{identifier_with_type} IPs in network: {formatted_ips} (DO NOT INCLUDE IN CLIENT COMMUNICATIONS!)")
-
-                    cursor.close()
-                    conn.close()
-                    logger.info(f"Closed connection to {mdb_file.name}")
-
-                except Exception as exception:
-                    error_msg = f"Error processing {mdb_file.name}: {str(exception)}"
-                    results[mdb_file.name] = [f"Error: {str(exception)}"]
-                    file.write(f"{error_msg}\n")
-                    logger.critical(error_msg)
-
-            if not found_mdb_file:
-                logger.warning(f"No .mdb files found for {client}")
-                file.write(f"No .mdb files found for {client}!\n")
-                print(f"No .mdb files found for {client}!\n")
+            output = ClientOutput()
+            finish_client(output, client, summary_dbs)
+            work_pool.add_records(output.records)
+        else:
+            work_pool.submit(client, check_client, folder_index, client_context, check_settings)
+
+    fw_type_index.close()
+
+    # Everything after this point is with the output file open
+    structured_writers = [
+        StructuredRecordWriter(output_file.with_suffix(f".{output_format}"), output_format, expected_conditions)
+        for output_format in output_formats
+    ]
+    history_writer = None
+    if record_history:
+        try:
+            history_writer = HistoryWriter(history_file, date_label, expected_conditions, mode, report_label)
+        except (OSError, sqlite3.Error) as e:
+            logger.error(f"Results history unavailable, this run won't be recorded: {e}")
+    try:
+        with output_file.open("w", encoding="utf-8", buffering=report_buffer_size) as file:
+            file.write(f"Firewall Settings Search Results - {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
+            file.write(f"Checking FW logging status for {date_label}\n")
+            file.write("=" * 50 + "\n")
+
+            deferred_collector = DeferredCollector()
+            inconclusive_collector = InconclusiveCollector()
+            consumers = [TextReportWriter(file), ConsoleWriter(), LogWriter(logger), deferred_collector, inconclusive_collector,
+                         metrics] + structured_writers
+            if result_cache is not None:
+                consumers.append(ResultCacheWriter(result_cache))
+            if history_writer is not None:
+                consumers.append(history_writer)
+
+            # Sweep time includes waiting on the workers, report_write is only the time spent in the writers
+            with metrics.phase("sweep"):
+                for records in evaluator.evaluate_batches(work_pool.results()):
+                    with metrics.phase("report_write"):
+                        dispatch_records(records, consumers)
+
+            # Locked / timed out databases were reported as deferred in place, retry them now the sweep is done
+            with metrics.phase("retry_deferred"):
+                retry_deferred_databases(deferred_collector, database_units, workers, check_settings, consumers, evaluator)
+
+            # Whatever the sample couldn't settle gets its full scan last
+            if escalate_inconclusive:
+                with metrics.phase("full_scans"):
+                    escalate_inconclusive_databases(inconclusive_collector, database_units, workers, check_settings, consumers, evaluator)
+
+            # Counts per condition and vendor, off the evaluator's matrix
+            dispatch_records([evaluator.summary_record()], consumers)
+    finally:
+        work_pool.close()
+        for writer in structured_writers:
+            writer.close()
+        if history_writer is not None:
+            history_writer.close()
+        if traffic_baseline is not None:
+            traffic_baseline.close()
+
+    if result_cache is not None:
+        with metrics.phase("cache_save"):
+            save_result_cache(result_cache_file, result_cache)
+        logger.info(f"Result cache saved to {result_cache_file}")
+
+    try:
+        save_failover_state(failover_state_file, failover_state)
+    except OSError as e:
+        logger.error(f"Could not save failover state: {e}")
+
+    metrics.observe("run", time.perf_counter() - run_started)
+    write_run_metrics(metrics, logger)
 
     logger.info("Script has finished running! All client folders have been processed.")
 
+# ========================== COMMAND LINE ==========================
+def parse_arguments(argv):
+    parser = argparse.ArgumentParser(
+        description="Checks every client's summary firewall databases for missing logging conditions. "
+                    "Without arguments it asks for a mode like before.",
+        epilog="e.g. --client acme --client 'city*' --from 2024-04-01 --to 2024-04-07, "
+               "or --queue S:/fw_queue.sqlite here and --work-queue S:/fw_queue.sqlite on the other hosts"
+    )
+    parser.add_argument("--client", action="append", default=[], metavar="PATTERN",
+                        help="Client to check (substring, or glob with * ? [), repeat for more. Default: all clients")
+    parser.add_argument("--date", type=parse_folder_date, help="Folder date to check (YYYYMMDD). Default: yesterday")
+    parser.add_argument("--from", dest="first_date", type=parse_folder_date, help="First folder date of a backfill")
+    parser.add_argument("--to", dest="last_date", type=parse_folder_date, help="Last folder date of a backfill (default: yesterday)")
+    parser.add_argument("--watch", action="store_true", help="Watch for new summary DBs instead (see WATCH CONFIG)")
+    parser.add_argument("--queue", type=Path, metavar="QUEUE_FILE",
+                        help="Share the sweep with other hosts through this SQLite file on the share, this run writes the report")
+    parser.add_argument("--work-queue", type=Path, metavar="QUEUE_FILE",
+                        help="Only help with sweeps published to QUEUE_FILE by a --queue run on another host")
+    parser.add_argument("--workers", type=int, default=parallel_workers)
+    parser.add_argument("--unit", choices=["client", "mdb"], default=parallel_unit)
+    parser.add_argument("--backend", default=summary_backend)
+    parser.add_argument("--format", dest="output_formats", action="append", choices=["jsonl", "csv"],
+                        help="Structured output next to the report, repeat for more. Default: structured_output_formats")
+    parser.add_argument("--sample-rows", type=int, default=sample_probe_rows, metavar="ROWS",
+                        help="Only probe the first ROWS rows of each TrafficSummary, full scans of inconclusive ones "
+                             "follow the sweep (escalate_inconclusive). 0 reads every table in full")
+    parser.add_argument("--no-cache", action="store_true", help="Don't read or save the result cache")
+    parser.add_argument("--refresh-cache", action="store_true", help="Recheck every database, results are still cached")
+
+    args = parser.parse_args(argv)
+    if args.date and (args.first_date or args.last_date):
+        parser.error("--date can't be combined with --from/--to")
+    if args.last_date and not args.first_date:
+        parser.error("--to needs --from")
+    if args.watch and (args.client or args.date or args.first_date):
+        parser.error("--watch checks all clients for today's data, it takes no --client or dates")
+    if args.work_queue and (args.client or args.date or args.first_date or args.watch or args.queue):
+        parser.error("--work-queue takes its clients and dates from the queue, only --workers applies")
+    if args.queue and args.watch:
+        parser.error("--watch can't be shared through --queue")
+    if args.sample_rows is not None and args.sample_rows < 0:
+        parser.error("--sample-rows can't be negative")
+
+    try:
+        if args.first_date:
+            args.folder_dates = folder_date_range(args.first_date, args.last_date or default_folder_date)
+        else:
+            args.folder_dates = [args.date or default_folder_date]
+    except ValueError as e:
+        parser.error(str(e))
+    return args
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv:
+        mode, specific_client = get_mode_selection()
+        if mode == "watch":
+            watch_fw_logging_levels()
+        else:
+            check_ALL_fw_logging_levels(mode, specific_client)
+        return 0
+
+    args = parse_arguments(argv)
+    if args.work_queue:
+        work_queue_helper(args.work_queue, args.workers)
+        return 0
+
+    if args.watch:
+        watch_fw_logging_levels(workers=args.workers, backend=args.backend,
+                                output_formats=args.output_formats or structured_output_formats)
+        return 0
+
+    clients = None
+    if args.client:
+        try:
+            clients = match_clients(args.client, [client for client, _ in list_client_folders(clients_folder)])
+        except ValueError as e:
+            print(e, file=sys.stderr)
+            return 2
+        print(f"Checking {len(clients)} client(s): {', '.join(clients)}")
+
+    mode = "all" if clients is None else ("one" if len(clients) == 1 else "clients")
+    check_ALL_fw_logging_levels(mode, workers=args.workers, unit=args.unit,
+                                use_cache=not args.no_cache, refresh_cache=args.refresh_cache, backend=args.backend,
+                                output_formats=args.output_formats or structured_output_formats,
+                                clients=clients, folder_dates=args.folder_dates, work_queue_file=args.queue,
+                                sample_rows=args.sample_rows or None)
+    return 0
+
 # ========================== EXECUTION ==========================
-mode, specific_client = get_mode_selection()
-check_ALL_fw_logging_levels(mode, specific_client)
+# Guarded so pool workers can import this file without prompting for a mode
+if __name__ == "__main__":
+    sys.exit(main())
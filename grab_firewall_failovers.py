@@ -1,50 +1,154 @@
 import json
+import os
 import re
+import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from datetime import datetime, timedelta
+from fw_metrics import RunMetrics, write_atomically
 
 # Define paths
 failover_txt_file = Path("D:/Temp/Analysts/Cam/Threat Engineering/firewall_failovers.txt")
 client_path = Path("D:/Clients")
 excluded_clients_file = Path('D:/Temp/Analysts/Julian/Script_Source/ClientExclusions.txt')
-
-# Load excluded clients into a set (faster lookups)
-excluded_clients = set()
-if excluded_clients_file.exists():
-    with excluded_clients_file.open("r", encoding="utf-8", errors="ignore") as file:
-        excluded_clients = {line.strip() for line in file if line.strip()}  # Set for O(1) lookup
+metrics_textfile = Path("D:/Temp/Analysts/Cam/Threat Engineering/FW Script Outputs/fw_failover_metrics.prom")
+failover_state_file = Path("D:/Temp/Analysts/Cam/Threat Engineering/FW Settings/fw_failover_state.json")
 
 # Define folder date (yesterday)
 folder_date = (datetime.now() - timedelta(days=1)).strftime("%Y%m%d")
 
-# Dictionary to store failover FW mappings
-failover_data = {}
-
-# Regex pattern for matching format
-failover_pattern = re.compile(r"FailoverFirewalls=\|([\d\.]+)\(([\d\.]+)\)\|")
-
-# Go through each client folder
-for client_folder in client_path.iterdir():
-    if not client_folder.is_dir() or client_folder.name in excluded_clients:
-        continue
-
-    # Construct expected file path -> nDiscovery.ini
-    file_path = client_folder / "nDiscovery.ini"
-
-    if file_path.exists():
-        found_pair = False  # Track if a pair was found
-        with file_path.open("r", encoding="utf-8", errors="ignore") as file:
-            lines = file.readlines()  # Load all lines at once
-            for line in lines:
-                pattern_match = failover_pattern.search(line)
-                if pattern_match:
-                    primary_fw = pattern_match.group(1)
-                    secondary_fw = pattern_match.group(2)
-                    
-                    if primary_fw != "0.0.0.0" and secondary_fw != "0.0.0.0":
-                        failover_data[client_folder.name] = (primary_fw, secondary_fw)
-                    break 
-
-# Save mappings to output file
-with failover_txt_file.open("w", encoding="utf-8") as output_file:
-    json.dump(failover_data, output_file, indent=4)
+# Regex pattern for matching format, one line can list several pairs: FailoverFirewalls=|a(b)|c(d)|
+failover_line_prefix = "FailoverFirewalls="
+failover_pattern = re.compile(r"([\d\.]+)\(([\d\.]+)\)\|")
+
+# Failover state file (JSON), lets the next run skip every nDiscovery.ini that hasn't changed:
+# {"<client>": {"size": ..., "mtime_ns": ..., "version": 2, "pairs": [["10.0.0.1", "10.0.0.2"], ...]}}
+# Entries of another version are read again, bump it whenever read_failover_pairs would parse a file differently.
+failover_state_version = 2
+
+def load_excluded_clients(excluded_clients_file):
+    # Load excluded clients into a set (faster lookups)
+    excluded_clients = set()
+    if excluded_clients_file.exists():
+        with excluded_clients_file.open("r", encoding="utf-8", errors="ignore") as file:
+            excluded_clients = {line.strip() for line in file if line.strip()}  # Set for O(1) lookup
+    return excluded_clients
+
+# ========================== READING ==========================
+def read_failover_pairs(ini_path):
+    # Streams nDiscovery.ini and stops at the first line after the FailoverFirewalls= line(s), placeholders dropped
+    pairs = []
+    found_line = False
+    with open(ini_path, "r", encoding="utf-8", errors="ignore") as file:
+        for line in file:
+            # Anywhere in the line like the old search(), leading whitespace or a BOM on the first line included
+            prefix_at = line.find(failover_line_prefix)
+            if prefix_at < 0:
+                if found_line:
+                    break
+                continue
+
+            found_line = True
+            for primary_fw, secondary_fw in failover_pattern.findall(line, prefix_at + len(failover_line_prefix)):
+                if primary_fw != "0.0.0.0" and secondary_fw != "0.0.0.0" and [primary_fw, secondary_fw] not in pairs:
+                    pairs.append([primary_fw, secondary_fw])
+    return pairs
+
+def discover_client_failovers(client, client_folder, previous):
+    # Returns (client, state entry or None when there is no ini, seconds spent reading or None when unchanged)
+    ini_path = os.path.join(client_folder, "nDiscovery.ini")
+    try:
+        stat = os.stat(ini_path)
+    except FileNotFoundError:
+        return client, None, None
+
+    if (previous and previous["size"] == stat.st_size and previous["mtime_ns"] == stat.st_mtime_ns
+            and previous.get("version") == failover_state_version):
+        return client, previous, None
+
+    started = time.perf_counter()
+    entry = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "version": failover_state_version,
+             "pairs": read_failover_pairs(ini_path)}
+    return client, entry, time.perf_counter() - started
+
+def discover_failover_pairs(client_folders, failover_state, workers=16, metrics=None):
+    """
+    Finds the failover pairs for [(client, client_folder)], reading only the nDiscovery.ini files whose size or
+    mtime changed since failover_state. Returns ({client: [[primary, secondary], ...]}, updated failover_state).
+    Clients without a pair are left out of the pairs, like the old JSON file.
+    """
+    metrics = metrics or RunMetrics("failover_discovery")
+    if workers <= 1 or len(client_folders) <= 1:
+        results = [discover_client_failovers(client, folder, failover_state.get(client)) for client, folder in client_folders]
+    else:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(lambda item: discover_client_failovers(item[0], item[1], failover_state.get(item[0])), client_folders))
+
+    # Metrics are only touched from this thread
+    failover_pairs = {}
+    updated_state = dict(failover_state)
+    for client, entry, read_seconds in results:
+        if entry is None:
+            updated_state.pop(client, None)
+            continue
+
+        updated_state[client] = entry
+        if read_seconds is None:
+            metrics.count("ini_files_unchanged")
+        else:
+            metrics.count("ini_files_read")
+            metrics.observe("read_ini", read_seconds)
+        if entry["pairs"]:
+            failover_pairs[client] = entry["pairs"]
+            metrics.count("failover_pairs_found", len(entry["pairs"]))
+
+    return failover_pairs, updated_state
+
+def build_failover_lookup(pairs):
+    # Bidirectional lookup for one client's failover pairs, IPs repeat across clients so this stays per client
+    failover_lookup = {}
+    for primary, secondary in pairs:
+        failover_lookup[primary] = secondary
+        failover_lookup[secondary] = primary
+    return failover_lookup
+
+# ========================== STATE ==========================
+def load_failover_state(state_file: Path):
+    if not state_file.exists():
+        return {}
+    try:
+        with state_file.open("r", encoding="utf-8") as file:
+            return json.load(file)
+    except (OSError, ValueError) as e:
+        print(f"Warning: Ignoring unreadable failover state {state_file}: {e}")
+        return {}
+
+def save_failover_state(state_file: Path, failover_state: dict):
+    write_atomically(state_file, json.dumps(failover_state))
+
+def collect_failover_pairs(client_path, excluded_clients, metrics=None, failover_state=None, workers=16):
+    # Standalone sweep of the client tree, returns {client: [[primary, secondary], ...]}
+    with os.scandir(client_path) as entries:
+        client_folders = [(entry.name, entry.path) for entry in entries
+                          if entry.is_dir() and entry.name not in excluded_clients]
+    failover_pairs, _ = discover_failover_pairs(client_folders, failover_state or {}, workers, metrics)
+    return failover_pairs
+
+if __name__ == "__main__":
+    run_started = time.perf_counter()
+    metrics = RunMetrics("failover_discovery")
+    failover_state = load_failover_state(failover_state_file)
+    excluded_clients = load_excluded_clients(excluded_clients_file)
+    with os.scandir(client_path) as entries:
+        client_folders = [(entry.name, entry.path) for entry in entries
+                          if entry.is_dir() and entry.name not in excluded_clients]
+    failover_data, failover_state = discover_failover_pairs(client_folders, failover_state, metrics=metrics)
+    save_failover_state(failover_state_file, failover_state)
+
+    # Save mappings to output file, the main script discovers failovers itself and no longer reads this
+    with metrics.phase("write_output"), failover_txt_file.open("w", encoding="utf-8") as output_file:
+        json.dump(failover_data, output_file, indent=4)
+
+    metrics.observe("run", time.perf_counter() - run_started)
+    print("\n".join(metrics.summary_lines()))
+    metrics.write_prometheus(metrics_textfile)
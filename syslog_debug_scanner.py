@@ -0,0 +1,91 @@
+# Syslog Debug Scanner
+# Looks for debug events in the per-firewall *-Syslog.txt files without reading them line by line.
+# The file is searched as raw bytes through memory-mapped windows and the search stops at the first hit.
+#
+# Each scan also returns a small state record ({"size", "offset", "head", "found"}). Passing it back in on the
+# next run means only the bytes appended since then are read, which is what makes the check cheap enough to
+# run every night on multi-GB syslogs. A file that shrank or whose first bytes changed was rotated and is
+# scanned again from the start.
+#
+# Usage: python syslog_debug_scanner.py <file or folder> [...] [--workers N]
+
+import argparse
+import mmap
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+debug_needle = b".Debug"
+window_size = 64 * 1024 * 1024  # Bytes mapped at a time, keeps address space flat on 32-bit Python too
+head_size = 64                  # Bytes from the start of the file used to notice rotation
+
+# ========================== SEARCH ==========================
+def find_in_file(file, needle, start, end):
+    # Returns the offset of the first needle between start and end, or -1. file is an open binary file.
+    granularity = mmap.ALLOCATIONGRANULARITY
+    position = start
+    while position < end:
+        map_start = position - position % granularity
+        length = min(window_size, end - map_start)
+        with mmap.mmap(file.fileno(), length, access=mmap.ACCESS_READ, offset=map_start) as mapped:
+            hit = mapped.find(needle, position - map_start)
+            if hit != -1:
+                return map_start + hit
+        if map_start + length >= end:
+            break
+        # Overlap the next window so a needle split across the boundary is still found
+        position = map_start + length - (len(needle) - 1)
+    return -1
+
+def scan_for_debug(syslog_file: Path, state: dict = None, needle: bytes = debug_needle):
+    """
+    Returns (found, new_state) for one syslog file.
+    state is the record returned by the previous scan of the same file, or None for a full scan.
+    """
+    with syslog_file.open("rb") as file:
+        size = syslog_file.stat().st_size
+        head = file.read(head_size).hex()
+
+        rotated = not state or size < state.get("offset", 0) or state.get("head") != head[:len(state.get("head", ""))]
+        if not rotated and state.get("found"):
+            return True, {**state, "size": size, "head": head}
+
+        start = 0 if rotated else max(0, state["offset"] - (len(needle) - 1))
+        hit = find_in_file(file, needle, start, size)
+
+    found = hit != -1
+    return found, {"size": size, "offset": size, "head": head, "found": found}
+
+# ========================== BATCH ==========================
+def _scan_one(path, state):
+    try:
+        return scan_for_debug(Path(path), state)
+    except OSError as e:
+        print(f"Error checking debug events in {path}: {e}")
+        return False, state
+
+def scan_files_for_debug(paths, states=None, workers=4):
+    # Scans several syslog files in parallel and returns {path: (found, new_state)}
+    states = states or {}
+    paths = [str(path) for path in paths]
+    if workers <= 1 or len(paths) <= 1:
+        return {path: _scan_one(path, states.get(path)) for path in paths}
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {path: pool.submit(_scan_one, path, states.get(path)) for path in paths}
+        return {path: future.result() for path, future in futures.items()}
+
+def main():
+    parser = argparse.ArgumentParser(description="Report which syslog files contain debug events.")
+    parser.add_argument("paths", nargs="+", type=Path, help="Syslog files or folders containing *-Syslog.txt files")
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+
+    files = []
+    for path in args.paths:
+        files.extend(sorted(path.glob("*-Syslog.txt")) if path.is_dir() else [path])
+
+    for path, (found, state) in scan_files_for_debug(files, workers=args.workers).items():
+        print(f"{'DEBUG' if found else 'clean'}  {state['size'] if state else '?':>14}  {path}")
+
+if __name__ == "__main__":
+    main()
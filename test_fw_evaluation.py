@@ -0,0 +1,113 @@
+# Fleet Evaluation Tests
+# FleetEvaluator's classification on hand-made firewall records: overrides, No Data vs failover standby,
+# inconclusive (sampled) conditions and the fleet summary read off the matrix.
+#
+# Usage: python -m pytest test_fw_evaluation.py
+
+import json
+
+from fw_evaluation import FleetEvaluator, load_client_fw_exceptions
+
+expected_conditions = {"Inbound Traffic": True, "Denied Traffic": True, "Debug Events": False}
+probed_conditions = ["Inbound Traffic", "Denied Traffic"]
+
+def firewall_record(firewall, found=(), client="Client", inconclusive=(), folder_date="20240416", status="checked"):
+    # What check_mdb_file hands the evaluator
+    return {"record_type": "firewall", "client": client, "folder_date": folder_date, "firewall_identifier": firewall,
+            "vendor": "Vendor", "conditions": {name: name in found for name in expected_conditions},
+            "inconclusive": list(inconclusive), "traffic_anomalies": [], "status": status, "severity": None}
+
+def evaluate(evaluator, *records):
+    return [record for record in evaluator.evaluate(list(records)) if record["record_type"] == "firewall"]
+
+def test_statuses_and_misconfigurations():
+    evaluator = FleetEvaluator(expected_conditions, probed_conditions)
+    optimal, misconfigured, noisy, no_data = evaluate(
+        evaluator,
+        firewall_record("10.0.0.1", ["Inbound Traffic", "Denied Traffic"]),
+        firewall_record("10.0.0.2", ["Inbound Traffic"]),
+        firewall_record("10.0.0.3", ["Inbound Traffic", "Denied Traffic", "Debug Events"]),
+        firewall_record("10.0.0.4")
+    )
+    assert (optimal["status"], optimal["severity"], optimal["misconfigurations"]) == ("optimal", "INFO", [])
+    assert (misconfigured["status"], misconfigured["misconfigurations"]) == ("misconfigured", ["Denied Traffic"])
+    assert noisy["misconfigurations"] == ["Debug Events"]
+    assert (no_data["status"], no_data["severity"], no_data["misconfigurations"]) == ("no_data", "ERROR", [])
+
+def test_overrides_client_wide_and_per_firewall(tmp_path):
+    exceptions_file = tmp_path / "client_fw_exceptions.json"
+    exceptions_file.write_text(json.dumps({"Client": {
+        "Denied Traffic": False,
+        "Unknown Condition": True,
+        "firewalls": {"10.0.0.2": {"Denied Traffic": None}}
+    }}), encoding="utf-8")
+    overrides = load_client_fw_exceptions(exceptions_file, list(expected_conditions))
+    assert overrides["Client"]["conditions"] == {"Denied Traffic": False}
+
+    evaluator = FleetEvaluator(expected_conditions, probed_conditions, overrides=overrides)
+    client_wide, unchecked, other_client = evaluate(
+        evaluator,
+        firewall_record("10.0.0.1", ["Inbound Traffic", "Denied Traffic"]),
+        firewall_record("10.0.0.2", ["Inbound Traffic", "Denied Traffic"]),
+        firewall_record("10.0.0.1", ["Inbound Traffic"], client="Other")
+    )
+    assert client_wide["misconfigurations"] == ["Denied Traffic"]
+    assert unchecked["status"] == "optimal"
+    assert other_client["misconfigurations"] == ["Denied Traffic"]
+
+def test_idle_failover_partner_is_standby():
+    evaluator = FleetEvaluator(expected_conditions, probed_conditions,
+                               failover_pairs={"Client": [["10.0.0.1", "10.0.0.2"]]})
+    primary, secondary, unpaired = evaluate(
+        evaluator,
+        firewall_record("10.0.0.1", ["Inbound Traffic", "Denied Traffic"]),
+        firewall_record("10.0.0.2"),
+        firewall_record("10.0.0.3")
+    )
+    assert (primary["status"], primary["failover_partner"]) == ("optimal", "10.0.0.2")
+    assert (secondary["status"], secondary["severity"], secondary["misconfigurations"]) == ("standby", "INFO", [])
+    assert unpaired["status"] == "no_data"
+
+def test_partner_checked_later_makes_standby_in_the_summary():
+    # A retried primary lands in a later batch, its idle secondary was already called No Data
+    evaluator = FleetEvaluator(expected_conditions, probed_conditions,
+                               failover_pairs={"Client": [["10.0.0.1", "10.0.0.2"]]})
+    (secondary,) = evaluate(evaluator, firewall_record("10.0.0.2"))
+    assert secondary["status"] == "no_data"
+    evaluate(evaluator, firewall_record("10.0.0.1", ["Inbound Traffic", "Denied Traffic"]))
+    assert evaluator.summary()["statuses"] == {"optimal": 1, "misconfigured": 0, "no_data": 0, "standby": 1}
+
+def test_inconclusive_conditions_are_neither_mismatches_nor_no_data():
+    evaluator = FleetEvaluator(expected_conditions, probed_conditions)
+    partly, nothing_proven = evaluate(
+        evaluator,
+        firewall_record("10.0.0.1", ["Inbound Traffic"], inconclusive=["Denied Traffic"]),
+        firewall_record("10.0.0.2", inconclusive=["Inbound Traffic", "Denied Traffic"])
+    )
+    assert (partly["status"], partly["misconfigurations"]) == ("optimal", [])
+    assert nothing_proven["status"] == "optimal"
+    assert evaluator.summary()["inconclusive"] == 2
+
+    # The full scan replaces the sampled row
+    (full_scan,) = evaluate(evaluator, firewall_record("10.0.0.1", ["Inbound Traffic"]))
+    assert full_scan["misconfigurations"] == ["Denied Traffic"]
+    summary = evaluator.summary()
+    assert (summary["firewalls"], summary["inconclusive"]) == (2, 1)
+
+def test_deferred_records_keep_their_status():
+    evaluator = FleetEvaluator(expected_conditions, probed_conditions)
+    (deferred,) = evaluate(evaluator, firewall_record("10.0.0.1", status="deferred"))
+    assert deferred["status"] == "deferred"
+    assert evaluator.summary()["firewalls"] == 0
+
+def test_summary_counts_per_condition_and_vendor():
+    evaluator = FleetEvaluator(expected_conditions, probed_conditions)
+    batches = [[{"record_type": "client", "event": "start", "client": "Client"},
+                firewall_record("10.0.0.1", ["Inbound Traffic"])],
+               [firewall_record("10.0.0.2", ["Inbound Traffic", "Denied Traffic"]), firewall_record("10.0.0.3")]]
+    list(evaluator.evaluate_batches(batches))
+    summary = evaluator.summary()
+    assert summary["statuses"] == {"optimal": 1, "misconfigured": 1, "no_data": 1, "standby": 0}
+    assert summary["conditions"]["Denied Traffic"] == {"found": 1, "misconfigured": 1}
+    assert summary["conditions"]["Inbound Traffic"] == {"found": 2, "misconfigured": 0}
+    assert summary["vendors"]["Vendor"]["misconfigurations"] == {"Denied Traffic": 1}
@@ -0,0 +1,117 @@
+# Work Queue Tests
+# Claim, heartbeat, stale reclaim and poison units of fw_work_queue.py against a temp queue file, with real
+# processes racing for the write lock where it matters. No share needed.
+#
+# Usage: python -m pytest test_fw_work_queue.py
+
+import multiprocessing
+import time
+from pathlib import Path
+
+from fw_work_queue import WorkQueue, heartbeat, decode_json
+
+def publish_units(queue_file, count, **queue_options):
+    queue = WorkQueue(queue_file, **queue_options)
+    try:
+        return queue.publish(f"plan-{count}", [(f"Client{position}", {"folder_loc": Path(f"/clients/{position}")})
+                                               for position in range(count)])
+    finally:
+        queue.close()
+
+def claim_until_empty(queue_file, host, results):
+    # One racing host: claims two at a time, completes what it got, until nothing is left
+    queue = WorkQueue(queue_file)
+    claimed_positions = []
+    try:
+        while True:
+            claimed = queue.claim(host, 2)
+            if not claimed:
+                break
+            for sweep_id, position, label, payload in claimed:
+                claimed_positions.append(position)
+                queue.complete(sweep_id, position, [{"record_type": "client", "label": label, "host": host}])
+    finally:
+        queue.close()
+    results.put((host, claimed_positions))
+
+def test_racing_hosts_claim_every_unit_once(tmp_path):
+    queue_file = tmp_path / "queue.sqlite"
+    sweep_id = publish_units(queue_file, 60)
+
+    results = multiprocessing.Queue()
+    hosts = [multiprocessing.Process(target=claim_until_empty, args=(queue_file, f"host{number}", results)) for number in range(2)]
+    for host in hosts:
+        host.start()
+    claims = dict(results.get(timeout=60) for _ in hosts)
+    for host in hosts:
+        host.join(timeout=60)
+
+    all_claims = claims["host0"] + claims["host1"]
+    assert sorted(all_claims) == list(range(60))
+
+    queue = WorkQueue(queue_file)
+    assert queue.progress(sweep_id) == {"done": 60}
+    finished = queue.results(sweep_id, 0, 60)
+    assert all(records[0]["host"] in claims and position in claims[records[0]["host"]] for position, records in finished.items())
+    queue.close()
+
+def test_payload_paths_survive_the_round_trip(tmp_path):
+    queue_file = tmp_path / "queue.sqlite"
+    publish_units(queue_file, 1)
+    queue = WorkQueue(queue_file)
+    (_, _, label, payload), = queue.claim("host", 1)
+    assert label == "Client0" and payload == {"folder_loc": Path("/clients/0")}
+    assert decode_json('{"__path__": "/a", "other": 1}') == {"__path__": "/a", "other": 1}
+    queue.close()
+
+def test_publish_resumes_an_unfinished_sweep(tmp_path):
+    queue_file = tmp_path / "queue.sqlite"
+    sweep_id = publish_units(queue_file, 3)
+    assert publish_units(queue_file, 3) == sweep_id
+
+    queue = WorkQueue(queue_file)
+    queue.finish(sweep_id)
+    queue.close()
+    assert publish_units(queue_file, 3) != sweep_id
+
+def test_stale_claim_goes_to_the_next_host(tmp_path):
+    queue_file = tmp_path / "queue.sqlite"
+    sweep_id = publish_units(queue_file, 1)
+    queue = WorkQueue(queue_file, stale_seconds=0.2)
+
+    assert [position for _, position, _, _ in queue.claim("crashed", 1)] == [0]
+    assert queue.claim("other", 1) == []  # Still fresh
+    time.sleep(0.3)
+    assert [position for _, position, _, _ in queue.claim("other", 1)] == [0]
+
+    # The late host finishing after all doesn't overwrite the result merged first
+    queue.complete(sweep_id, 0, [{"host": "other"}])
+    queue.complete(sweep_id, 0, [{"host": "crashed"}])
+    assert queue.results(sweep_id, 0, 1) == {0: [{"host": "other"}]}
+    queue.close()
+
+def test_heartbeat_keeps_a_claim(tmp_path):
+    queue_file = tmp_path / "queue.sqlite"
+    publish_units(queue_file, 1)
+    queue = WorkQueue(queue_file, stale_seconds=0.5)
+
+    assert len(queue.claim("busy", 1)) == 1
+    with heartbeat(queue_file, "busy", interval_seconds=0.1):
+        time.sleep(1)
+        assert queue.claim("other", 1) == []
+    queue.close()
+
+def test_poison_unit_is_closed_with_an_error(tmp_path):
+    queue_file = tmp_path / "queue.sqlite"
+    sweep_id = publish_units(queue_file, 2)
+    queue = WorkQueue(queue_file, stale_seconds=0.1, max_attempts=2)
+
+    for host in ("first", "second"):
+        assert [position for _, position, _, _ in queue.claim(host, 1)] == [0]
+        time.sleep(0.2)
+
+    # The third claim skips the unit that took down two hosts and hands out the next one
+    assert [position for _, position, _, _ in queue.claim("third", 1)] == [1]
+    (record,) = queue.results(sweep_id, 0, 1)[0]
+    assert record["record_type"] == "error" and record["label"] == "Client0" and "abandoned after 2 claims" in record["error"]
+    queue.close()